@@ -90,4 +90,14 @@ plato_close_cmd = b'56'
 arduino_comport = 'COM6'
 baudrate = 9600
 hand_markerset_labels = ['Left', 'Right']
-opti_trial_lead_time = 120
+hand_rigid_body_id = None  # streaming ID of a hand rigid body to track instead of the marker centroid
+opti_ready_frames = 5  # frames with every hand marker visible needed before a trial starts
+opti_ready_timeout = 1000  # ms to wait for them before giving up
+opti_buffer_frames = 1024  # frames held in memory (~8.5s at 120Hz)
+opti_queue_frames = 256  # frames the NatNet thread can queue ahead of the trial loop
+opti_queue_policy = 'drop_oldest'  # when the queue is full: 'drop_oldest' or 'block'
+opti_save_csv = True  # mirror streamed frames to per-trial files
+opti_recording_format = 'csv'  # 'csv' (.txt), 'binary' (.bin, see OptiRecording.py), or 'sqlite' (every trial in <project>_frames.db beside the klibs database, see FrameStore.py)
+opti_acquisition = 'thread'  # 'thread', or 'process' to decode and record in a separate process (see MocapProcess.py)
+opti_log_telemetry = True  # log per-trial stream telemetry to the stream_telemetry table
+response_poll_ms = 1  # longest gap between response key samples while waiting on frames
@@ -62,4 +62,32 @@ CREATE TABLE trials (
     distractor_loc text not null,
     response_time text not null,
     object_tipped text not null,
+    contact_frame integer not null,
+    contact_timestamp text not null,
+    contact_time text not null
+);
+
+CREATE TABLE stream_telemetry (
+    id integer primary key autoincrement not null,
+    participant_id integer not null references participants(id),
+    block_num integer not null,
+    trial_num integer not null,
+    aborted text,
+    frames integer not null,
+    gaps integer not null,
+    missing_frames integer not null,
+    out_of_order integer not null,
+    resyncs integer not null,
+    interval_mean_ms real,
+    interval_sd_ms real,
+    interval_max_ms real,
+    jitter_ms real,
+    interval_bin_ms real,
+    interval_histogram text,
+    decode_mean_us real,
+    decode_max_us real,
+    drains integer not null,
+    queue_depth_mean real,
+    queue_depth_max integer not null,
+    queue_dropped integer not null
 );
@@ -0,0 +1,155 @@
+import asyncio
+from typing import Any, AsyncIterator, Tuple, Union
+
+from natnetclient_rough import NatNetClient
+
+
+# Marks the end of the frame stream in the queue
+_CLOSED = object()
+
+
+class _NatNetProtocol(asyncio.DatagramProtocol):
+    """Feeds datagrams from one NatNet socket into the client's message handler."""
+
+    def __init__(self, client: NatNetClient) -> None:
+        self.client = client
+
+    def datagram_received(self, data: bytes, addr: Tuple[Any, ...]) -> None:
+        self.client.process_message(data)
+
+    def error_received(self, exc: Exception) -> None:
+        print(f"ERROR: NatNet socket error occurred:\n{exc}")
+
+
+class AsyncNatNetClient(NatNetClient):
+    """
+    NatNetClient running on an asyncio event loop instead of receive threads.
+
+    Both sockets are served by datagram protocols on the running loop, and
+    packets go through the same message handling and parser as the threaded
+    client. Frames are delivered whole through an async iterator: a frame's
+    marker sets are collected as they are decoded and queued together once its
+    suffix has been read, so a consumer never sees part of a frame. Commands
+    and keep-alives are sent on the same loop, which also re-sends a model
+    definition request left unanswered, as the threaded client does. Closing the client ends
+    iteration immediately, with no socket timeouts to wait out.
+
+    Usage:
+        async with AsyncNatNetClient() as client:
+            async for frame in client.frames():
+                for marker_set in frame["marker_sets"]:
+                    ...
+    """
+
+    def __init__(
+        self,
+        instance_settings: dict[str, Union[str, int, bool]] = {},
+        max_queued_frames: int = 256,
+        keep_alive_interval: float = 1.0,
+    ) -> None:
+        super().__init__(instance_settings)
+
+        self.max_queued_frames = max_queued_frames
+        self.keep_alive_interval = keep_alive_interval
+        # whole frames discarded because the consumer fell behind
+        self.dropped_frames = 0
+
+        self.markers_listener = self.__collect
+        self.suffix_listener = self.__enqueue
+
+        # marker sets of the frame being decoded, queued with its suffix
+        self.__marker_sets = []
+
+        self.__queue = None
+        self.__transports = []
+        self.__keep_alive_task = None
+
+    async def __aenter__(self) -> "AsyncNatNetClient":
+        if not await self.start():
+            raise ConnectionError("Could not open NatNet sockets.")
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    async def start(self) -> bool:
+        loop = asyncio.get_running_loop()
+
+        if not self.create_sockets():
+            return False
+
+        self.__queue = asyncio.Queue()
+
+        for sock in (self.data_socket, self.command_socket):
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _NatNetProtocol(self), sock=sock
+            )
+            self.__transports.append(transport)
+
+        # requests go out through the command transport, whose sendto()
+        # matches socket.sendto()
+        self.command_socket = self.__transports[1]
+
+        self.send_connect()
+        self.__keep_alive_task = loop.create_task(self.__keep_alive())
+
+        return True
+
+    def close(self) -> None:
+        if self.__keep_alive_task is not None:
+            self.__keep_alive_task.cancel()
+            self.__keep_alive_task = None
+
+        for transport in self.__transports:
+            transport.close()
+        self.__transports = []
+
+        if self.__queue is not None:
+            self.__queue.put_nowait(_CLOSED)
+
+    def shutdown(self) -> None:
+        self.close()
+
+    async def frames(self) -> AsyncIterator[dict]:
+        """Yield frames as they arrive, until the client is closed.
+
+        Each frame is its suffix (frame_number, timestamp, ...) plus
+        "marker_sets", the list of its decoded marker sets (possibly empty).
+        """
+        if self.__queue is None:
+            raise RuntimeError("Client has not been started.")
+
+        while True:
+            frame = await self.__queue.get()
+            if frame is _CLOSED:
+                return
+            yield frame
+
+    def send_request(self, in_socket, command, command_str, address):
+        sent = super().send_request(in_socket, command, command_str, address)
+        # transports queue the datagram and return None rather than a byte count
+        return 0 if sent is None else sent
+
+    def __collect(self, marker_set: dict) -> None:
+        self.__marker_sets.append(marker_set)
+
+    def __enqueue(self, suffix: dict) -> None:
+        frame = dict(suffix, marker_sets=self.__marker_sets)
+        self.__marker_sets = []
+
+        # drop the oldest frame rather than let a slow consumer grow the queue
+        if self.__queue.qsize() >= self.max_queued_frames:
+            self.__queue.get_nowait()
+            self.dropped_frames += 1
+        self.__queue.put_nowait(frame)
+
+    async def __keep_alive(self) -> None:
+        while True:
+            if not self.settings["use_multicast"]:
+                self.send_keep_alive(
+                    self.command_socket,
+                    self.settings["server_ip"],
+                    self.settings["command_port"],
+                )
+            self.retry_model_definitions()
+            await asyncio.sleep(self.keep_alive_interval)
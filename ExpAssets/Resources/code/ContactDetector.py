@@ -0,0 +1,142 @@
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from OptiTracker import POSITION_SCALE
+
+
+class ContactDetector(object):
+    """
+    Finds the first frame in which the hand centroid enters one of a set of regions.
+
+    Regions are circles in tracker coordinates: a centre on two tracker axes
+    (x and z by default, the plane the experiment maps onto the screen) and a
+    radius, in the units OptiTracker reports (streamed positions times
+    POSITION_SCALE). They are set once per trial and kept as arrays, so each
+    batch of drained frames is tested in a single broadcast over frames and
+    regions, straight from the marker arrays, with nothing converted to pixels.
+
+    Attributes:
+        labels (list[str]): Region labels, in the order they are tested
+        contact (dict): First contact, or None; see update()
+        min_markers (int): Markers required for a frame to be tested
+
+    Methods:
+        set_regions(regions): Replace the regions and forget any contact
+        update(frames): Test a batch of frames, returning the first contact once found
+        reset(): Forget any contact, keeping the regions
+    """
+
+    def __init__(self, axes: Sequence[int] = (0, 2), min_markers: int = 1):
+        """
+        Initialize the ContactDetector object.
+
+        Args:
+            axes (Sequence[int], optional): Tracker axes the regions lie on. Defaults to (0, 2), i.e., x and z.
+            min_markers (int, optional): Markers required for a frame to be tested. Defaults to 1.
+        """
+        if len(axes) != 2:
+            raise ValueError('Regions must lie on exactly two axes.')
+
+        self.__axes = list(axes)
+        self.__min_markers = max(min_markers, 1)
+
+        self.__labels = []
+        self.__centres = np.zeros((0, 2))
+        self.__radii_sq = np.zeros(0)
+        self.__contact = None
+
+    @property
+    def labels(self) -> list[str]:
+        """Get the region labels, in the order they are tested."""
+        return list(self.__labels)
+
+    @property
+    def contact(self) -> dict | None:
+        """Get the first contact since the regions were set, if any."""
+        return self.__contact
+
+    @property
+    def min_markers(self) -> int:
+        """Get the number of markers required for a frame to be tested."""
+        return self.__min_markers
+
+    def set_regions(self, regions: dict[str, tuple[Sequence[float], float]]) -> None:
+        """
+        Replace the regions and forget any contact, e.g., in trial_prep.
+
+        Args:
+            regions (dict): Label -> (centre on the two axes, radius), in tracker coordinates.
+                Where regions overlap, the first listed wins.
+        """
+        self.__labels = list(regions)
+        self.__centres = np.array(
+            [centre for centre, _ in regions.values()], dtype=np.float64
+        ).reshape(-1, 2)
+        self.__radii_sq = np.array(
+            [radius for _, radius in regions.values()], dtype=np.float64
+        ) ** 2
+        self.__contact = None
+
+    def reset(self) -> None:
+        """Forget any contact, keeping the regions."""
+        self.__contact = None
+
+    def update(
+        self, frames: Iterable[tuple[int, float | None, np.ndarray]]
+    ) -> dict | None:
+        """
+        Test a batch of frames, oldest first, for contact with any region.
+
+        Each frame's centroid is taken over its visible (non-NaN) markers; frames
+        with fewer than min_markers visible are skipped. Once a contact is found,
+        later batches are not tested.
+
+        Args:
+            frames (Iterable): (frame_number, timestamp, markers (N, 3)) tuples, as drained
+                from a FrameQueue, with markers in streamed units
+
+        Returns:
+            dict: The first contact, with 'label', 'frame_number' and 'timestamp'
+                (None if the frame had none), or None if no frame has made contact yet
+        """
+        if self.__contact is not None or not self.__labels:
+            return self.__contact
+
+        frames = list(frames)
+        if not frames:
+            return None
+
+        counts = np.fromiter((len(markers) for _, _, markers in frames), np.int64, len(frames))
+        markers = np.concatenate([markers for _, _, markers in frames]).reshape(-1, 3)
+        markers = markers[:, self.__axes].astype(np.float64)
+
+        # per-frame centroids as one grouped reduction over every drained marker
+        visible = ~np.isnan(markers).any(axis=1)
+        owner = np.repeat(np.arange(len(frames)), counts)[visible]
+        seen = np.bincount(owner, minlength=len(frames))
+        sums = np.column_stack(
+            [
+                np.bincount(owner, weights=markers[visible, axis], minlength=len(frames))
+                for axis in range(2)
+            ]
+        )
+        centroids = sums / np.maximum(seen, 1)[:, np.newaxis] * POSITION_SCALE
+
+        # (frames, regions) squared distances against the precomputed radii
+        offsets = centroids[:, np.newaxis, :] - self.__centres[np.newaxis, :, :]
+        hits = (np.einsum('frk,frk->fr', offsets, offsets) <= self.__radii_sq)
+        hits &= (seen >= self.__min_markers)[:, np.newaxis]
+
+        touched = hits.any(axis=1)
+        if not touched.any():
+            return None
+
+        first = int(np.argmax(touched))
+        frame_number, timestamp, _ = frames[first]
+        self.__contact = {
+            'label': self.__labels[int(np.argmax(hits[first]))],
+            'frame_number': int(frame_number),
+            'timestamp': timestamp,
+        }
+        return self.__contact
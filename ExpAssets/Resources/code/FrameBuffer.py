@@ -0,0 +1,159 @@
+import threading
+import numpy as np
+
+
+# Row layout handed to OptiTracker; matches the columns of the trial CSV files.
+FRAME_DTYPE = [
+    ('frame_number', 'i8'),
+    ('pos_x', 'f8'),
+    ('pos_y', 'f8'),
+    ('pos_z', 'f8'),
+]
+
+
+class FrameBuffer(object):
+    """
+    A fixed-capacity, in-memory ring buffer of motion tracking frames.
+
+    Storage is preallocated as a (capacity, marker_count, 3) array, so writing a
+    frame is a single slice assignment and reading the most recent frames never
+    touches the disk. Intended to be written to by the NatNet data thread and
+    read from by OptiTracker.
+
+    Attributes:
+        marker_count (int): Maximum number of markers stored per frame
+        capacity (int): Number of frames retained before the oldest are overwritten
+        last_frame (int): Frame number of the most recently written frame (-1 if empty)
+
+    Methods:
+        write(frame_number, positions): Store marker positions for a frame
+        frames(num_frames): Get the most recent frames as marker rows
+        clear(): Discard all buffered frames
+    """
+
+    def __init__(self, marker_count: int, capacity: int = 1024):
+        """
+        Initialize the FrameBuffer object.
+
+        Args:
+            marker_count (int): Maximum number of markers stored per frame
+            capacity (int, optional): Number of frames to retain. Defaults to 1024.
+        """
+        if marker_count < 1:
+            raise ValueError('Marker count must be at least one.')
+
+        if capacity < 1:
+            raise ValueError('Capacity must be at least one frame.')
+
+        self.__marker_count = marker_count
+        self.__capacity = capacity
+
+        self.__frame_numbers = np.zeros(capacity, dtype=np.int64)
+        self.__counts = np.zeros(capacity, dtype=np.int64)
+        self.__positions = np.zeros((capacity, marker_count, 3), dtype=np.float64)
+
+        # total number of frames written; slot of frame i is i % capacity
+        self.__head = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def marker_count(self) -> int:
+        """Get the maximum number of markers stored per frame."""
+        return self.__marker_count
+
+    @property
+    def capacity(self) -> int:
+        """Get the number of frames retained."""
+        return self.__capacity
+
+    @property
+    def read_only(self) -> bool:
+        """Get whether the buffer is read-only; FrameBuffers are always writable."""
+        return False
+
+    @property
+    def last_frame(self) -> int:
+        """Get the frame number of the most recently written frame."""
+        with self.__lock:
+            if self.__head == 0:
+                return -1
+            return int(self.__frame_numbers[(self.__head - 1) % self.__capacity])
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return min(self.__head, self.__capacity)
+
+    def clear(self) -> None:
+        """Discard all buffered frames."""
+        with self.__lock:
+            self.__head = 0
+
+    def write(self, frame_number: int, positions: np.ndarray) -> None:
+        """
+        Store marker positions for a frame.
+
+        Consecutive writes sharing a frame number (e.g., several marker sets
+        streamed within one frame) are merged into the same slot. Markers in
+        excess of marker_count are dropped.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        with self.__lock:
+            last = (self.__head - 1) % self.__capacity
+
+            if self.__head and self.__frame_numbers[last] == frame_number:
+                slot = last
+                start = int(self.__counts[slot])
+            else:
+                slot = self.__head % self.__capacity
+                start = 0
+                self.__frame_numbers[slot] = frame_number
+                self.__head += 1
+
+            n = min(len(positions), self.__marker_count - start)
+            self.__positions[slot, start : start + n] = positions[:n]
+            self.__counts[slot] = start + n
+
+    def frames(self, num_frames: int) -> np.ndarray:
+        """
+        Get the most recent frames as one row per marker.
+
+        Mirrors the file-based query: only frames numbered within num_frames
+        of the latest frame are returned, so dropped frames shorten the result.
+
+        Args:
+            num_frames (int): Number of frames to look back from the latest frame
+
+        Returns:
+            np.ndarray: Structured array of (frame_number, pos_x, pos_y, pos_z) rows, oldest first
+        """
+        if num_frames < 0:
+            raise ValueError('Number of frames cannot be negative.')
+
+        with self.__lock:
+            n = min(num_frames, self.__head, self.__capacity)
+            slots = np.arange(self.__head - n, self.__head) % self.__capacity
+            frame_numbers = self.__frame_numbers[slots]
+            counts = self.__counts[slots]
+            positions = self.__positions[slots]
+
+        if n:
+            keep = frame_numbers > frame_numbers[-1] - num_frames
+            frame_numbers = frame_numbers[keep]
+            counts = counts[keep]
+            positions = positions[keep]
+
+        present = np.arange(self.__marker_count) < counts[:, None]
+        markers = positions[present]
+
+        rows = np.zeros(len(markers), dtype=FRAME_DTYPE)
+        rows['frame_number'] = np.repeat(frame_numbers, counts)
+        rows['pos_x'] = markers[:, 0]
+        rows['pos_y'] = markers[:, 1]
+        rows['pos_z'] = markers[:, 2]
+
+        return rows
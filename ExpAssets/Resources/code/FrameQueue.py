@@ -0,0 +1,214 @@
+import math
+import threading
+import numpy as np
+
+
+QUEUE_POLICIES = ('drop_oldest', 'block')
+
+
+class FrameQueue(object):
+    """
+    A bounded single-producer/single-consumer queue of motion tracking frames.
+
+    Storage is preallocated as a (capacity, marker_count, 3) array. The producer
+    (the NatNet data thread) fills the slot at head and then publishes it by
+    advancing head; the consumer (the trial loop) copies out everything between
+    tail and head and then advances tail. Each index is only ever written by one
+    side, so neither needs a lock.
+
+    When the queue is full, the 'drop_oldest' policy overwrites the oldest unread
+    frame; the consumer detects frames overwritten while it was copying them and
+    discards those. The 'block' policy waits up to block_timeout for the consumer
+    to make room and then drops the incoming frame, so a slow consumer can delay
+    packet reception by at most block_timeout per frame.
+
+    Attributes:
+        marker_count (int): Maximum number of markers stored per frame
+        capacity (int): Number of frames held before the queue is full
+        policy (str): 'drop_oldest' or 'block'
+        dropped (int): Frames lost to overflow so far
+        high_water (int): Most frames ever waiting to be read
+
+    Methods:
+        put(frame_number, positions, timestamp): Enqueue one frame (producer only)
+        drain(): Dequeue all waiting frames (consumer only)
+        clear(): Discard all waiting frames (consumer only)
+    """
+
+    def __init__(
+        self,
+        marker_count: int,
+        capacity: int = 1024,
+        policy: str = 'drop_oldest',
+        block_timeout: float = 0.002,
+    ):
+        """
+        Initialize the FrameQueue object.
+
+        Args:
+            marker_count (int): Maximum number of markers stored per frame
+            capacity (int, optional): Number of frames held. Defaults to 1024.
+            policy (str, optional): 'drop_oldest' or 'block'. Defaults to 'drop_oldest'.
+            block_timeout (float, optional): Seconds a 'block' put waits for room. Defaults to 0.002.
+        """
+        if marker_count < 1:
+            raise ValueError('Marker count must be at least one.')
+
+        if capacity < 1:
+            raise ValueError('Capacity must be at least one frame.')
+
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f'Policy must be one of {QUEUE_POLICIES}, got {policy!r}.')
+
+        self.__marker_count = marker_count
+        self.__capacity = capacity
+        self.__policy = policy
+        self.__block_timeout = block_timeout
+
+        self.__frame_numbers = np.zeros(capacity, dtype=np.int64)
+        self.__timestamps = np.zeros(capacity, dtype=np.float64)
+        self.__counts = np.zeros(capacity, dtype=np.int64)
+        self.__positions = np.zeros((capacity, marker_count, 3), dtype=np.float64)
+
+        # total frames published (written by the producer only) and consumed
+        # (written by the consumer only); frame i lives in slot i % capacity
+        self.__head = 0
+        self.__tail = 0
+        # frames whose slot the producer has started writing; runs one ahead
+        # of head while a put is in progress
+        self.__reserved = 0
+
+        # frames lost to overflow: overwritten before they were read (counted by
+        # the consumer) and refused while full (counted by the producer)
+        self.__overwritten = 0
+        self.__refused = 0
+        self.__high_water = 0
+
+        # set by the consumer whenever it frees space; only used by 'block'
+        self.__space = threading.Event()
+
+    @property
+    def marker_count(self) -> int:
+        """Get the maximum number of markers stored per frame."""
+        return self.__marker_count
+
+    @property
+    def capacity(self) -> int:
+        """Get the number of frames held before the queue is full."""
+        return self.__capacity
+
+    @property
+    def policy(self) -> str:
+        """Get the overflow policy."""
+        return self.__policy
+
+    @property
+    def dropped(self) -> int:
+        """Get the number of frames lost to overflow so far."""
+        return self.__overwritten + self.__refused
+
+    @property
+    def high_water(self) -> int:
+        """Get the most frames ever waiting to be read."""
+        return self.__high_water
+
+    def __len__(self) -> int:
+        return min(self.__head - self.__tail, self.__capacity)
+
+    def put(
+        self, frame_number: int, positions: np.ndarray, timestamp: float | None = None
+    ) -> bool:
+        """
+        Enqueue one frame. Markers in excess of marker_count are dropped.
+
+        Must only be called from the producer thread.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+            timestamp (float, optional): Frame time in seconds. Defaults to None.
+
+        Returns:
+            bool: False if the frame was dropped ('block' policy only)
+        """
+        positions = np.asarray(positions).reshape(-1, 3)
+
+        if (
+            self.__policy == 'block'
+            and self.__head - self.__tail >= self.__capacity
+            and not self.__wait_for_space()
+        ):
+            self.__refused += 1
+            return False
+
+        slot = self.__head % self.__capacity
+        n = min(len(positions), self.__marker_count)
+
+        self.__reserved = self.__head + 1
+
+        self.__frame_numbers[slot] = frame_number
+        self.__timestamps[slot] = np.nan if timestamp is None else timestamp
+        self.__positions[slot, :n] = positions[:n]
+        self.__counts[slot] = n
+
+        # publish only once the slot is fully written
+        self.__head += 1
+
+        depth = min(self.__head - self.__tail, self.__capacity)
+        if depth > self.__high_water:
+            self.__high_water = depth
+
+        return True
+
+    def drain(self) -> list[tuple[int, float | None, np.ndarray]]:
+        """
+        Dequeue all waiting frames, oldest first.
+
+        Must only be called from the consumer thread.
+
+        Returns:
+            list[tuple[int, float | None, np.ndarray]]: (frame_number, timestamp, positions (N, 3)) per frame
+        """
+        head = self.__head
+        start = max(self.__tail, head - self.__capacity)
+        if start == head:
+            return []
+
+        slots = np.arange(start, head) % self.__capacity
+        frame_numbers = self.__frame_numbers[slots]
+        timestamps = self.__timestamps[slots]
+        counts = self.__counts[slots]
+        positions = self.__positions[slots]
+
+        # frames whose slots the producer started overwriting while they were
+        # being copied are torn (only possible under 'drop_oldest')
+        skip = min(max(0, self.__reserved - self.__capacity - start), head - start)
+
+        self.__overwritten += start - self.__tail + skip
+        self.__tail = head
+        self.__space.set()
+
+        frames = []
+        for i in range(skip, len(slots)):
+            timestamp = float(timestamps[i])
+            frames.append(
+                (
+                    int(frame_numbers[i]),
+                    None if math.isnan(timestamp) else timestamp,
+                    positions[i, : counts[i]],
+                )
+            )
+        return frames
+
+    def clear(self) -> None:
+        """Discard all waiting frames. Must only be called from the consumer thread."""
+        self.__tail = self.__head
+        self.__space.set()
+
+    def __wait_for_space(self) -> bool:
+        self.__space.clear()
+        # re-check after clearing, in case the consumer drained in between
+        if self.__head - self.__tail < self.__capacity:
+            return True
+        self.__space.wait(self.__block_timeout)
+        return self.__head - self.__tail < self.__capacity
@@ -0,0 +1,276 @@
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+from FrameBuffer import FRAME_DTYPE
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    trial TEXT NOT NULL,
+    frame_number INTEGER NOT NULL,
+    marker INTEGER NOT NULL,
+    pos_x REAL,
+    pos_y REAL,
+    pos_z REAL,
+    timestamp REAL
+);
+CREATE INDEX IF NOT EXISTS frames_trial_frame ON frames (trial, frame_number);
+CREATE TABLE IF NOT EXISTS trials (
+    trial TEXT PRIMARY KEY,
+    metadata TEXT
+);
+"""
+
+
+class FrameStore(object):
+    """
+    A session's motion tracking frames, stored in one SQLite database.
+
+    Frames are stored one row per marker, keyed by trial and frame number, and
+    indexed on (trial, frame_number), so querying the latest frames of a trial
+    is an indexed range query however long the session has run. Each marker set
+    is inserted with a single executemany(). Inserts are committed every
+    commit_frames frames, and when a trial ends.
+
+    The database is opened in WAL mode, so other connections (e.g., an analysis
+    script) can read it while frames are being written, without blocking the
+    writer. Hidden (NaN) markers are stored as NULL and read back as NaN.
+
+    Queries default to the current trial or, between trials, the last one begun
+    (including in an earlier session, when the database is reopened).
+
+    Attributes:
+        path (str): Path of the database file
+        trial (str): Trial frames are currently written to (None between trials)
+        last_frame (int): Frame number of the latest frame of the queried trial (-1 if none)
+
+    Methods:
+        begin_trial(trial): Start writing frames to a trial
+        write_frame(frame_number, positions, timestamp): Insert the markers of a frame
+        set_metadata(metadata): Set the current trial's metadata
+        end_trial(discard): Stop writing frames to the current trial
+        frames(num_frames, trial): Get a trial's most recent frames as marker rows
+        trials(): List the trials stored
+        flush(): Commit pending inserts
+        close(): Commit and close the database
+    """
+
+    def __init__(self, path: str, commit_frames: int = 120):
+        """
+        Open (or create) the database.
+
+        Args:
+            path (str): Path of the database file
+            commit_frames (int, optional): Frames inserted between commits. Defaults to 120.
+        """
+        if commit_frames < 1:
+            raise ValueError('Commit interval must be at least one frame.')
+
+        self.__path = path
+        self.__commit_frames = commit_frames
+
+        # written and queried from whichever threads own the tracker; the lock
+        # serializes them over the one connection
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        # in WAL mode, commits only append to the log; it is synced at checkpoints
+        self.__db.execute('PRAGMA synchronous=NORMAL')
+        self.__db.executescript(SCHEMA)
+
+        self.__trial = None
+        # trial queried when none is being written, i.e., the last one begun
+        last = self.__db.execute(
+            'SELECT trial FROM trials ORDER BY rowid DESC LIMIT 1'
+        ).fetchone()
+        self.__last_trial = None if last is None else last[0]
+        self.__uncommitted = 0
+        self.__frame_number = None
+        self.__marker = 0
+
+    def __enter__(self) -> 'FrameStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def path(self) -> str:
+        """Get the path of the database file."""
+        return self.__path
+
+    @property
+    def trial(self) -> str | None:
+        """Get the trial frames are currently written to."""
+        return self.__trial
+
+    @property
+    def last_frame(self) -> int:
+        """Get the frame number of the latest frame of the queried trial."""
+        with self.__lock:
+            (last,) = self.__db.execute(
+                'SELECT MAX(frame_number) FROM frames WHERE trial = ?',
+                (self.__query_trial(),),
+            ).fetchone()
+        return -1 if last is None else last
+
+    def begin_trial(self, trial: str) -> None:
+        """
+        Start writing frames to a trial, ending any current one.
+
+        Frames already stored for the trial (e.g., from an aborted attempt that
+        was not discarded) are replaced.
+
+        Args:
+            trial (str): Trial key, e.g., the trial file's path relative to the data directory
+        """
+        self.end_trial()
+
+        with self.__lock:
+            self.__db.execute('DELETE FROM frames WHERE trial = ?', (trial,))
+            self.__db.execute('DELETE FROM trials WHERE trial = ?', (trial,))
+            self.__db.execute('INSERT INTO trials (trial) VALUES (?)', (trial,))
+            self.__db.commit()
+
+            self.__trial = self.__last_trial = trial
+            self.__frame_number = None
+
+    def write_frame(
+        self, frame_number: int, positions: np.ndarray, timestamp: float | None = None
+    ) -> None:
+        """
+        Insert the markers of a frame into the current trial; ignored between trials.
+
+        Consecutive writes sharing a frame number (e.g., several marker sets
+        streamed within one frame) continue its marker numbering.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+            timestamp (float, optional): Frame time in seconds
+        """
+        if self.__trial is None:
+            return
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        with self.__lock:
+            if frame_number != self.__frame_number:
+                self.__frame_number = frame_number
+                self.__marker = 0
+                self.__uncommitted += 1
+
+            start = self.__marker
+            self.__marker += len(positions)
+
+            self.__db.executemany(
+                'INSERT INTO frames VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (self.__trial, frame_number, start + i, x, y, z, timestamp)
+                    for i, (x, y, z) in enumerate(positions.tolist())
+                ],
+            )
+
+            if self.__uncommitted >= self.__commit_frames:
+                self.__commit()
+
+    def set_metadata(self, metadata: dict) -> None:
+        """Set the current trial's metadata, stored as JSON in the trials table."""
+        if self.__trial is None:
+            return
+
+        with self.__lock:
+            self.__db.execute(
+                'UPDATE trials SET metadata = ? WHERE trial = ?',
+                (json.dumps(metadata, default=str), self.__trial),
+            )
+
+    def end_trial(self, discard: bool = False) -> None:
+        """
+        Stop writing frames to the current trial, and commit them.
+
+        Args:
+            discard (bool, optional): Delete the trial's frames instead. Defaults to False.
+        """
+        if self.__trial is None:
+            return
+
+        with self.__lock:
+            if discard:
+                self.__db.execute('DELETE FROM frames WHERE trial = ?', (self.__trial,))
+                self.__db.execute('DELETE FROM trials WHERE trial = ?', (self.__trial,))
+                self.__last_trial = None
+
+            self.__trial = None
+            self.__commit()
+
+    def frames(self, num_frames: int, trial: str | None = None) -> np.ndarray:
+        """
+        Get a trial's most recent frames as one row per marker.
+
+        Mirrors FrameBuffer.frames(): only frames numbered within num_frames of
+        the trial's latest frame are returned, so dropped frames shorten the result.
+
+        Args:
+            num_frames (int): Number of frames to look back from the latest frame
+            trial (str, optional): Trial to query. Defaults to the current trial, or else the last one begun.
+
+        Returns:
+            np.ndarray: Structured array of (frame_number, pos_x, pos_y, pos_z) rows, oldest first
+        """
+        if num_frames < 0:
+            raise ValueError('Number of frames cannot be negative.')
+
+        with self.__lock:
+            trial = trial if trial is not None else self.__query_trial()
+            # both statements are served from the (trial, frame_number) index
+            rows = self.__db.execute(
+                'SELECT frame_number, pos_x, pos_y, pos_z FROM frames '
+                'WHERE trial = ? AND frame_number > '
+                '(SELECT MAX(frame_number) FROM frames WHERE trial = ?) - ? '
+                'ORDER BY frame_number, marker',
+                (trial, trial, num_frames),
+            ).fetchall()
+
+        if not rows:
+            return np.zeros(0, dtype=FRAME_DTYPE)
+
+        # NULL (hidden) positions become NaN
+        return np.array(rows, dtype=FRAME_DTYPE)
+
+    def trials(self) -> dict:
+        """
+        List the trials stored.
+
+        Returns:
+            dict: Metadata of each trial (None if unset), by trial key
+        """
+        with self.__lock:
+            rows = self.__db.execute('SELECT trial, metadata FROM trials').fetchall()
+
+        return {
+            trial: None if metadata is None else json.loads(metadata)
+            for trial, metadata in rows
+        }
+
+    def flush(self) -> None:
+        """Commit pending inserts, making them visible to other connections."""
+        with self.__lock:
+            self.__commit()
+
+    def close(self) -> None:
+        """End any current trial, then commit and close the database."""
+        self.end_trial()
+        with self.__lock:
+            self.__db.commit()
+            self.__db.close()
+
+    def __commit(self) -> None:
+        self.__db.commit()
+        self.__uncommitted = 0
+
+    def __query_trial(self) -> str | None:
+        return self.__trial if self.__trial is not None else self.__last_trial
@@ -0,0 +1,238 @@
+import numpy as np
+
+
+DIFFERENCE_METHODS = ('central', 'savgol')
+
+
+class Kinematics(object):
+    """
+    An incremental position/velocity/acceleration estimator fed one frame at a time.
+
+    Keeps a short ring of recent samples and updates derivative estimates as each
+    frame arrives, so reads are O(1) rather than recomputed from a queried window.
+    Time steps come from real timestamps when supplied, and from frame numbers
+    otherwise, so dropped frames widen dt instead of distorting the estimates.
+
+    Attributes:
+        sample_rate (float): Sampling rate in Hz, used to turn frame numbers into time
+        method (str): 'central' differences, or 'savgol' (local quadratic fit)
+        frame_number (int): Frame number of the latest sample (-1 if empty)
+        dropped_frames (int): Frames missing between consecutive samples so far
+
+    Methods:
+        update(frame_number, position, timestamp): Add a sample and refresh estimates
+        position(): Latest position
+        velocity(): Latest velocity vector
+        speed(): Magnitude of the latest velocity
+        acceleration(): Latest acceleration vector
+        displacement(num_frames): Straight-line distance covered over the last num_frames frames
+        average_speed(num_frames): Displacement over the last num_frames frames divided by elapsed time
+        reset(): Discard all samples
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 120,
+        method: str = 'central',
+        savgol_window: int = 7,
+        history: int = 256,
+    ):
+        """
+        Initialize the Kinematics object.
+
+        Args:
+            sample_rate (float, optional): Sampling rate in Hz. Defaults to 120.
+            method (str, optional): 'central' or 'savgol'. Defaults to 'central'.
+            savgol_window (int, optional): Samples used by the 'savgol' fit. Defaults to 7.
+            history (int, optional): Samples retained for displacement queries. Defaults to 256.
+        """
+        if method not in DIFFERENCE_METHODS:
+            raise ValueError(
+                f'Method must be one of {DIFFERENCE_METHODS}, got {method!r}.'
+            )
+
+        if savgol_window < 3:
+            raise ValueError('Savitzky-Golay window must cover at least three samples.')
+
+        if history < max(3, savgol_window):
+            raise ValueError('History must hold at least as many samples as the difference window.')
+
+        self.__sample_rate = sample_rate
+        self.__method = method
+        self.__savgol_window = savgol_window
+        self.__history = history
+
+        self.__frames = np.zeros(history, dtype=np.int64)
+        self.__times = np.zeros(history, dtype=np.float64)
+        self.__positions = np.zeros((history, 3), dtype=np.float64)
+
+        self.reset()
+
+    @property
+    def sample_rate(self) -> float:
+        """Get the sampling rate."""
+        return self.__sample_rate
+
+    @property
+    def method(self) -> str:
+        """Get the differencing method."""
+        return self.__method
+
+    @property
+    def frame_number(self) -> int:
+        """Get the frame number of the latest sample."""
+        if self.__count == 0:
+            return -1
+        return int(self.__frames[self.__slot(0)])
+
+    @property
+    def dropped_frames(self) -> int:
+        """Get the number of frames missing between samples so far."""
+        return self.__dropped
+
+    def __len__(self) -> int:
+        return min(self.__count, self.__history)
+
+    def reset(self) -> None:
+        """Discard all samples and estimates."""
+        self.__count = 0
+        self.__dropped = 0
+        self.__velocity = np.zeros(3)
+        self.__acceleration = np.zeros(3)
+
+    def update(
+        self, frame_number: int, position: np.ndarray, timestamp: float | None = None
+    ) -> None:
+        """
+        Add a sample and refresh the velocity and acceleration estimates.
+
+        Samples that do not advance the frame number (duplicates, or frames
+        arriving out of order) are ignored.
+
+        Args:
+            frame_number (int): Frame number of the sample
+            position (np.ndarray): Position (x, y, z)
+            timestamp (float, optional): Sample time in seconds; derived from frame_number if omitted
+        """
+        if self.__count and frame_number <= self.frame_number:
+            return
+
+        if self.__count:
+            self.__dropped += frame_number - self.frame_number - 1
+
+        slot = self.__count % self.__history
+        self.__frames[slot] = frame_number
+        self.__times[slot] = (
+            frame_number / self.__sample_rate if timestamp is None else timestamp
+        )
+        self.__positions[slot] = position
+        self.__count += 1
+
+        if self.__method == 'savgol':
+            self.__savgol()
+        else:
+            self.__central()
+
+    def position(self) -> np.ndarray:
+        """Get the latest position."""
+        self.__require(1)
+        return self.__positions[self.__slot(0)].copy()
+
+    def velocity(self) -> np.ndarray:
+        """Get the latest velocity vector (units/s)."""
+        return self.__velocity.copy()
+
+    def speed(self) -> float:
+        """Get the magnitude of the latest velocity (units/s)."""
+        return float(np.linalg.norm(self.__velocity))
+
+    def acceleration(self) -> np.ndarray:
+        """Get the latest acceleration vector (units/s^2)."""
+        return self.__acceleration.copy()
+
+    def displacement(self, num_frames: int) -> float:
+        """
+        Get the straight-line distance between the latest sample and the oldest
+        retained sample within num_frames frames of it.
+
+        Args:
+            num_frames (int): Number of frames to look back
+
+        Returns:
+            float: Euclidean distance
+        """
+        first, last = self.__span(num_frames)
+        return float(np.linalg.norm(self.__positions[last] - self.__positions[first]))
+
+    def average_speed(self, num_frames: int) -> float:
+        """
+        Get displacement over the last num_frames frames divided by the time it took.
+
+        Args:
+            num_frames (int): Number of frames to look back
+
+        Returns:
+            float: Average speed (units/s)
+        """
+        first, last = self.__span(num_frames)
+        elapsed = self.__times[last] - self.__times[first]
+        if elapsed <= 0:
+            raise ValueError('Window must span at least two samples.')
+
+        distance = np.linalg.norm(self.__positions[last] - self.__positions[first])
+        return float(distance / elapsed)
+
+    def __slot(self, age: int) -> int:
+        """Ring index of the sample `age` steps before the latest."""
+        return (self.__count - 1 - age) % self.__history
+
+    def __require(self, samples: int) -> None:
+        if len(self) < samples:
+            raise ValueError(f'At least {samples} sample(s) are required.')
+
+    def __span(self, num_frames: int) -> tuple[int, int]:
+        """Ring indices of the oldest sample within num_frames of the latest, and the latest."""
+        self.__require(1)
+
+        last = self.__slot(0)
+        lookback = self.__frames[last] - num_frames
+        age = 0
+        # walk back while the next-older sample is still inside the window
+        while age + 1 < len(self) and self.__frames[self.__slot(age + 1)] > lookback:
+            age += 1
+
+        return self.__slot(age), last
+
+    def __central(self) -> None:
+        if len(self) < 2:
+            return
+
+        p0, p1 = self.__positions[self.__slot(1)], self.__positions[self.__slot(0)]
+        t0, t1 = self.__times[self.__slot(1)], self.__times[self.__slot(0)]
+        latest = (p1 - p0) / (t1 - t0)
+
+        if len(self) < 3:
+            self.__velocity = latest
+            return
+
+        pm, tm = self.__positions[self.__slot(2)], self.__times[self.__slot(2)]
+        earlier = (p0 - pm) / (t0 - tm)
+
+        # central difference about the middle sample, valid for uneven spacing
+        self.__velocity = (p1 - pm) / (t1 - tm)
+        self.__acceleration = 2 * (latest - earlier) / (t1 - tm)
+
+    def __savgol(self) -> None:
+        n = min(len(self), self.__savgol_window)
+        if n < 3:
+            self.__central()
+            return
+
+        slots = [self.__slot(age) for age in range(n - 1, -1, -1)]
+        # fit on time relative to the latest sample, so derivatives at t=0 are
+        # simply the linear and (doubled) quadratic coefficients
+        t = self.__times[slots] - self.__times[slots[-1]]
+        coefficients = np.polyfit(t, self.__positions[slots], deg=2)
+
+        self.__velocity = coefficients[1]
+        self.__acceleration = 2 * coefficients[0]
@@ -0,0 +1,570 @@
+import math
+import multiprocessing
+import os
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from FrameBuffer import FRAME_DTYPE
+from natnetclient_rough import NatNetClient
+from OptiRecording import BinaryTrialWriter
+from TrialWriter import HEADER_SIZE, TrialWriter
+
+
+# Column order of CSV recordings written by the acquisition process
+CSV_FIELDS = ('pos_x', 'pos_y', 'pos_z', 'frame_number')
+RECORDING_FORMATS = ('csv', 'binary')
+
+# head, reserved, capacity, marker_count
+_HEADER_FIELDS = 4
+
+
+class SharedFrameRing(object):
+    """
+    A ring of motion tracking frames in a multiprocessing.shared_memory block.
+
+    One process creates the ring and is its only writer; others attach to it by
+    name, read-only. Frames are published like FrameQueue's: the writer bumps
+    'reserved' before filling a slot and 'head' once it is filled, so readers can
+    tell which frames were overwritten while they were copying them and discard
+    those. Readers never modify the ring, so any number can attach.
+
+    A reader supports the parts of the FrameBuffer and FrameQueue interfaces
+    OptiTracker and the trial loop use: frames(num_frames) for windowed queries,
+    and drain() for frames not yet seen by this reader.
+
+    Attributes:
+        name (str): Name of the shared memory block
+        marker_count (int): Maximum number of markers stored per frame
+        capacity (int): Number of frames retained before the oldest are overwritten
+        read_only (bool): Whether this instance is attached rather than the writer
+        last_frame (int): Frame number of the most recently written frame (-1 if empty)
+        dropped (int): Frames this reader missed because they were overwritten first
+
+    Methods:
+        attach(name): Attach to an existing ring, read-only
+        write(frame_number, positions, timestamp): Publish one frame (writer only)
+        frames(num_frames): Get the most recent frames as marker rows
+        drain(): Get frames published since the last drain
+        clear(): Ignore all frames published so far
+        close(): Detach from the shared memory
+        unlink(): Free the shared memory (writer only, after close)
+    """
+
+    def __init__(self, marker_count: int, capacity: int = 1024):
+        """
+        Create a new ring in shared memory; the creating instance is the writer.
+
+        Args:
+            marker_count (int): Maximum number of markers stored per frame
+            capacity (int, optional): Number of frames to retain. Defaults to 1024.
+        """
+        if marker_count < 1:
+            raise ValueError('Marker count must be at least one.')
+
+        if capacity < 1:
+            raise ValueError('Capacity must be at least one frame.')
+
+        shm = shared_memory.SharedMemory(
+            create=True, size=self.__nbytes(marker_count, capacity)
+        )
+        self.__setup(shm, marker_count, capacity, read_only=False)
+        self.__header[:] = (0, 0, capacity, marker_count)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedFrameRing':
+        """
+        Attach to a ring created by another process, read-only.
+
+        Args:
+            name (str): Name of the ring's shared memory block
+
+        Returns:
+            SharedFrameRing: A reader over the ring
+        """
+        try:
+            # the creating process owns the block; attaching must not register it
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always tracks, and would unlink the block at exit
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+        _, _, capacity, marker_count = np.ndarray(
+            _HEADER_FIELDS, dtype=np.int64, buffer=shm.buf
+        ).tolist()
+
+        ring = cls.__new__(cls)
+        ring.__setup(shm, marker_count, capacity, read_only=True)
+        return ring
+
+    @property
+    def name(self) -> str:
+        """Get the name of the shared memory block."""
+        return self.__shm.name
+
+    @property
+    def marker_count(self) -> int:
+        """Get the maximum number of markers stored per frame."""
+        return self.__marker_count
+
+    @property
+    def capacity(self) -> int:
+        """Get the number of frames retained."""
+        return self.__capacity
+
+    @property
+    def read_only(self) -> bool:
+        """Get whether this instance is a read-only reader."""
+        return self.__read_only
+
+    @property
+    def dropped(self) -> int:
+        """Get the number of frames this reader missed because they were overwritten."""
+        return self.__dropped
+
+    @property
+    def last_frame(self) -> int:
+        """Get the frame number of the most recently written frame."""
+        head = int(self.__header[0])
+        if head <= self.__floor:
+            return -1
+        return int(self.__frame_numbers[(head - 1) % self.__capacity])
+
+    def __len__(self) -> int:
+        return min(int(self.__header[0]) - self.__floor, self.__capacity)
+
+    def write(
+        self, frame_number: int, positions: np.ndarray, timestamp: float | None = None
+    ) -> None:
+        """
+        Publish one frame. Markers in excess of marker_count are dropped.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+            timestamp (float, optional): Frame time in seconds. Defaults to None.
+        """
+        if self.__read_only:
+            raise PermissionError('Attached rings are read-only.')
+
+        positions = np.asarray(positions).reshape(-1, 3)
+        head = int(self.__header[0])
+        slot = head % self.__capacity
+        n = min(len(positions), self.__marker_count)
+
+        self.__header[1] = head + 1
+        self.__frame_numbers[slot] = frame_number
+        self.__timestamps[slot] = np.nan if timestamp is None else timestamp
+        self.__positions[slot, :n] = positions[:n]
+        self.__counts[slot] = n
+        # publish only once the slot is fully written
+        self.__header[0] = head + 1
+
+    def frames(self, num_frames: int) -> np.ndarray:
+        """
+        Get the most recent frames as one row per marker, as FrameBuffer.frames does.
+
+        Args:
+            num_frames (int): Number of frames to look back from the latest frame
+
+        Returns:
+            np.ndarray: Structured array of (frame_number, pos_x, pos_y, pos_z) rows, oldest first
+        """
+        if num_frames < 0:
+            raise ValueError('Number of frames cannot be negative.')
+
+        head = int(self.__header[0])
+        start = max(head - num_frames, self.__floor, head - self.__capacity)
+        frame_numbers, _, counts, positions = self.__copy(start, head)
+
+        if len(frame_numbers):
+            keep = frame_numbers > frame_numbers[-1] - num_frames
+            frame_numbers = frame_numbers[keep]
+            counts = counts[keep]
+            positions = positions[keep]
+
+        present = np.arange(self.__marker_count) < counts[:, None]
+        markers = positions[present]
+
+        rows = np.zeros(len(markers), dtype=FRAME_DTYPE)
+        rows['frame_number'] = np.repeat(frame_numbers, counts)
+        rows['pos_x'] = markers[:, 0]
+        rows['pos_y'] = markers[:, 1]
+        rows['pos_z'] = markers[:, 2]
+
+        return rows
+
+    def drain(self) -> list[tuple[int, float | None, np.ndarray]]:
+        """
+        Get the frames published since this reader's last drain, oldest first.
+
+        Returns:
+            list[tuple[int, float | None, np.ndarray]]: (frame_number, timestamp, positions (N, 3)) per frame
+        """
+        head = int(self.__header[0])
+        start = max(self.__cursor, head - self.__capacity)
+        frame_numbers, timestamps, counts, positions = self.__copy(start, head)
+
+        self.__dropped += head - self.__cursor - len(frame_numbers)
+        self.__cursor = head
+
+        frames = []
+        for i in range(len(frame_numbers)):
+            timestamp = float(timestamps[i])
+            frames.append(
+                (
+                    int(frame_numbers[i]),
+                    None if math.isnan(timestamp) else timestamp,
+                    positions[i, : counts[i]],
+                )
+            )
+        return frames
+
+    def clear(self) -> None:
+        """Ignore all frames published so far, for this instance only."""
+        self.__floor = self.__cursor = int(self.__header[0])
+
+    def close(self) -> None:
+        """Detach from the shared memory."""
+        # views must go before the block can be closed
+        self.__header = self.__frame_numbers = self.__timestamps = None
+        self.__counts = self.__positions = None
+        self.__shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory; call once, from the writer, after close()."""
+        self.__shm.unlink()
+
+    def __setup(
+        self,
+        shm: shared_memory.SharedMemory,
+        marker_count: int,
+        capacity: int,
+        read_only: bool,
+    ) -> None:
+        self.__shm = shm
+        self.__marker_count = marker_count
+        self.__capacity = capacity
+        self.__read_only = read_only
+
+        # this reader's view: frames before floor are cleared, cursor is drain()'s position
+        self.__floor = 0
+        self.__cursor = 0
+        self.__dropped = 0
+
+        offset = 0
+        arrays = []
+        for shape, dtype in (
+            ((_HEADER_FIELDS,), np.int64),
+            ((capacity,), np.int64),
+            ((capacity,), np.float64),
+            ((capacity,), np.int64),
+            ((capacity, marker_count, 3), np.float64),
+        ):
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            offset += array.nbytes
+            arrays.append(array)
+
+        (
+            self.__header,
+            self.__frame_numbers,
+            self.__timestamps,
+            self.__counts,
+            self.__positions,
+        ) = arrays
+
+        if read_only:
+            for array in arrays:
+                array.flags.writeable = False
+            self.clear()
+
+    @staticmethod
+    def __nbytes(marker_count: int, capacity: int) -> int:
+        return 8 * (_HEADER_FIELDS + 3 * capacity + capacity * marker_count * 3)
+
+    def __copy(self, start: int, head: int) -> tuple[np.ndarray, ...]:
+        """Copy frames [start, head), dropping any the writer overwrote meanwhile."""
+        slots = np.arange(start, head) % self.__capacity
+        frame_numbers = self.__frame_numbers[slots]
+        timestamps = self.__timestamps[slots]
+        counts = self.__counts[slots]
+        positions = self.__positions[slots]
+
+        torn = int(self.__header[1]) - self.__capacity - start
+        skip = min(max(0, torn), len(slots))
+
+        return frame_numbers[skip:], timestamps[skip:], counts[skip:], positions[skip:]
+
+
+def _run_acquisition(
+    conn: Connection, settings: dict, marker_count: int, capacity: int
+) -> None:
+    """Entry point of the acquisition process: stream into a shared ring, record on request."""
+    ring = SharedFrameRing(marker_count, capacity)
+    client = NatNetClient(settings)
+
+    # touched only by the client's data thread, and by command handling below
+    pending = []
+    recording = {'writer': None}
+
+    def collect(marker_set: dict) -> None:
+        if len(marker_set['markers']):
+            pending.append(marker_set['markers'])
+
+    def publish(suffix: dict) -> None:
+        if not pending:
+            return
+        markers = pending[0] if len(pending) == 1 else np.concatenate(pending)
+        pending.clear()
+
+        ring.write(suffix['frame_number'], markers, suffix['timestamp'])
+
+        writer = recording['writer']
+        if writer is not None:
+            writer.write_frame(suffix['frame_number'], markers, suffix['timestamp'])
+
+    def end(metadata: dict | None, discard: bool) -> int:
+        writer, recording['writer'] = recording['writer'], None
+        if writer is None:
+            return 0
+        if metadata:
+            writer.set_metadata(metadata)
+        writer.close()
+        if discard and os.path.exists(writer.path):
+            os.remove(writer.path)
+        return writer.rows_written
+
+    client.markers_listener = collect
+    client.suffix_listener = publish
+
+    try:
+        if not client.startup():
+            conn.send(('error', 'Could not connect to the NatNet server.'))
+            return
+
+        conn.send(('ok', ring.name))
+
+        while True:
+            command, *args = conn.recv()
+
+            try:
+                if command == 'begin':
+                    path, recording_format = args
+                    end(None, False)
+                    if recording_format == 'binary':
+                        recording['writer'] = BinaryTrialWriter(path)
+                    else:
+                        recording['writer'] = TrialWriter(
+                            path, CSV_FIELDS, header_size=HEADER_SIZE
+                        )
+                    conn.send(('ok', None))
+
+                elif command == 'end':
+                    conn.send(('ok', end(*args)))
+
+                elif command == 'flush':
+                    writer = recording['writer']
+                    if writer is not None:
+                        writer.flush()
+                    conn.send(('ok', 0 if writer is None else writer.rows_written))
+
+                elif command == 'telemetry':
+                    (reset,) = args
+                    conn.send(('ok', client.telemetry.frame_stats()))
+                    if reset:
+                        client.telemetry.reset()
+
+                elif command == 'stop':
+                    conn.send(('ok', None))
+                    break
+
+                else:
+                    conn.send(('error', f'Unknown command {command!r}.'))
+
+            except Exception as e:
+                conn.send(('error', f'{type(e).__name__}: {e}'))
+
+    finally:
+        end(None, False)
+        client.shutdown()
+        ring.close()
+        ring.unlink()
+
+
+class MocapProcess(object):
+    """
+    Runs NatNet acquisition and trial recording in a separate process.
+
+    The child process owns the NatNetClient, its receive threads and the trial
+    writers, so packet decoding and disk writes never compete with the display
+    loop for the interpreter lock. Decoded frames are published into a
+    SharedFrameRing, which this process reads through a read-only attachment
+    (see ring). Recording is controlled over a pipe.
+
+    Usage:
+        mocap = MocapProcess({'decoder': 'numpy'}, marker_count=10)
+        if mocap.start():
+            tracker = OptiTracker(marker_count=10, frame_buffer=mocap.ring)
+            mocap.begin_recording('trial.txt')
+            ...
+            mocap.end_recording()
+            mocap.stop()
+
+    Attributes:
+        ring (SharedFrameRing): Read-only view of the published frames (None until started)
+
+    Methods:
+        start(): Start the acquisition process and attach to its ring
+        begin_recording(path, recording_format): Start writing frames to a trial file
+        flush_recording(): Write buffered frames to disk now
+        end_recording(metadata, discard): Close the trial file
+        telemetry(reset): Get the child's stream statistics
+        stop(): Stop acquisition and the process
+    """
+
+    def __init__(
+        self,
+        settings: dict = {},
+        marker_count: int = 10,
+        capacity: int = 1024,
+        timeout: float = 5.0,
+    ):
+        """
+        Initialize the MocapProcess object.
+
+        Args:
+            settings (dict, optional): NatNetClient settings for the child. Defaults to {}.
+            marker_count (int, optional): Maximum number of markers per frame. Defaults to 10.
+            capacity (int, optional): Frames retained in the ring. Defaults to 1024.
+            timeout (float, optional): Seconds to wait for the child to answer a command. Defaults to 5.0.
+        """
+        self.__settings = dict(settings)
+        self.__marker_count = marker_count
+        self.__capacity = capacity
+        self.__timeout = timeout
+
+        self.__process = None
+        self.__conn = None
+        self.__ring = None
+
+    @property
+    def ring(self) -> SharedFrameRing | None:
+        """Get the read-only view of the published frames."""
+        return self.__ring
+
+    def start(self) -> bool:
+        """
+        Start the acquisition process and attach to its ring.
+
+        Returns:
+            bool: Whether the child connected to the NatNet server
+        """
+        # spawn rather than fork, so the child inherits no SDL or audio state
+        context = multiprocessing.get_context('spawn')
+        self.__conn, child_conn = context.Pipe()
+
+        self.__process = context.Process(
+            target=_run_acquisition,
+            args=(child_conn, self.__settings, self.__marker_count, self.__capacity),
+            daemon=True,
+        )
+        self.__process.start()
+        child_conn.close()
+
+        try:
+            name = self.__receive()
+        except RuntimeError as e:
+            print(f'ERROR: {e}')
+            self.__process.join(self.__timeout)
+            return False
+
+        self.__ring = SharedFrameRing.attach(name)
+        return True
+
+    def begin_recording(self, path: str, recording_format: str = 'csv') -> None:
+        """
+        Start writing frames to a trial file, closing any open one.
+
+        Args:
+            path (str): Path of the file to create
+            recording_format (str, optional): 'csv' or 'binary'. Defaults to 'csv'.
+        """
+        if recording_format not in RECORDING_FORMATS:
+            raise ValueError(
+                f'Recording format must be one of {RECORDING_FORMATS}, got {recording_format!r}.'
+            )
+        self.__request('begin', path, recording_format)
+
+    def flush_recording(self) -> int:
+        """
+        Write the child's buffered frames to disk now.
+
+        Returns:
+            int: Rows written to the trial file so far
+        """
+        return self.__request('flush')
+
+    def end_recording(self, metadata: dict | None = None, discard: bool = False) -> int:
+        """
+        Close the trial file.
+
+        Args:
+            metadata (dict, optional): Stored in the trial file's reserved header. Defaults to None.
+            discard (bool, optional): Delete the file once closed. Defaults to False.
+
+        Returns:
+            int: Rows written to the trial file
+        """
+        return self.__request('end', metadata, discard)
+
+    def telemetry(self, reset: bool = False) -> dict:
+        """
+        Get the stream statistics gathered by the child's NatNetClient.
+
+        Args:
+            reset (bool, optional): Start a new period once read. Defaults to False.
+
+        Returns:
+            dict: StreamTelemetry.frame_stats() of the child's client
+        """
+        return self.__request('telemetry', reset)
+
+    def stop(self) -> None:
+        """Stop acquisition, close any open trial file, and end the process."""
+        if self.__process is None:
+            return
+
+        if self.__ring is not None:
+            self.__ring.close()
+            self.__ring = None
+
+        if self.__process.is_alive():
+            try:
+                self.__request('stop')
+            except (RuntimeError, OSError):
+                pass
+            self.__process.join(self.__timeout)
+            if self.__process.is_alive():
+                self.__process.terminate()
+
+        self.__conn.close()
+        self.__process = None
+
+    def __request(self, command: str, *args):
+        if self.__process is None:
+            raise RuntimeError('Acquisition process has not been started.')
+        self.__conn.send((command, *args))
+        return self.__receive()
+
+    def __receive(self):
+        try:
+            if not self.__conn.poll(self.__timeout):
+                raise RuntimeError('Acquisition process did not respond.')
+            status, payload = self.__conn.recv()
+        except EOFError:
+            raise RuntimeError('Acquisition process exited unexpectedly.')
+        if status == 'error':
+            raise RuntimeError(payload)
+        return payload
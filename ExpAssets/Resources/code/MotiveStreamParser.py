@@ -1,35 +1,106 @@
 # type: ignore
+import struct
 from typing import Union, Container
-from dataStructures import unlabeledMarkerStruct, labeledMarkerStruct, rigidBodyStruct
-from construct import Int32ul, CString
+
+import numpy as np
+from dataStructures import (
+    unlabeledMarkerStruct,
+    labeledMarkerStruct,
+    rigidBodyStruct,
+    unlabeledMarkerDtype,
+    labeledMarkerDtype,
+    rigidBodyDtype,
+)
+from construct import Array, CString, Float32l, Float64l, Int16sl, Int32ul, Int64ul
+
+
+# Precompiled scalar decoders for the "numpy" decoder
+_SCALARS = {
+    "size": struct.Struct("<I"),
+    "count": struct.Struct("<I"),
+    "frame_number": struct.Struct("<I"),
+    "id": struct.Struct("<I"),
+    "uint32": struct.Struct("<I"),
+    "uint64": struct.Struct("<Q"),
+    "int16": struct.Struct("<h"),
+    "float": struct.Struct("<f"),
+    "double": struct.Struct("<d"),
+}
 
 
 class MotiveStreamParser(object):
-    def __init__(self, stream: bytes):
+    """
+    Sequential reader over a NatNet frame payload.
+
+    Two decoders are available, chosen at construction time:
+        "construct" (default) parses each asset into a construct Container.
+        "numpy" uses precompiled struct.Struct objects for scalars and
+            np.frombuffer over the underlying memoryview for asset arrays,
+            so a whole marker set decodes into an (N, 3) float32 array at once.
+    """
+
+    DECODERS = ("construct", "numpy")
+
+    def __init__(self, stream: bytes, decoder: str = "construct"):
+        if decoder not in self.DECODERS:
+            raise ValueError(
+                f"Decoder must be one of {self.DECODERS}, got {decoder!r}."
+            )
+
         self.__stream = memoryview(stream)
         self.__offset = 0
+        self.__decoder = decoder
 
         self.__structures = {
             "label": CString("utf8"),
             "size": Int32ul,
             "count": Int32ul,
             "frame_number": Int32ul,
+            "id": Int32ul,
+            "uint32": Int32ul,
+            "uint64": Int64ul,
+            "int16": Int16sl,
+            "float": Float32l,
+            "double": Float64l,
             "unlabeled_marker": unlabeledMarkerStruct,
             "legacy_marker": unlabeledMarkerStruct,
             "labeled_marker": labeledMarkerStruct,
             "rigid_body": rigidBodyStruct,
         }
 
+        self.__dtypes = {
+            "unlabeled_marker": unlabeledMarkerDtype,
+            "legacy_marker": unlabeledMarkerDtype,
+            "labeled_marker": labeledMarkerDtype,
+            "rigid_body": rigidBodyDtype,
+            "float": np.dtype("<f4"),
+        }
+
+    @property
+    def decoder(self) -> str:
+        return self.__decoder
+
     def seek(self, by: int) -> None:
         self.__offset += by
 
     def tell(self) -> int:
         return self.__offset
 
+    def match(self, data: bytes) -> bool:
+        """Advance past data if the stream continues with it, without decoding."""
+        end = self.__offset + len(data)
+        if self.__stream[self.__offset : end] != data:
+            return False
+        self.__offset = end
+        return True
+
     def sizeof(self, asset_type: str, asset_count: int = 1) -> int:
         return self.__structures[asset_type].sizeof() * asset_count
 
-    def parse(self, asset_type: str) -> Union[str, int, Container]:
+    def parse(self, asset_type: str) -> Union[str, int, Container, np.void]:
+        if self.__decoder == "numpy":
+            return self.__parse_fast(asset_type)
+
         struct = self.__structures[asset_type]
         contents = struct.parse(self.__stream[self.__offset :])
 
@@ -39,3 +110,52 @@ class MotiveStreamParser(object):
             self.seek(struct.sizeof())
 
         return contents
+
+    def parse_array(self, asset_type: str, asset_count: int) -> np.ndarray:
+        """Decode asset_count consecutive assets of one type.
+
+        Marker assets come back as an (N, 3) float32 array of positions; other
+        assets as a structured array with the fields of their Struct. Records are
+        always copied out, as the stream may be a recycled receive buffer.
+        """
+        dtype = self.__dtypes[asset_type]
+
+        if self.__decoder == "numpy":
+            records = np.frombuffer(
+                self.__stream, dtype=dtype, count=asset_count, offset=self.__offset
+            ).copy()
+            self.seek(dtype.itemsize * asset_count)
+        else:
+            contents = Array(asset_count, self.__structures[asset_type]).parse(
+                self.__stream[self.__offset :]
+            )
+            self.seek(self.sizeof(asset_type, asset_count))
+            if dtype.names is None:
+                records = np.array(contents, dtype=dtype)
+            else:
+                records = np.array(
+                    [tuple(asset[name] for name in dtype.names) for asset in contents],
+                    dtype=dtype,
+                )
+
+        if dtype is unlabeledMarkerDtype:
+            return records.view("<f4").reshape(asset_count, 3)
+
+        return records
+
+    def __parse_fast(self, asset_type: str) -> Union[str, int, np.void]:
+        if asset_type == "label":
+            end = self.__offset
+            while self.__stream[end] != 0:
+                end += 1
+            contents = str(self.__stream[self.__offset : end], "utf-8")
+            self.__offset = end + 1
+            return contents
+
+        scalar = _SCALARS.get(asset_type)
+        if scalar is not None:
+            (contents,) = scalar.unpack_from(self.__stream, self.__offset)
+            self.seek(scalar.size)
+            return contents
+
+        return self.parse_array(asset_type, 1)[0]
@@ -0,0 +1,582 @@
+"""
+A local stand-in for Motive that streams recorded or synthetic trials as NatNet.
+
+Frames are encoded as NatNet 3.0+ NAT_FRAMEOFDATA packets (a single marker set,
+every other asset block empty) and sent over UDP at a fixed rate, optionally
+dropping a fraction of them to simulate packet loss. encode_frame() can also
+fill the other blocks, e.g., to test decoders. The command port answers
+NAT_CONNECT with NAT_SERVERINFO and NAT_REQUEST_MODELDEF with a description of
+the marker set, so an unmodified NatNetClient can connect to it.
+
+In unicast mode frames are sent from the command port to every client that has
+connected, as Motive does; in multicast mode they are sent to the multicast
+group on the data port.
+
+Run as a script to replay a trial file, or a synthetic reach if none is given:
+
+    python NatNetReplayServer.py P1_B01_T001_OptiData.txt --rate 1000 --loss 0.01
+"""
+
+import argparse
+import csv
+import random
+import socket
+import struct
+import threading
+import time
+from typing import Iterable, Iterator, Sequence, Tuple
+
+import numpy as np
+
+from dataStructures import labeledMarkerDtype, rigidBodyDtype
+from OptiRecording import is_recording, read_recording
+
+
+NAT_CONNECT = 0
+NAT_SERVERINFO = 1
+NAT_REQUEST = 2
+NAT_RESPONSE = 3
+NAT_REQUEST_MODELDEF = 4
+NAT_MODELDEF = 5
+NAT_REQUEST_FRAMEOFDATA = 6
+NAT_FRAMEOFDATA = 7
+NAT_KEEPALIVE = 10
+
+Frame = Tuple[int, np.ndarray]
+# (id, samples per channel) for force plates and devices
+Channels = Tuple[int, Sequence[np.ndarray]]
+
+
+def encode_packet(message_id: int, payload: bytes) -> bytes:
+    """Prefix a payload with its message id and size."""
+    return struct.pack('<HH', message_id, len(payload)) + payload
+
+
+def encode_frame(
+    frame_number: int,
+    marker_sets: Sequence[Tuple[str, np.ndarray]],
+    timestamp: float = 0.0,
+    version: Tuple[int, int] = (4, 1),
+    tracked_models_changed: bool = False,
+    legacy_markers: np.ndarray | None = None,
+    rigid_bodies: np.ndarray | None = None,
+    skeletons: Sequence[Tuple[int, np.ndarray]] = (),
+    assets: Sequence[Tuple[int, np.ndarray, np.ndarray]] = (),
+    labeled_markers: np.ndarray | None = None,
+    force_plates: Sequence[Channels] = (),
+    devices: Sequence[Channels] = (),
+    timecode: Tuple[int, int] = (0, 0),
+    is_recording: bool = False,
+) -> bytes:
+    """
+    Encode one NAT_FRAMEOFDATA packet.
+
+    Asset blocks other than the marker sets are empty unless given. Rigid bodies
+    and labeled markers are structured arrays with the fields of rigidBodyDtype
+    and labeledMarkerDtype (see dataStructures.py).
+
+    Args:
+        frame_number (int): Frame number
+        marker_sets (Sequence[Tuple[str, np.ndarray]]): (label, positions (N, 3)) per marker set
+        timestamp (float, optional): Frame time in seconds. Defaults to 0.0.
+        version (Tuple[int, int], optional): NatNet (major, minor) version, 3.0+. Defaults to (4, 1).
+        tracked_models_changed (bool, optional): Flag a scene change in the suffix. Defaults to False.
+        legacy_markers (np.ndarray, optional): Unlabeled marker positions, shaped (N, 3)
+        rigid_bodies (np.ndarray, optional): Rigid bodies
+        skeletons (Sequence[Tuple[int, np.ndarray]], optional): (id, rigid bodies) per skeleton
+        assets (Sequence[Tuple[int, np.ndarray, np.ndarray]], optional): (id, rigid bodies,
+            labeled markers) per asset; NatNet 4.1+ only
+        labeled_markers (np.ndarray, optional): Labeled markers
+        force_plates (Sequence[Channels], optional): (id, samples per channel) per force plate
+        devices (Sequence[Channels], optional): (id, samples per channel) per device
+        timecode (Tuple[int, int], optional): SMPTE timecode and subframe. Defaults to (0, 0).
+        is_recording (bool, optional): Flag that Motive is recording. Defaults to False.
+
+    Returns:
+        bytes: The packet, including message id and size
+
+    Raises:
+        ValueError: If assets are given for a version before 4.1
+    """
+    has_size = version >= (4, 1)
+
+    if assets and not has_size:
+        raise ValueError('Assets are only streamed by NatNet 4.1 and later.')
+
+    def block(count: int, body: bytes) -> bytes:
+        size = struct.pack('<I', len(body)) if has_size else b''
+        return struct.pack('<I', count) + size + body
+
+    def records(array: np.ndarray | None, dtype: np.dtype) -> Tuple[int, bytes]:
+        if array is None:
+            return 0, b''
+        array = np.asarray(array, dtype=dtype)
+        return len(array), array.tobytes()
+
+    def channels(items: Sequence[Channels]) -> bytes:
+        body = b''
+        for item_id, samples in items:
+            body += struct.pack('<II', item_id, len(samples))
+            for channel in samples:
+                channel = np.asarray(channel, dtype='<f4')
+                body += struct.pack('<I', len(channel)) + channel.tobytes()
+        return body
+
+    marker_bodies = b''.join(
+        label.encode('utf-8') + b'\0'
+        + struct.pack('<I', len(positions))
+        + np.asarray(positions, dtype='<f4').tobytes()
+        for label, positions in marker_sets
+    )
+    payload = struct.pack('<I', frame_number) + block(len(marker_sets), marker_bodies)
+
+    legacy = np.zeros((0, 3)) if legacy_markers is None else legacy_markers
+    payload += block(len(legacy), np.asarray(legacy, dtype='<f4').tobytes())
+    payload += block(*records(rigid_bodies, rigidBodyDtype))
+    payload += block(
+        len(skeletons),
+        b''.join(
+            struct.pack('<II', skeleton_id, len(bodies))
+            + np.asarray(bodies, dtype=rigidBodyDtype).tobytes()
+            for skeleton_id, bodies in skeletons
+        ),
+    )
+    if has_size:
+        payload += block(
+            len(assets),
+            b''.join(
+                struct.pack('<II', asset_id, len(bodies))
+                + np.asarray(bodies, dtype=rigidBodyDtype).tobytes()
+                + struct.pack('<I', len(markers))
+                + np.asarray(markers, dtype=labeledMarkerDtype).tobytes()
+                for asset_id, bodies, markers in assets
+            ),
+        )
+    payload += block(*records(labeled_markers, labeledMarkerDtype))
+    payload += block(len(force_plates), channels(force_plates))
+    payload += block(len(devices), channels(devices))
+
+    seconds = int(timestamp)
+    fraction = int((timestamp - seconds) * 2**32)
+    stamp = int(timestamp * 1e7)
+
+    payload += struct.pack('<IId', *timecode, timestamp)
+    payload += struct.pack('<QQQ', stamp, stamp, stamp)
+    if has_size:
+        payload += struct.pack('<II', seconds, fraction)
+
+    params = (0x01 if is_recording else 0) | (0x02 if tracked_models_changed else 0)
+    payload += struct.pack('<hi', params, 0)
+
+    return encode_packet(NAT_FRAMEOFDATA, payload)
+
+
+def encode_server_info(
+    name: str = 'NatNetReplayServer',
+    server_version: Sequence[int] = (3, 1, 0, 0),
+    natnet_version: Sequence[int] = (4, 1, 0, 0),
+) -> bytes:
+    """Encode the NAT_SERVERINFO reply to NAT_CONNECT."""
+    payload = name.encode('utf-8')[:255].ljust(256, b'\0')
+    payload += bytes(server_version) + bytes(natnet_version)
+    # no connection info: clients keep their own multicast settings
+    payload += struct.pack('<BHB4s', 0, 0, 0, b'\0' * 4)
+    return encode_packet(NAT_SERVERINFO, payload)
+
+
+def encode_model_def(
+    marker_sets: Sequence[Tuple[str, int]], version: Tuple[int, int] = (4, 1)
+) -> bytes:
+    """
+    Encode a NAT_MODELDEF packet describing marker sets only.
+
+    Args:
+        marker_sets (Sequence[Tuple[str, int]]): (label, marker count) per marker set
+        version (Tuple[int, int], optional): NatNet (major, minor) version. Defaults to (4, 1).
+    """
+    payload = struct.pack('<I', len(marker_sets))
+    for label, count in marker_sets:
+        body = label.encode('utf-8') + b'\0' + struct.pack('<I', count)
+        body += b''.join(f'{label}_{i + 1}'.encode('utf-8') + b'\0' for i in range(count))
+        payload += struct.pack('<I', 0)
+        if version >= (4, 1):
+            payload += struct.pack('<I', len(body))
+        payload += body
+    return encode_packet(NAT_MODELDEF, payload)
+
+
+def load_trial_frames(path: str) -> list[Frame]:
+    """
+    Read a recorded _OptiData file (CSV or binary) as (frame_number, positions) frames.
+
+    Args:
+        path (str): Path to the trial file
+
+    Returns:
+        list[Frame]: Frames in file order, positions shaped (N, 3)
+    """
+    if is_recording(path):
+        _, records = read_recording(path)
+        frame_numbers = np.asarray(records['frame_number'], dtype=np.int64)
+        positions = np.column_stack(
+            [records['pos_x'], records['pos_y'], records['pos_z']]
+        ).astype(np.float32)
+    else:
+        with open(path, newline='') as file:
+            lines = (line for line in file if not line.startswith('#'))
+            header = next(csv.reader(lines))
+            data = np.loadtxt(lines, delimiter=',', ndmin=2)
+        columns = [header.index(name) for name in ('pos_x', 'pos_y', 'pos_z')]
+        frame_numbers = data[:, header.index('frame_number')].astype(np.int64)
+        positions = data[:, columns].astype(np.float32)
+
+    if not len(frame_numbers):
+        return []
+
+    starts = np.flatnonzero(np.diff(frame_numbers)) + 1
+    return [
+        (int(frame[0]), markers)
+        for frame, markers in zip(
+            np.split(frame_numbers, starts), np.split(positions, starts)
+        )
+    ]
+
+
+def synthetic_frames(
+    marker_count: int = 10,
+    frame_count: int = 240,
+    reach: Sequence[float] = (0.0, 0.05, 0.4),
+    noise: float = 0.0005,
+    seed: int | None = None,
+) -> Iterator[Frame]:
+    """
+    Generate a minimum-jerk reach of a rigid cluster of markers.
+
+    Args:
+        marker_count (int, optional): Markers per frame. Defaults to 10.
+        frame_count (int, optional): Frames to generate. Defaults to 240.
+        reach (Sequence[float], optional): Displacement (m) over the movement. Defaults to (0.0, 0.05, 0.4).
+        noise (float, optional): SD (m) of per-marker jitter. Defaults to 0.0005.
+        seed (int, optional): Seed for the marker layout and jitter. Defaults to None.
+
+    Yields:
+        Frame: (frame_number, positions (marker_count, 3)) from frame 1
+    """
+    rng = np.random.default_rng(seed)
+    layout = rng.uniform(-0.03, 0.03, size=(marker_count, 3))
+    start = np.array([0.0, 0.1, 0.2])
+    reach = np.asarray(reach)
+
+    for i in range(frame_count):
+        tau = i / max(frame_count - 1, 1)
+        progress = 10 * tau**3 - 15 * tau**4 + 6 * tau**5
+        centre = start + progress * reach
+        positions = centre + layout + rng.normal(0, noise, size=layout.shape)
+        yield i + 1, positions.astype(np.float32)
+
+
+class NatNetReplayServer(object):
+    """
+    Streams frames to NatNet clients at a fixed rate.
+
+    Attributes:
+        command_port (int): Bound command port (useful when constructed with 0)
+        sent (int): Frames sent so far
+        dropped (int): Frames skipped by loss injection so far
+        model_def_requests (int): NAT_REQUEST_MODELDEF requests received so far
+        done (threading.Event): Set once every frame has been streamed
+
+    Methods:
+        start(): Open the sockets and start serving and streaming
+        stop(): Stop streaming and close the sockets
+        wait(timeout): Block until every frame has been streamed
+        change_scene(label): Rename the streamed marker set, as if edited in Motive
+    """
+
+    def __init__(
+        self,
+        frames: Iterable[Frame],
+        rate: float = 120.0,
+        label: str = 'Hand',
+        version: Tuple[int, int] = (4, 1),
+        local_ip: str = '127.0.0.1',
+        command_port: int = 1510,
+        data_port: int = 1511,
+        use_multicast: bool = False,
+        multicast: str = '239.255.42.99',
+        loss: float = 0.0,
+        seed: int | None = None,
+        wait_for_client: bool = True,
+        unanswered_model_defs: int = 0,
+    ):
+        """
+        Initialize the NatNetReplayServer object.
+
+        Args:
+            frames (Iterable[Frame]): (frame_number, positions (N, 3)) frames to stream
+            rate (float, optional): Frames per second. Defaults to 120.0.
+            label (str, optional): Name of the streamed marker set. Defaults to 'Hand'.
+            version (Tuple[int, int], optional): NatNet version to encode. Defaults to (4, 1).
+            local_ip (str, optional): Interface to serve on. Defaults to '127.0.0.1'.
+            command_port (int, optional): Command port; 0 picks a free one. Defaults to 1510.
+            data_port (int, optional): Data port for multicast streaming. Defaults to 1511.
+            use_multicast (bool, optional): Stream to the multicast group. Defaults to False.
+            multicast (str, optional): Multicast group. Defaults to '239.255.42.99'.
+            loss (float, optional): Fraction of frames to drop at random. Defaults to 0.0.
+            seed (int, optional): Seed for loss injection. Defaults to None.
+            wait_for_client (bool, optional): Hold streaming until a client connects. Defaults to True.
+            unanswered_model_defs (int, optional): Model definition requests to ignore, as if lost. Defaults to 0.
+        """
+        if rate <= 0:
+            raise ValueError('Rate must be positive.')
+
+        if not 0 <= loss < 1:
+            raise ValueError('Loss must be in [0, 1).')
+
+        self.__frames = frames
+        self.__period = 1 / rate
+        self.__label = label
+        self.__version = version
+        self.__local_ip = local_ip
+        self.__command_port = command_port
+        self.__data_port = data_port
+        self.__use_multicast = use_multicast
+        self.__multicast = multicast
+        self.__loss = loss
+        self.__random = random.Random(seed)
+        self.__wait_for_client = wait_for_client
+        self.__unanswered_model_defs = unanswered_model_defs
+        # set by change_scene(); flagged in the next frame sent
+        self.__scene_changed = False
+
+        self.__clients = []
+        self.__connected = threading.Event()
+        self.__stopping = threading.Event()
+        self.done = threading.Event()
+
+        self.sent = 0
+        self.dropped = 0
+        self.model_def_requests = 0
+        # marker count of the streamed set, reported in NAT_MODELDEF; read from
+        # the first frame in start(), with the frames left to stream
+        self.__marker_count = 0
+        self.__pending = iter(())
+
+        self.__command_socket = None
+        self.__data_socket = None
+        self.__threads = []
+
+    def __enter__(self) -> 'NatNetReplayServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def command_port(self) -> int:
+        """Get the bound command port."""
+        if self.__command_socket is None:
+            return self.__command_port
+        return self.__command_socket.getsockname()[1]
+
+    def start(self) -> None:
+        """
+        Open the sockets and start the command and streaming threads.
+
+        Reads the first frame, blocking until the frame source yields it, so
+        that model definitions describe the marker set from the first request.
+        """
+        self.__command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__command_socket.bind((self.__local_ip, self.__command_port))
+        self.__command_socket.settimeout(0.1)
+
+        # size the marker set before any NAT_REQUEST_MODELDEF can be answered
+        frames = iter(self.__frames)
+        first = next(frames, None)
+        if first is None:
+            self.done.set()
+        else:
+            self.__marker_count = len(first[1])
+            self.__pending = self.__chain(first, frames)
+
+        if self.__use_multicast:
+            self.__data_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__data_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            self.__data_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            self.__data_socket.setsockopt(
+                socket.IPPROTO_IP,
+                socket.IP_MULTICAST_IF,
+                socket.inet_aton(self.__local_ip),
+            )
+
+        self.__threads = [
+            threading.Thread(target=self.__serve_commands, daemon=True),
+            threading.Thread(target=self.__stream, daemon=True),
+        ]
+        for thread in self.__threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop streaming and close the sockets."""
+        self.__stopping.set()
+        self.__connected.set()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+        for sock in (self.__command_socket, self.__data_socket):
+            if sock is not None:
+                sock.close()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until every frame has been streamed; returns False on timeout."""
+        return self.done.wait(timeout)
+
+    def change_scene(self, label: str) -> None:
+        """
+        Rename the streamed marker set, as if the scene was edited in Motive.
+
+        The next frame sent flags tracked_models_changed, and NAT_MODELDEF
+        replies describe the new label from then on.
+
+        Args:
+            label (str): New name of the streamed marker set
+        """
+        self.__label = label
+        self.__scene_changed = True
+
+    def __serve_commands(self) -> None:
+        while not self.__stopping.is_set():
+            try:
+                data, address = self.__command_socket.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            if len(data) < 4:
+                continue
+
+            (message_id,) = struct.unpack_from('<H', data)
+
+            if message_id == NAT_CONNECT:
+                if address not in self.__clients:
+                    self.__clients.append(address)
+                self.__reply(encode_server_info(natnet_version=(*self.__version, 0, 0)), address)
+                self.__connected.set()
+
+            elif message_id == NAT_REQUEST_MODELDEF:
+                self.model_def_requests += 1
+                if self.model_def_requests <= self.__unanswered_model_defs:
+                    continue
+                self.__reply(
+                    encode_model_def([(self.__label, self.__marker_count)], self.__version),
+                    address,
+                )
+
+            elif message_id == NAT_REQUEST:
+                self.__reply(encode_packet(NAT_RESPONSE, struct.pack('<i', 0)), address)
+
+            # keep-alives and frame requests need no reply
+
+    def __reply(self, packet: bytes, address: Tuple[str, int]) -> None:
+        try:
+            self.__command_socket.sendto(packet, address)
+        except OSError:
+            pass
+
+    def __stream(self) -> None:
+        if self.done.is_set():
+            return
+
+        if self.__wait_for_client and not self.__use_multicast:
+            self.__connected.wait()
+
+        start = time.perf_counter()
+        deadline = start
+        for index, (frame_number, positions) in enumerate(self.__pending):
+            if self.__stopping.is_set():
+                return
+
+            self.__sleep_until(deadline)
+            deadline += self.__period
+
+            if self.__loss and self.__random.random() < self.__loss:
+                self.dropped += 1
+                continue
+
+            scene_changed, self.__scene_changed = self.__scene_changed, False
+            packet = encode_frame(
+                frame_number,
+                [(self.__label, positions)],
+                timestamp=index * self.__period,
+                version=self.__version,
+                tracked_models_changed=scene_changed,
+            )
+            self.__send(packet)
+            self.sent += 1
+
+        self.done.set()
+
+    def __send(self, packet: bytes) -> None:
+        try:
+            if self.__use_multicast:
+                self.__data_socket.sendto(packet, (self.__multicast, self.__data_port))
+            else:
+                for address in self.__clients:
+                    self.__command_socket.sendto(packet, address)
+        except OSError:
+            pass
+
+    @staticmethod
+    def __chain(first: Frame, rest: Iterator[Frame]) -> Iterator[Frame]:
+        yield first
+        yield from rest
+
+    @staticmethod
+    def __sleep_until(deadline: float) -> None:
+        # sleep most of the way, then spin: time.sleep alone is too coarse past ~500 Hz
+        remaining = deadline - time.perf_counter()
+        if remaining > 0.002:
+            time.sleep(remaining - 0.001)
+        while time.perf_counter() < deadline:
+            pass
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description='Stream a trial file to NatNet clients.')
+    parser.add_argument('path', nargs='?', help='trial file to replay (synthetic reach if omitted)')
+    parser.add_argument('--rate', type=float, default=120.0, help='frames per second')
+    parser.add_argument('--markers', type=int, default=10, help='markers per synthetic frame')
+    parser.add_argument('--frames', type=int, default=1200, help='synthetic frames to stream')
+    parser.add_argument('--loss', type=float, default=0.0, help='fraction of frames to drop')
+    parser.add_argument('--label', default='Hand', help='marker set label')
+    parser.add_argument('--multicast', action='store_true', help='stream to the multicast group')
+    parser.add_argument('--local-ip', default='127.0.0.1', help='interface to serve on')
+    args = parser.parse_args(argv)
+
+    if args.path:
+        frames = load_trial_frames(args.path)
+    else:
+        frames = synthetic_frames(args.markers, args.frames)
+
+    server = NatNetReplayServer(
+        frames,
+        rate=args.rate,
+        label=args.label,
+        local_ip=args.local_ip,
+        use_multicast=args.multicast,
+        loss=args.loss,
+    )
+    with server:
+        print(f'Serving on {args.local_ip}:{server.command_port}; waiting for a client...')
+        try:
+            server.wait()
+        except KeyboardInterrupt:
+            pass
+    print(f'Sent {server.sent} frames, dropped {server.dropped}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Compact binary format for per-trial motion capture recordings.
+
+A recording is a fixed-size header followed by fixed-width little-endian
+records, one per marker per frame:
+
+    [0:8]     magic, b'OPTIREC1'
+    [8:12]    header size in bytes (uint32)
+    [12:16]   metadata length in bytes (uint32)
+    [16:...]  metadata as UTF-8 JSON, zero-padded to the header size
+    [header:] RECORD_DTYPE records
+
+The header is reserved up front, so trial metadata can be filled in place when
+the trial ends without rewriting the records. Records are read back through
+np.memmap, so queries only touch the pages they need.
+
+Run as a script to convert recordings to CSV:
+
+    python OptiRecording.py P1_B01_T001_OptiData.bin [...]
+"""
+
+import argparse
+import csv
+import json
+import os
+import struct
+from typing import IO, Sequence
+
+import numpy as np
+
+from TrialWriter import TrialWriter
+
+
+MAGIC = b'OPTIREC1'
+HEADER_SIZE = 4096
+RECORDING_EXT = '.bin'
+
+_PREAMBLE = struct.Struct('<8sII')
+
+RECORD_DTYPE = np.dtype(
+    [
+        ('frame_number', '<u4'),
+        ('marker', '<u2'),
+        ('pos_x', '<f4'),
+        ('pos_y', '<f4'),
+        ('pos_z', '<f4'),
+        ('timestamp', '<f8'),
+    ]
+)
+
+
+def encode_header(metadata: dict, header_size: int = HEADER_SIZE) -> bytes:
+    """
+    Pack metadata into a fixed-size recording header.
+
+    Raises:
+        ValueError: If the metadata does not fit in the reserved header
+    """
+    payload = json.dumps(metadata, default=str).encode('utf-8')
+    room = header_size - _PREAMBLE.size
+
+    if len(payload) > room:
+        raise ValueError(
+            f'Recording metadata needs {len(payload)} bytes; only {room} are reserved.'
+        )
+
+    header = _PREAMBLE.pack(MAGIC, header_size, len(payload)) + payload
+    return header.ljust(header_size, b'\0')
+
+
+def is_recording(path: str) -> bool:
+    """Check whether a file starts with the binary recording magic."""
+    try:
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_metadata(path: str) -> tuple[dict, int]:
+    """
+    Read the metadata and header size of a recording.
+
+    Raises:
+        ValueError: If the file is not a binary recording
+    """
+    with open(path, 'rb') as file:
+        preamble = file.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size or preamble[: len(MAGIC)] != MAGIC:
+            raise ValueError(f'Not an OptiData binary recording: {path}')
+
+        _, header_size, length = _PREAMBLE.unpack(preamble)
+        metadata = json.loads(file.read(length) or b'{}')
+
+    return metadata, header_size
+
+
+def read_recording(path: str) -> tuple[dict, np.ndarray]:
+    """
+    Map the records of a recording into memory without reading them.
+
+    Any partially written trailing record (e.g., while the trial is still being
+    recorded) is excluded.
+
+    Returns:
+        tuple[dict, np.ndarray]: Metadata, and a read-only memmap of RECORD_DTYPE records
+    """
+    metadata, header_size = read_metadata(path)
+    count = (os.path.getsize(path) - header_size) // RECORD_DTYPE.itemsize
+
+    if count <= 0:
+        return metadata, np.zeros(0, dtype=RECORD_DTYPE)
+
+    records = np.memmap(
+        path, dtype=RECORD_DTYPE, mode='r', offset=header_size, shape=(count,)
+    )
+    return metadata, records
+
+
+def to_csv(path: str, out_path: str = '') -> str:
+    """
+    Convert a recording to CSV, with metadata as leading '#Key: value' lines.
+
+    Args:
+        path (str): Path to the binary recording
+        out_path (str, optional): Output path. Defaults to path with a .txt extension.
+
+    Returns:
+        str: Path of the CSV file written
+    """
+    if out_path == '':
+        out_path = os.path.splitext(path)[0] + '.txt'
+
+    metadata, records = read_recording(path)
+
+    with open(out_path, 'w', newline='') as file:
+        for key, value in metadata.items():
+            file.write(f'#{key}: {value}\n')
+
+        writer = csv.writer(file)
+        writer.writerow(RECORD_DTYPE.names)
+        writer.writerows(records.tolist())
+
+    return out_path
+
+
+class BinaryTrialWriter(TrialWriter):
+    """
+    A TrialWriter producing binary recordings instead of CSV.
+
+    Buffering and background flushing behave as in TrialWriter, except pending
+    items are whole frames. Metadata set during the trial is written into the
+    reserved header when the writer is closed.
+
+    Methods:
+        set_metadata(metadata): Update metadata written to the header on close
+    """
+
+    def __init__(
+        self,
+        path: str,
+        metadata: dict = {},
+        batch_size: int = 120,
+        flush_interval: float = 0.25,
+    ):
+        """
+        Create the recording, reserve its header, and start the flush thread.
+
+        Args:
+            path (str): Path of the file to create (truncated if it exists)
+            metadata (dict, optional): Initial metadata. Defaults to {}.
+            batch_size (int, optional): Pending frames that trigger an early flush. Defaults to 120.
+            flush_interval (float, optional): Seconds between periodic flushes. Defaults to 0.25.
+        """
+        self.__metadata = dict(metadata)
+        super().__init__(path, RECORD_DTYPE.names, batch_size, flush_interval)
+
+    def set_metadata(self, metadata: dict) -> None:
+        """Merge metadata into what will be written to the header on close."""
+        encode_header({**self.__metadata, **metadata})  # fail now, not at close
+        self.__metadata.update(metadata)
+
+    def write_frame(
+        self, frame_number: int, positions: np.ndarray, timestamp: float | None = None
+    ) -> None:
+        """
+        Buffer one frame of marker positions as binary records.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+            timestamp (float, optional): Frame time in seconds. Defaults to NaN.
+        """
+        positions = np.asarray(positions).reshape(-1, 3)
+
+        records = np.empty(len(positions), dtype=RECORD_DTYPE)
+        records['frame_number'] = frame_number
+        records['marker'] = np.arange(len(positions))
+        records['pos_x'] = positions[:, 0]
+        records['pos_y'] = positions[:, 1]
+        records['pos_z'] = positions[:, 2]
+        records['timestamp'] = np.nan if timestamp is None else timestamp
+
+        self.write([records])
+
+    def close(self) -> None:
+        """Flush remaining frames, close the file and fill in the header."""
+        if self.closed:
+            return
+
+        super().close()
+
+        with open(self.path, 'r+b') as file:
+            file.write(encode_header(self.__metadata))
+
+    def _open(self, path: str, fieldnames: Sequence[str]) -> IO:
+        self.__file = open(path, 'wb')
+        self.__file.write(encode_header(self.__metadata))
+        return self.__file
+
+    def _write_rows(self, rows: list) -> int:
+        records = np.concatenate(rows)
+        self.__file.write(records.tobytes())
+        return len(records)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Convert binary OptiData recordings to CSV.'
+    )
+    parser.add_argument('paths', nargs='+', help='binary recordings to convert')
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        print(to_csv(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,28 @@
+import bisect
+import io
 import os
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import butter, sosfiltfilt
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt
+
+from FrameBuffer import FrameBuffer
+from FrameStore import FrameStore
+from Kinematics import Kinematics
+from OptiRecording import is_recording, read_recording
+
+
+POSITION_DTYPE = [
+    ('frame_number', 'i8'),
+    ('pos_x', 'f8'),
+    ('pos_y', 'f8'),
+    ('pos_z', 'f8'),
+]
 
+FILL_POLICIES = ('ffill', 'nan')
 
-# from klibs.KLDatabase import KLDatabase as kld
+# multiplier applied to streamed positions before any calculations
+POSITION_SCALE = 1000
 
 # TODO:
 # grab first frame, row count indicates num markers tracked.
@@ -11,6 +30,312 @@ from scipy.signal import butter, sosfiltfilt
 # refactor nomeclature about frame indexing/querying
 
 
+def frame_centroids(
+    frames: np.ndarray, min_markers: int = 1, fill: str = 'ffill'
+) -> np.ndarray:
+    """
+    Average marker rows into one centroid per frame using a single grouped reduction.
+
+    Rows are binned by their offset from the earliest frame number, so frames need
+    not be sorted. Every frame number between the first and last is represented;
+    frames missing entirely, or with fewer than min_markers valid (non-NaN)
+    markers, are treated as gaps and filled according to the fill policy.
+
+    Args:
+        frames (np.ndarray): Rows with frame_number, pos_x, pos_y, pos_z fields
+        min_markers (int, optional): Markers required for a frame to count as observed. Defaults to 1.
+        fill (str, optional): 'ffill' carries the last observed centroid forward (leading
+            gaps take the first observed centroid); 'nan' leaves gaps as NaN. Defaults to 'ffill'.
+
+    Returns:
+        np.ndarray: Array of centroids with fields frame_number, pos_x, pos_y, pos_z
+
+    Raises:
+        ValueError: If fill is not a recognized policy
+    """
+    if fill not in FILL_POLICIES:
+        raise ValueError(f'Fill policy must be one of {FILL_POLICIES}, got {fill!r}.')
+
+    if len(frames) == 0:
+        return np.zeros(0, dtype=POSITION_DTYPE)
+
+    frame_numbers = frames['frame_number'].astype(np.int64)
+    start = frame_numbers.min()
+    span = int(frame_numbers.max() - start) + 1
+
+    xyz = np.column_stack([frames['pos_x'], frames['pos_y'], frames['pos_z']])
+    visible = ~np.isnan(xyz).any(axis=1)
+    bins = frame_numbers[visible] - start
+
+    counts = np.bincount(bins, minlength=span)
+    observed = counts >= max(min_markers, 1)
+
+    means = np.zeros(span, dtype=POSITION_DTYPE)
+    means['frame_number'] = np.arange(start, start + span)
+
+    # index of the observed frame each row should draw its value from
+    source = np.arange(span)
+    if fill == 'ffill' and observed.any():
+        source = np.where(observed, source, 0)
+        np.maximum.accumulate(source, out=source)
+        source[: np.argmax(observed)] = np.argmax(observed)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, axis in enumerate(['pos_x', 'pos_y', 'pos_z']):
+            sums = np.bincount(bins, weights=xyz[visible, i], minlength=span)
+            centroid = np.where(observed, sums / counts, np.nan)
+            means[axis] = centroid[source]
+
+    return means
+
+
+@lru_cache(maxsize=32)
+def butter_sos(
+    order: int = 2, cutoff: float = 10, sample_rate: float = 120, filtype: str = 'low'
+) -> np.ndarray:
+    """
+    Design (once) a Butterworth filter as second-order sections.
+
+    Designs are cached per (order, cutoff, sample_rate, filtype), so repeated
+    calls return the same array without re-running scipy.signal.butter.
+    The array is shared between callers and must not be modified.
+
+    Returns:
+        np.ndarray: Second-order sections, shaped (n_sections, 6)
+    """
+    return butter(N=order, Wn=cutoff, btype=filtype, output='sos', fs=sample_rate)
+
+
+class StreamingFilter(object):
+    """
+    A causal Butterworth filter applied one multi-channel sample at a time.
+
+    Filter state (zi) persists between updates, so each new sample costs O(1)
+    regardless of how long the stream has run. State is initialised to the
+    steady-state response of the first sample to avoid a start-up transient.
+
+    Attributes:
+        output (np.ndarray): Most recent filtered sample (None before the first update)
+
+    Methods:
+        update(sample): Filter one sample and return the result
+        reset(): Discard filter state
+    """
+
+    def __init__(
+        self,
+        order: int = 2,
+        cutoff: float = 10,
+        sample_rate: float = 120,
+        filtype: str = 'low',
+        channels: int = 3,
+    ):
+        """
+        Initialize the StreamingFilter object.
+
+        Args:
+            order (int, optional): Order of the Butterworth filter. Defaults to 2.
+            cutoff (float, optional): Cutoff frequency in Hz. Defaults to 10.
+            sample_rate (float, optional): Sampling rate in Hz. Defaults to 120.
+            filtype (str, optional): Type of filter to apply. Defaults to "low".
+            channels (int, optional): Number of values per sample. Defaults to 3.
+        """
+        self.__sos = butter_sos(order, cutoff, sample_rate, filtype)
+        self.__channels = channels
+        self.__zi = None
+        self.__output = None
+
+    @property
+    def output(self) -> np.ndarray | None:
+        """Get the most recent filtered sample."""
+        return self.__output
+
+    def reset(self) -> None:
+        """Discard filter state; the next sample re-initialises it."""
+        self.__zi = None
+        self.__output = None
+
+    def update(self, sample: np.ndarray) -> np.ndarray:
+        """
+        Filter one sample.
+
+        Args:
+            sample (np.ndarray): One value per channel
+
+        Returns:
+            np.ndarray: Filtered sample
+        """
+        x = np.asarray(sample, dtype=np.float64).reshape(1, self.__channels)
+
+        if self.__zi is None:
+            self.__zi = sosfilt_zi(self.__sos)[:, :, np.newaxis] * x
+
+        y, self.__zi = sosfilt(self.__sos, x, axis=0, zi=self.__zi)
+        self.__output = y[0]
+
+        return self.__output
+
+
+class CsvTailReader(object):
+    """
+    Follows a CSV trial file as it grows, parsing each appended line only once.
+
+    The byte offset just past the last complete line and the column layout are
+    remembered between reads, so each read() parses only lines appended since
+    the previous one; a partial trailing line (e.g., mid-way through a flush
+    by the writer thread) is left for the next read, unless the read is final
+    (e.g., of a finished file without a trailing newline). Parsed rows accumulate in
+    an in-memory array that grows by doubling, so a read costs time in
+    proportion to the new data, not the length of the file.
+
+    Leading '#' lines (e.g., a TrialWriter's reserved metadata header) are
+    skipped. If the file shrinks or is replaced, it is read again from the start.
+
+    Attributes:
+        path (str): Path of the file being followed
+
+    Methods:
+        read(final): Parse newly appended lines and return every row read so far
+        reset(): Forget everything read, so the next read starts from the beginning
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the CsvTailReader object.
+
+        Args:
+            path (str): Path of the CSV file to follow
+        """
+        self.__path = path
+        self.reset()
+
+    @property
+    def path(self) -> str:
+        """Get the path of the file being followed."""
+        return self.__path
+
+    def reset(self) -> None:
+        """Forget everything read, so the next read starts from the beginning."""
+        self.__offset = 0
+        self.__inode = None
+        self.__dtype = None
+        self.__rows = None
+        self.__count = 0
+
+    def read(self, final: bool = False) -> np.ndarray:
+        """
+        Parse lines appended since the last read.
+
+        Args:
+            final (bool, optional): Also parse an unterminated last line, as the file's
+                final row. The line is not consumed: if the file is still being
+                written, it is parsed again, whole, once complete. Defaults to False.
+
+        Returns:
+            np.ndarray: Every row read so far, typed as frame_number (int), pos_x/y/z
+                (float) and any other columns (str). A view, whose final row a later
+                read may overwrite; copy before modifying or keeping.
+
+        Raises:
+            ValueError: If the file lacks the frame_number and pos_x/y/z columns
+        """
+        stat = os.stat(self.__path)
+        if stat.st_ino != self.__inode or stat.st_size < self.__offset:
+            self.reset()
+            self.__inode = stat.st_ino
+
+        tail = b''
+        if stat.st_size > self.__offset:
+            with open(self.__path, 'rb') as file:
+                file.seek(self.__offset)
+                chunk = file.read(stat.st_size - self.__offset)
+
+            # only complete lines; the remainder is picked up next time
+            end = chunk.rfind(b'\n') + 1
+            if end:
+                self.__offset += end
+                self.__parse(chunk[:end])
+            tail = chunk[end:]
+
+        count = self.__count
+        if final and tail.strip() and self.__dtype is not None:
+            # parsed into the slots after the last complete row, which the
+            # next read reuses, without advancing the offset
+            try:
+                self.__parse(tail + b'\n')
+            except ValueError:
+                # too few fields to be a row yet
+                pass
+
+        if self.__rows is None:
+            return np.zeros(0, dtype=POSITION_DTYPE)
+
+        rows = self.__rows[: self.__count]
+        self.__count = count
+        return rows
+
+    def __parse(self, chunk: bytes) -> None:
+        if self.__dtype is None:
+            chunk = self.__parse_header(chunk)
+            if self.__dtype is None:
+                return
+
+        if not chunk.strip():
+            return
+
+        rows = np.atleast_1d(
+            np.genfromtxt(io.BytesIO(chunk), delimiter=',', dtype=self.__dtype)
+        )
+        self.__append(rows)
+
+    def __parse_header(self, chunk: bytes) -> bytes:
+        # skip metadata comments; the first other line names the columns
+        lines = chunk.split(b'\n')
+        for i, line in enumerate(lines[:-1]):
+            if line.startswith(b'#'):
+                continue
+
+            header = line.decode('utf-8').strip().split(',')
+            if any(
+                col not in header
+                for col in ['frame_number', 'pos_x', 'pos_y', 'pos_z']
+            ):
+                raise ValueError(
+                    'Data file must contain columns named frame_number, pos_x, pos_y, pos_z.'
+                )
+
+            # coerce expected columns to float, int, string (default)
+            self.__dtype = [
+                (
+                    name,
+                    (
+                        'float'
+                        if name in ['pos_x', 'pos_y', 'pos_z']
+                        else 'int'
+                        if name == 'frame_number'
+                        else 'U32'
+                    ),
+                )
+                for name in header
+            ]
+            return b'\n'.join(lines[i + 1 :])
+
+        return b''
+
+    def __append(self, rows: np.ndarray) -> None:
+        needed = self.__count + len(rows)
+
+        if self.__rows is None or needed > len(self.__rows):
+            capacity = max(needed, 2 * (0 if self.__rows is None else len(self.__rows)), 1024)
+            grown = np.zeros(capacity, dtype=rows.dtype)
+            if self.__rows is not None:
+                grown[: self.__count] = self.__rows[: self.__count]
+            self.__rows = grown
+
+        self.__rows[self.__count : needed] = rows
+        self.__count = needed
+
+
 class OptiTracker(object):
     """
     A class for querying and operating on motion tracking data.
@@ -24,6 +349,11 @@ class OptiTracker(object):
         sample_rate (int): Sampling rate of the tracking system in Hz
         window_size (int): Number of frames to consider for calculations
         data_dir (str): Directory path containing the tracking data files
+        data_live (bool): Whether the file at data_dir is still being written
+        frame_buffer (FrameBuffer): In-memory frame source; takes precedence over data_dir when set
+        frame_store (FrameStore): SQLite frame store opened from db_name; queried when no frame_buffer is set
+        min_markers (int): Markers required for a frame to count as observed
+        fill_policy (str): How unobserved frames are filled ('ffill' or 'nan')
 
     Methods:
         velocity(num_frames): Calculate velocity based on marker positions across specified number of frames
@@ -37,7 +367,11 @@ class OptiTracker(object):
         sample_rate: int = 120,
         window_size: int = 5,
         data_dir: str = '',
-        db_name: str = 'optitracker.db',
+        db_name: str = '',
+        frame_buffer: FrameBuffer | None = None,
+        min_markers: int = 1,
+        fill_policy: str = 'ffill',
+        kinematics_method: str = 'central',
     ):
         """
         Initialize the OptiTracker object.
@@ -47,6 +381,11 @@ class OptiTracker(object):
             sample_rate (int, optional): Sampling rate in Hz. Defaults to 120.
             window_size (int, optional): Number of frames for calculations. Defaults to 5.
             data_dir (str, optional): Path to data directory. Defaults to empty string.
+            db_name (str, optional): SQLite database to store ingested frames in (see FrameStore). Defaults to none.
+            frame_buffer (FrameBuffer, optional): Ring buffer to query instead of data_dir. Defaults to None.
+            min_markers (int, optional): Markers required for a frame to count as observed. Defaults to 1.
+            fill_policy (str, optional): Gap filling policy, 'ffill' or 'nan'. Defaults to 'ffill'.
+            kinematics_method (str, optional): Differencing used for ingested frames, 'central' or 'savgol'. Defaults to 'central'.
         """
 
         if marker_count:
@@ -54,31 +393,16 @@ class OptiTracker(object):
 
         self.__sample_rate = sample_rate
         self.__data_dir = data_dir
+        self.__data_live = False
+        self.__stream_filter = StreamingFilter(sample_rate=sample_rate)
+        self.__kinematics = Kinematics(sample_rate=sample_rate, method=kinematics_method)
         self.__window_size = window_size
-        # self.db = self.__connect(db_name)
-
-        # self.cursor = self.db.cursor()
-
-        db_scheme = """
-        CREATE TABLE IF NOT EXISTS frames (
-            frame_number INTEGER PRIMARY KEY,
-            pos_x REAL,
-            pos_y REAL,
-            pos_z REAL
-        )
-        """
-
-        # self.cursor.execute(db_scheme)
-
-    # @property
-    # def database(self) -> str:
-    #     """Get the name of the database file."""
-    #     return self.__database
-    #
-    # @database.setter
-    # def database(self, database: str) -> None:
-    #     """Set the name of the database file."""
-    #     self.__database = database
+        self.__frame_buffer = frame_buffer
+        # follows the CSV at data_dir between queries; replaced when data_dir changes
+        self.__csv_reader = None
+        self.__min_markers = min_markers
+        self.fill_policy = fill_policy
+        self.__frame_store = FrameStore(db_name) if db_name else None
 
     @property
     def marker_count(self) -> int:
@@ -100,6 +424,55 @@ class OptiTracker(object):
         """Set the data directory path."""
         self.__data_dir = data_dir
 
+    @property
+    def data_live(self) -> bool:
+        """Get whether the file at data_dir is still being written."""
+        return self.__data_live
+
+    @data_live.setter
+    def data_live(self, data_live: bool) -> None:
+        """Set whether the file at data_dir is still being written, e.g., while its writer is open."""
+        self.__data_live = data_live
+
+    @property
+    def frame_buffer(self) -> FrameBuffer | None:
+        """Get the in-memory frame buffer, if any."""
+        return self.__frame_buffer
+
+    @frame_buffer.setter
+    def frame_buffer(self, frame_buffer: FrameBuffer | None) -> None:
+        """Set the in-memory frame buffer; None reverts to querying data_dir."""
+        self.__frame_buffer = frame_buffer
+
+    @property
+    def frame_store(self) -> FrameStore | None:
+        """Get the SQLite frame store, if db_name was given."""
+        return self.__frame_store
+
+    @property
+    def min_markers(self) -> int:
+        """Get the number of markers required for a frame to count as observed."""
+        return self.__min_markers
+
+    @min_markers.setter
+    def min_markers(self, min_markers: int) -> None:
+        """Set the number of markers required for a frame to count as observed."""
+        self.__min_markers = min_markers
+
+    @property
+    def fill_policy(self) -> str:
+        """Get the policy used to fill unobserved frames."""
+        return self.__fill_policy
+
+    @fill_policy.setter
+    def fill_policy(self, fill_policy: str) -> None:
+        """Set the policy used to fill unobserved frames."""
+        if fill_policy not in FILL_POLICIES:
+            raise ValueError(
+                f'Fill policy must be one of {FILL_POLICIES}, got {fill_policy!r}.'
+            )
+        self.__fill_policy = fill_policy
+
     @property
     def sample_rate(self) -> int:
         """Get the sampling rate."""
@@ -109,6 +482,10 @@ class OptiTracker(object):
     def sample_rate(self, sample_rate: int) -> None:
         """Set the sampling rate."""
         self.__sample_rate = sample_rate
+        self.__stream_filter = StreamingFilter(sample_rate=sample_rate)
+        self.__kinematics = Kinematics(
+            sample_rate=sample_rate, method=self.__kinematics.method
+        )
 
     @property
     def window_size(self) -> int:
@@ -120,14 +497,78 @@ class OptiTracker(object):
         """Set the window size."""
         self.__window_size = window_size
 
+    def ingest(
+        self, frame_number: int, positions: np.ndarray, timestamp: float | None = None
+    ) -> None:
+        """
+        Take in one frame of streamed marker positions.
+
+        Writes the markers to the frame buffer (if set, and not a read-only
+        SharedFrameRing filled by another process) and to the frame store's
+        current trial (if any), advances the streaming filter
+        with their centroid, and feeds the smoothed centroid to the kinematics
+        engine, keeping position, velocity and acceleration current at O(1) cost
+        per frame. Only the first call for a given frame number updates
+        the filter; later calls (e.g., other marker sets) are only buffered.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+            timestamp (float, optional): Frame time in seconds; derived from frame_number if omitted
+        """
+        if self.__frame_buffer is not None and not self.__frame_buffer.read_only:
+            self.__frame_buffer.write(frame_number, positions)
+
+        if self.__frame_store is not None:
+            self.__frame_store.write_frame(frame_number, positions, timestamp)
+
+        if frame_number <= self.__kinematics.frame_number:
+            return
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        visible = positions[~np.isnan(positions).any(axis=1)]
+        if not len(visible):
+            return
+
+        smoothed = self.__stream_filter.update(visible.mean(axis=0) * POSITION_SCALE)
+        self.__kinematics.update(frame_number, smoothed, timestamp)
+
+    def reset_stream(self) -> None:
+        """Discard streaming filter and kinematics state, e.g., between trials."""
+        self.__stream_filter.reset()
+        self.__kinematics.reset()
+
+    def smoothed_position(self) -> np.ndarray:
+        """Get the causally smoothed centroid (x, y, z) of the latest ingested frame."""
+        if self.__stream_filter.output is None:
+            raise ValueError('No frames have been ingested yet.')
+
+        return self.__stream_filter.output.copy()
+
+    def smoothed_velocity(self) -> float:
+        """Get the current speed of the smoothed centroid, per the kinematics engine."""
+        return self.__kinematics.speed()
+
+    def acceleration(self) -> np.ndarray:
+        """Get the current acceleration vector of the smoothed centroid."""
+        return self.__kinematics.acceleration()
+
     def velocity(self, num_frames: int = 0) -> float:
-        """Calculate and return the current velocity."""
+        """
+        Calculate and return the current velocity.
+
+        Answered in O(1) from the kinematics engine once frames are being ingested;
+        otherwise computed from queried frames.
+        """
         if num_frames == 0:
             num_frames = self.__window_size
 
         if num_frames < 2:
             raise ValueError('Window size must cover at least two frames.')
 
+        if len(self.__kinematics) >= 2:
+            return self.__kinematics.average_speed(num_frames)
+
         frames = self.__query_frames(num_frames)
         return self.__velocity(frames)
 
@@ -137,11 +578,19 @@ class OptiTracker(object):
         return self.__column_means(smooth=False, frames=frame)
 
     def distance(self, num_frames: int = 0) -> float:
-        """Calculate and return the distance traveled over the specified number of frames."""
+        """
+        Calculate and return the distance traveled over the specified number of frames.
+
+        Answered in O(1) from the kinematics engine once frames are being ingested;
+        otherwise computed from queried frames.
+        """
 
         if num_frames == 0:
             num_frames = self.__window_size
 
+        if len(self.__kinematics):
+            return self.__kinematics.displacement(num_frames)
+
         frames = self.__query_frames(num_frames)
         return self.__euclidean_distance(frames)
 
@@ -155,15 +604,17 @@ class OptiTracker(object):
         Returns:
             float: Calculated velocity in cm/s
         """
-        if self.__window_size < 2:
-            raise ValueError('Window size must cover at least two frames.')
-
         if len(frames) == 0:
             frames = self.__query_frames()
 
         euclidean_distance = self.__euclidean_distance(frames)
 
-        return euclidean_distance / (self.__window_size / self.__sample_rate)
+        # time actually spanned by the queried frames, not the nominal window
+        span = frames['frame_number'].max() - frames['frame_number'].min()
+        if span < 1:
+            raise ValueError('Window size must cover at least two frames.')
+
+        return euclidean_distance / (span / self.__sample_rate)
 
     def __euclidean_distance(self, frames: np.ndarray = np.array([])) -> float:
         """
@@ -220,32 +671,18 @@ class OptiTracker(object):
         if len(frames) == 0:
             frames = self.__query_frames()
 
-        # Create output array with the correct dtype
-        smooth = np.zeros(
-            len(frames),
-            dtype=[
-                ('frame_number', 'i8'),
-                ('pos_x', 'i8'),
-                ('pos_y', 'i8'),
-                ('pos_z', 'i8'),
-            ],
-        )
+        smooth = np.zeros(len(frames), dtype=POSITION_DTYPE)
+        smooth['frame_number'] = frames['frame_number']
 
-        butt = butter(
-            N=order,
-            Wn=cutoff,
-            btype=filtype,
-            output='sos',
-            fs=self.__sample_rate,
-        )
+        sos = butter_sos(order, cutoff, self.__sample_rate, filtype)
 
-        # print("[__smooth()]")
-        # print("frames:")
-        # pprint(frames)
+        # filter all three axes in one pass over an (N, 3) view
+        xyz = np.column_stack([frames['pos_x'], frames['pos_y'], frames['pos_z']])
+        filtered = sosfiltfilt(sos=sos, x=xyz, axis=0)
 
-        smooth['pos_x'] = sosfiltfilt(sos=butt, x=frames['pos_x'])
-        smooth['pos_y'] = sosfiltfilt(sos=butt, x=frames['pos_y'])
-        smooth['pos_z'] = sosfiltfilt(sos=butt, x=frames['pos_z'])
+        smooth['pos_x'] = filtered[:, 0]
+        smooth['pos_y'] = filtered[:, 1]
+        smooth['pos_z'] = filtered[:, 2]
 
         return smooth
 
@@ -253,76 +690,76 @@ class OptiTracker(object):
         self, smooth: bool = True, frames: np.ndarray = np.array([])
     ) -> np.ndarray:
         """
-        Calculate column means of position data.
+        Calculate per-frame means (centroids) of marker position data.
 
         Args:
             frames (np.ndarray, optional): Array of frame data; queries last window_size frames if empty.
 
         Returns:
-            np.ndarray: Array of mean positions
+            np.ndarray: Array of mean positions, one row per frame number spanned by frames
 
         Note:
-            Currently applies smoothing function to generate means.
+            Smoothing is not currently applied to the means.
             This may (and should) be done on raw data within __query_frames instead.
         """
         if len(frames) == 0:
             frames = self.__query_frames()
 
-        # print("OptiTracker column_means, got frames:")
-        # pprint(frames)
-
-        # Create output array with the correct dtype
-        means = np.zeros(
-            len(frames) // self.__marker_count,
-            dtype=[
-                ('frame_number', 'i8'),
-                ('pos_x', 'i8'),
-                ('pos_y', 'i8'),
-                ('pos_z', 'i8'),
-            ],
+        means = frame_centroids(
+            frames, min_markers=self.__min_markers, fill=self.__fill_policy
         )
 
-        # Group by marker (every nth row where n is marker_count)
-        start = min(frames['frame_number'])
-        stop = max(frames['frame_number']) + 1
+        # if smooth:
+        #     means = self.__smooth(frames=means)
 
-        for frame_number in range(start, stop):
-            this_frame = frames[
-                frames['frame_number'] == frame_number,
-            ]
+        return means
 
-            # print("OptiTracker column_means, this frame:")
-            # pprint(this_frame)
+    def __query_frames(self, num_frames: int = 0) -> np.ndarray:
+        """
+        Query frame data from the frame buffer, the frame store, or the data file, in that order of preference.
 
-            # if not len(frame):
-            #     tmp = frame_number - 1
-            #     while not len(frame) and tmp >= start:
-            #         frame = frames[frames["frame_number"] == tmp,]
-            #         tmp -= 1
+        Args:
+            num_frames (int, optional): Number of frames to query. Defaults to window_size when empty.
 
-            idx = frame_number - start
-            means[idx]['pos_x'] = np.mean(this_frame['pos_x'])
-            means[idx]['pos_y'] = np.mean(this_frame['pos_y'])
-            means[idx]['pos_z'] = np.mean(this_frame['pos_z'])
+        Returns:
+            np.ndarray: Array of queried frame data
 
-            idx += 1
+        Raises:
+            ValueError: If data directory is not set, data format is invalid, or no frames are buffered or stored
+            FileNotFoundError: If data directory does not exist
+        """
 
-            # except RuntimeWarning as e:
-            #     means[idx]["pos_x"] = 0.0
-            #     means[idx]["pos_y"] = 0.0
-            #     means[idx]["pos_z"] = 0.0
+        if num_frames < 0:
+            raise ValueError('Number of frames cannot be negative.')
 
-        # if smooth:
-        #     means = self.__smooth(frames=means)
+        if num_frames == 0:
+            num_frames = self.__window_size
 
-        return means
+        if self.__frame_buffer is not None:
+            data = self.__frame_buffer.frames(num_frames)
 
-    def __query_frames(self, num_frames: int = 0) -> np.ndarray:
+            if data.size == 0:
+                raise ValueError('No frames have been buffered yet.')
+
+            return self.__rescale(data)
+
+        if self.__frame_store is not None:
+            # an indexed range query over the current trial's rows
+            data = self.__frame_store.frames(num_frames)
+
+            if data.size == 0:
+                raise ValueError('No frames have been stored for this trial yet.')
+
+            return self.__rescale(data)
+
+        return self.__read_file(num_frames)
+
+    def __read_file(self, num_frames: int) -> np.ndarray:
         """
-        Query and process frame data from the data file.
+        Read and filter frame data from the data file.
 
         Args:
-            num_frames (int, optional): Number of frames to query. Defaults to window_size when empty.
+            num_frames (int): Number of frames to query.
 
         Returns:
             np.ndarray: Array of queried frame data
@@ -340,61 +777,60 @@ class OptiTracker(object):
                 f'Data directory not found at:\n{self.__data_dir}'
             )
 
-        if num_frames < 0:
-            raise ValueError('Number of frames cannot be negative.')
+        if is_recording(self.__data_dir):
+            return self.__read_recording(num_frames)
 
-        with open(self.__data_dir, 'r') as file:
-            header = file.readline().strip().split(',')
+        if self.__csv_reader is None or self.__csv_reader.path != self.__data_dir:
+            self.__csv_reader = CsvTailReader(self.__data_dir)
 
-        if any(
-            col not in header
-            for col in ['frame_number', 'pos_x', 'pos_y', 'pos_z']
-        ):
-            raise ValueError(
-                'Data file must contain columns named frame_number, pos_x, pos_y, pos_z.'
-            )
+        # only lines appended since the last query are parsed; while the file
+        # is live, an unterminated last line may be mid-way through a flush,
+        # so it is left for a later query
+        rows = self.__csv_reader.read(final=not self.__data_live)
 
-        dtype_map = [
-            # coerce expected columns to float, int, string (default)
-            (
-                name,
-                (
-                    'float'
-                    if name in ['pos_x', 'pos_y', 'pos_z']
-                    else 'int'
-                    if name == 'frame_number'
-                    else 'U32'
-                ),
-            )
-            for name in header
-        ]
+        if len(rows) == 0:
+            raise ValueError('Data file contains no frames.')
 
-        # read in data now that columns have been validated and typed
-        data = np.genfromtxt(
-            self.__data_dir, delimiter=',', dtype=dtype_map, skip_header=1
-        )
+        # rows are in frame order; bisect avoids copying the strided column
+        lookback = int(rows['frame_number'][-1]) - num_frames
+        window = rows[bisect.bisect_right(rows['frame_number'], lookback) :]
 
-        for col in ['pos_x', 'pos_y', 'pos_z']:
-            # rescale from mm to cm
-            data[col] = np.rint(data[col] * 1000).astype(np.int32)
+        return self.__rescale(window.copy())
 
-        if num_frames == 0:
-            num_frames = self.__window_size
+    def __read_recording(self, num_frames: int) -> np.ndarray:
+        """
+        Read the last frames of a binary recording through a memory map.
 
-        # Calculate which frames to include
-        last_frame = data['frame_number'][-1]
-        lookback = last_frame - num_frames
+        Records are stored in frame order, so the window is located by binary
+        search and only its pages are read from disk. The search uses bisect:
+        np.searchsorted would first copy the strided frame_number column of
+        the whole file into a contiguous array.
 
-        # Filter for relevant frames
-        data = data[data['frame_number'] > lookback]
+        Args:
+            num_frames (int): Number of frames to query.
 
-        return data
+        Returns:
+            np.ndarray: Array of queried frame data
+        """
+        _, records = read_recording(self.__data_dir)
+
+        if len(records) == 0:
+            raise ValueError('Data file contains no frames.')
+
+        frame_numbers = records['frame_number']
+        lookback = int(frame_numbers[-1]) - num_frames
+        window = records[bisect.bisect_right(frame_numbers, lookback) :]
 
-    # def __connect(self, db_name: str = "optitracker.db") -> sqlite3.Connection:
-    #     """
-    #     Connect to the SQLite database.
-    #
-    #     Returns:
-    #         sqlite3.Connection: Connection object
-    #     """
-    #     return sqlite3.connect(db_name)
+        data = np.zeros(len(window), dtype=POSITION_DTYPE)
+        for col in ['frame_number', 'pos_x', 'pos_y', 'pos_z']:
+            data[col] = window[col]
+
+        return self.__rescale(data)
+
+    def __rescale(self, data: np.ndarray) -> np.ndarray:
+        """Rescale positional columns in place, regardless of frame source."""
+        for col in ['pos_x', 'pos_y', 'pos_z']:
+            # rescale from mm to cm
+            data[col] = np.rint(data[col] * POSITION_SCALE).astype(np.int32)
+
+        return data
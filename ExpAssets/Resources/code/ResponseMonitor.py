@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Iterator
+
+
+FRAMES = 'frames'
+PRESS = 'press'
+RELEASE = 'release'
+
+
+class ResponseMonitor(object):
+    """
+    Waits for response events, sleeping between them instead of spinning.
+
+    The frame producer (e.g., the NatNet data thread) calls notify() after it
+    queues a frame, which wakes the waiting thread at once. The keyboard cannot
+    be read off the main thread under SDL, so between frames it is sampled every
+    poll_interval seconds, bounding how late a press or release is seen.
+
+    Events are timestamped at their source: key changes with the clock reading of
+    the sample that saw them, frames with their arrival time on the producer
+    thread. Frame timestamps from the tracking system can be mapped onto the same
+    clock with to_local(), using the smallest arrival-minus-timestamp offset seen
+    since reset() (i.e., the least delayed frame).
+
+    Attributes:
+        poll_interval (float): Longest time in seconds between keyboard samples
+        key_down (bool): Key state as of the last sample
+
+    Methods:
+        notify(timestamp): Signal that a frame was queued; called by the producer
+        reset(key_down): Set the assumed key state and forget clock offsets, e.g., per trial
+        events(until): Yield (event, time) pairs until a deadline
+        to_local(timestamp): Map a tracking system timestamp onto the local clock
+    """
+
+    def __init__(
+        self,
+        key_state: Callable[[], int],
+        poll_interval: float = 0.001,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        """
+        Initialize the ResponseMonitor object.
+
+        Args:
+            key_state (Callable[[], int]): Returns 1 while the response key is held, else 0
+            poll_interval (float, optional): Seconds between keyboard samples. Defaults to 0.001.
+            clock (Callable[[], float], optional): Clock events are timestamped with. Defaults to time.perf_counter.
+        """
+        if poll_interval <= 0:
+            raise ValueError('Poll interval must be positive.')
+
+        self.__key_state = key_state
+        self.__poll_interval = poll_interval
+        self.__clock = clock
+
+        self.__frames = threading.Event()
+        # set once a producer notifies; until then every poll is treated as a frame wake
+        self.__notified = False
+        self.__arrival = 0.0
+        self.__offset = None
+
+        self.reset()
+
+    @property
+    def poll_interval(self) -> float:
+        """Get the longest time in seconds between keyboard samples."""
+        return self.__poll_interval
+
+    @property
+    def key_down(self) -> bool:
+        """Get the key state as of the last sample."""
+        return self.__key_down
+
+    def reset(self, key_down: bool = True) -> None:
+        """
+        Set the assumed key state and forget clock offsets, e.g., at the start of a trial.
+
+        Args:
+            key_down (bool, optional): Key state to compare the first sample against. Defaults to True.
+        """
+        self.__key_down = key_down
+        self.__offset = None
+
+    def notify(self, timestamp: float | None = None) -> None:
+        """
+        Signal that a frame was queued. Called on the producer's thread.
+
+        Args:
+            timestamp (float, optional): The frame's tracking system timestamp in seconds
+        """
+        arrival = self.__clock()
+        self.__arrival = arrival
+        self.__notified = True
+
+        if timestamp is not None:
+            offset = arrival - timestamp
+            if self.__offset is None or offset < self.__offset:
+                self.__offset = offset
+
+        self.__frames.set()
+
+    def to_local(self, timestamp: float | None) -> float | None:
+        """
+        Map a tracking system timestamp onto the local clock.
+
+        Returns:
+            float: Local time of the frame, or None without a timestamp or notified frames to map by
+        """
+        if timestamp is None or self.__offset is None:
+            return None
+        return timestamp + self.__offset
+
+    def events(self, until: float) -> Iterator[tuple[str, float]]:
+        """
+        Yield events as they happen until the local clock reaches until.
+
+        Yields:
+            tuple[str, float]: (PRESS or RELEASE, sample time) on key changes, and
+                (FRAMES, arrival time of the latest frame) once new frames are queued.
+                Without a notifying producer, FRAMES is yielded on every poll.
+        """
+        while True:
+            now = self.__clock()
+
+            down = bool(self.__key_state())
+            if down != self.__key_down:
+                self.__key_down = down
+                yield (PRESS if down else RELEASE), now
+
+            if self.__frames.is_set():
+                self.__frames.clear()
+                yield FRAMES, self.__arrival
+            elif not self.__notified:
+                yield FRAMES, now
+
+            remaining = until - self.__clock()
+            if remaining <= 0:
+                return
+
+            self.__frames.wait(min(self.__poll_interval, remaining))
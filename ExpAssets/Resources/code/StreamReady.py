@@ -0,0 +1,120 @@
+import threading
+
+import numpy as np
+
+
+class StreamReady(object):
+    """
+    A readiness condition that fires once enough complete frames have arrived.
+
+    A frame is complete when it carries marker_count visible (non-NaN) markers.
+    Frames can be observed from any thread (e.g., the NatNet data thread, or the
+    trial loop as it drains its queue) and waited on from another. Observing
+    costs O(1) per frame, and nothing once the condition has fired.
+
+    Attributes:
+        marker_count (int): Visible markers a frame needs to count as complete
+        frames_required (int): Complete frames needed before the stream is ready
+        ready (bool): Whether enough complete frames have arrived since reset()
+
+    Methods:
+        observe(frame_number, markers): Count one received frame
+        wait(timeout): Block until the stream is ready or the timeout expires
+        reset(): Re-arm the condition, e.g., per trial
+        diagnostic(): Describe what has arrived so far, for error messages
+    """
+
+    def __init__(self, marker_count: int, frames_required: int = 5):
+        """
+        Initialize the StreamReady object.
+
+        Args:
+            marker_count (int): Visible markers a frame needs to count as complete
+            frames_required (int, optional): Complete frames needed. Defaults to 5.
+        """
+        if marker_count < 1:
+            raise ValueError('Marker count must be at least one.')
+
+        if frames_required < 1:
+            raise ValueError('At least one frame must be required.')
+
+        self.__marker_count = marker_count
+        self.__frames_required = frames_required
+        self.__event = threading.Event()
+
+        self.reset()
+
+    @property
+    def marker_count(self) -> int:
+        """Get the number of visible markers a frame needs to count as complete."""
+        return self.__marker_count
+
+    @property
+    def frames_required(self) -> int:
+        """Get the number of complete frames needed before the stream is ready."""
+        return self.__frames_required
+
+    @property
+    def ready(self) -> bool:
+        """Get whether enough complete frames have arrived since reset()."""
+        return self.__event.is_set()
+
+    def reset(self) -> None:
+        """Re-arm the condition; frames observed before now no longer count."""
+        self.__event.clear()
+        self.__frames = 0
+        self.__complete = 0
+        self.__last_frame = None
+        self.__last_markers = 0
+
+    def observe(self, frame_number: int, markers: np.ndarray) -> bool:
+        """
+        Count one received frame.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            markers (np.ndarray): Marker positions, shaped (N, 3)
+
+        Returns:
+            bool: Whether the stream is ready
+        """
+        if self.__event.is_set():
+            return True
+
+        markers = np.asarray(markers).reshape(-1, 3)
+        visible = int(np.count_nonzero(~np.isnan(markers).any(axis=1)))
+
+        self.__frames += 1
+        self.__last_frame = frame_number
+        self.__last_markers = visible
+
+        if visible == self.__marker_count:
+            self.__complete += 1
+            if self.__complete >= self.__frames_required:
+                self.__event.set()
+                return True
+
+        return False
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Block until the stream is ready.
+
+        Args:
+            timeout (float, optional): Seconds to wait; None waits indefinitely. Defaults to None.
+
+        Returns:
+            bool: Whether the stream is ready (False on timeout)
+        """
+        return self.__event.wait(timeout)
+
+    def diagnostic(self) -> str:
+        """Describe the frames observed since reset(), e.g., to explain a timeout."""
+        if not self.__frames:
+            return 'No frames have been received; check that Motive is streaming.'
+
+        return (
+            f'{self.__complete} of {self.__frames_required} complete frames received '
+            f'({self.__frames} frames in all); the last, frame {self.__last_frame}, '
+            f'had {self.__last_markers} of {self.__marker_count} markers visible.'
+        )
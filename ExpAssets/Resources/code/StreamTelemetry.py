@@ -0,0 +1,219 @@
+import math
+
+import numpy as np
+
+
+class StreamTelemetry(object):
+    """
+    Running acquisition statistics for a NatNet frame stream.
+
+    The receiving side records each decoded frame (frame number, arrival time
+    and decode time), and the consuming side records each drain of its frame
+    queue. All updates are O(1) with no allocation, so recording can stay on
+    for the whole session; reset() starts a new period, e.g. per trial.
+
+    Frame numbers that skip ahead count as a gap, with the skipped numbers
+    counted as missing frames. Frame numbers that do not advance count as out
+    of order, unless they jump back by more than resync_frames (e.g., Motive
+    restarted or a take reloaded): that counts once as a resync, and continuity
+    is tracked from the new frame number. Inter-arrival intervals go into a fixed-width histogram, with the
+    last bin collecting anything longer. Jitter is the smoothed absolute change
+    between consecutive intervals, as in RFC 3550.
+
+    Attributes:
+        bin_ms (float): Width of the interval histogram bins in milliseconds
+        bins (int): Number of interval histogram bins
+        resync_frames (int): Backward jump in frame number taken as a restarted stream
+
+    Methods:
+        record_frame(frame_number, arrival, decode_time): Record one decoded frame
+        record_drain(depth, dropped): Record one drain of the consumer's frame queue
+        frame_stats(): Get stream statistics as a dict
+        queue_stats(): Get queue statistics as a dict
+        snapshot(): Get all statistics as one flat dict
+        reset(): Start a new recording period
+    """
+
+    def __init__(self, bin_ms: float = 1.0, bins: int = 32, resync_frames: int = 120):
+        """
+        Initialize the StreamTelemetry object.
+
+        Args:
+            bin_ms (float, optional): Interval histogram bin width in ms. Defaults to 1.0.
+            bins (int, optional): Number of interval histogram bins. Defaults to 32.
+            resync_frames (int, optional): Backward jump in frame number taken as a restarted stream. Defaults to 120.
+        """
+        if bin_ms <= 0:
+            raise ValueError('Bin width must be positive.')
+
+        if bins < 1:
+            raise ValueError('Histogram needs at least one bin.')
+
+        if resync_frames < 1:
+            raise ValueError('Resync threshold must be at least one frame.')
+
+        self.__bin_ms = bin_ms
+        self.__bins = bins
+        self.__resync_frames = resync_frames
+        self.__histogram = np.zeros(bins, dtype=np.int64)
+
+        # carried across periods, so gaps at a period boundary are still counted
+        self.__last_frame = None
+        self.__last_arrival = 0.0
+        self.__last_interval = None
+        # cumulative queue drops last reported, so each period counts its own
+        self.__last_dropped = 0
+
+        self.reset()
+
+    @property
+    def bin_ms(self) -> float:
+        """Get the interval histogram bin width in milliseconds."""
+        return self.__bin_ms
+
+    @property
+    def bins(self) -> int:
+        """Get the number of interval histogram bins."""
+        return self.__bins
+
+    @property
+    def resync_frames(self) -> int:
+        """Get the backward jump in frame number taken as a restarted stream."""
+        return self.__resync_frames
+
+    def reset(self) -> None:
+        """Start a new recording period. Frame continuity carries over."""
+        self.__frames = 0
+        self.__gaps = 0
+        self.__missing = 0
+        self.__out_of_order = 0
+        self.__resyncs = 0
+
+        self.__intervals = 0
+        self.__interval_mean = 0.0
+        self.__interval_m2 = 0.0
+        self.__interval_max = 0.0
+        self.__jitter = 0.0
+        self.__histogram[:] = 0
+
+        self.__decode_total = 0.0
+        self.__decode_max = 0.0
+
+        self.__drains = 0
+        self.__depth_total = 0
+        self.__depth_max = 0
+        self.__dropped = 0
+
+    def record_frame(self, frame_number: int, arrival: float, decode_time: float) -> None:
+        """
+        Record one decoded frame.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            arrival (float): Receive time in seconds, from time.perf_counter()
+            decode_time (float): Seconds spent decoding the frame
+        """
+        self.__frames += 1
+        self.__decode_total += decode_time
+        if decode_time > self.__decode_max:
+            self.__decode_max = decode_time
+
+        if self.__last_frame is not None:
+            step = frame_number - self.__last_frame
+            if step < -self.__resync_frames:
+                # the frame counter restarted; the interval across it means nothing
+                self.__resyncs += 1
+                self.__last_interval = None
+            elif step <= 0:
+                self.__out_of_order += 1
+                return
+            else:
+                if step > 1:
+                    self.__gaps += 1
+                    self.__missing += step - 1
+
+                self.__record_interval((arrival - self.__last_arrival) * 1000)
+
+        self.__last_frame = frame_number
+        self.__last_arrival = arrival
+
+    def record_drain(self, depth: int, dropped: int) -> None:
+        """
+        Record one drain of the consumer's frame queue.
+
+        Args:
+            depth (int): Frames waiting when the queue was drained
+            dropped (int): The queue's cumulative count of frames lost to overflow
+        """
+        self.__drains += 1
+        self.__depth_total += depth
+        if depth > self.__depth_max:
+            self.__depth_max = depth
+
+        self.__dropped += max(0, dropped - self.__last_dropped)
+        self.__last_dropped = dropped
+
+    def frame_stats(self) -> dict:
+        """
+        Get stream statistics for the current period.
+
+        Returns:
+            dict: Frame counts, gaps, resyncs, interval and jitter statistics (ms), and decode times (us)
+        """
+        intervals = self.__intervals
+        return {
+            'frames': self.__frames,
+            'gaps': self.__gaps,
+            'missing_frames': self.__missing,
+            'out_of_order': self.__out_of_order,
+            'resyncs': self.__resyncs,
+            'interval_mean_ms': self.__interval_mean if intervals else math.nan,
+            'interval_sd_ms': (
+                math.sqrt(self.__interval_m2 / (intervals - 1)) if intervals > 1 else math.nan
+            ),
+            'interval_max_ms': self.__interval_max if intervals else math.nan,
+            'jitter_ms': self.__jitter,
+            'interval_bin_ms': self.__bin_ms,
+            'interval_histogram': self.__histogram.tolist(),
+            'decode_mean_us': (
+                self.__decode_total / self.__frames * 1e6 if self.__frames else math.nan
+            ),
+            'decode_max_us': self.__decode_max * 1e6,
+        }
+
+    def queue_stats(self) -> dict:
+        """
+        Get frame queue statistics for the current period.
+
+        Returns:
+            dict: Drain count, mean and max queue depth, and frames lost to overflow
+        """
+        return {
+            'drains': self.__drains,
+            'queue_depth_mean': (
+                self.__depth_total / self.__drains if self.__drains else math.nan
+            ),
+            'queue_depth_max': self.__depth_max,
+            'queue_dropped': self.__dropped,
+        }
+
+    def snapshot(self) -> dict:
+        """Get stream and queue statistics for the current period as one flat dict."""
+        return {**self.frame_stats(), **self.queue_stats()}
+
+    def __record_interval(self, interval: float) -> None:
+        self.__intervals += 1
+
+        # Welford's running mean and variance
+        delta = interval - self.__interval_mean
+        self.__interval_mean += delta / self.__intervals
+        self.__interval_m2 += delta * (interval - self.__interval_mean)
+
+        if interval > self.__interval_max:
+            self.__interval_max = interval
+
+        self.__histogram[min(int(interval / self.__bin_ms), self.__bins - 1)] += 1
+
+        if self.__last_interval is not None:
+            self.__jitter += (abs(interval - self.__last_interval) - self.__jitter) / 16
+        self.__last_interval = interval
@@ -0,0 +1,357 @@
+"""
+Offline kinematics for a study's OptiData trial files.
+
+Trial files land in a participant/session tree beneath the study's data
+directory (P.opti_data_dir):
+
+    <participant>/<phase>/<hand>/<side>/P<id>_B<block>_T<trial>_OptiData.txt
+
+analyse_tree() walks the tree and analyses trials across a process pool,
+reusing OptiTracker's centroid and Butterworth filter code, then writes one
+results table (CSV, one row per trial, one column per measure) for the study.
+
+Results are cached per file alongside the tree. A file whose size and mtime
+are unchanged is not read again; one whose size or mtime has changed (e.g.,
+after copying the tree) is hashed, and only re-analysed if its contents
+differ. Changing the analysis settings invalidates the whole cache.
+
+Run as a script to analyse a study:
+
+    python TrialAnalysis.py path/to/OptiData [--workers 8]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Sequence
+
+import numpy as np
+from scipy.signal import sosfiltfilt
+
+from OptiRecording import is_recording, read_recording
+from OptiTracker import (
+    POSITION_DTYPE,
+    POSITION_SCALE,
+    CsvTailReader,
+    butter_sos,
+    frame_centroids,
+)
+
+
+TRIAL_PATTERN = re.compile(
+    r'^P(?P<participant>.+)_B(?P<block>\d+)_T(?P<trial>\d+)_OptiData\.(txt|bin)$'
+)
+
+RESULTS_NAME = 'kinematics.csv'
+CACHE_NAME = '.kinematics_cache.json'
+
+TRIAL_FIELDS = ['participant', 'phase', 'hand', 'side', 'block', 'trial', 'path']
+MEASURE_FIELDS = [
+    'frames',
+    'onset_frame',
+    'onset_time',
+    'peak_velocity',
+    'time_to_peak',
+    'path_length',
+    'end_x',
+    'end_y',
+    'end_z',
+    'error',
+]
+
+DEFAULT_SETTINGS = {
+    'sample_rate': 120,
+    'min_markers': 1,
+    'cutoff': 10,
+    'order': 2,
+    # tracker units (streamed metres * POSITION_SCALE) per second
+    'onset_velocity': 50,
+}
+
+
+def find_trials(root: str) -> Iterator[dict]:
+    """
+    Find trial files beneath a study's data directory.
+
+    Args:
+        root (str): The study's data directory
+
+    Yields:
+        dict: Trial fields (see TRIAL_FIELDS), with path relative to root
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            match = TRIAL_PATTERN.match(filename)
+            if match is None:
+                continue
+
+            path = os.path.relpath(os.path.join(dirpath, filename), root)
+            # <participant>/<phase>/<hand>/<side>/<file>; shallower trees leave blanks
+            parts = path.split(os.sep)[:-1]
+            phase, hand, side = (parts[1:4] + ['', '', ''])[:3]
+
+            yield {
+                'participant': match['participant'],
+                'phase': phase,
+                'hand': hand,
+                'side': side,
+                'block': int(match['block']),
+                'trial': int(match['trial']),
+                'path': path,
+            }
+
+
+def load_trial(path: str) -> np.ndarray:
+    """
+    Read every marker row of a trial file, CSV or binary.
+
+    Returns:
+        np.ndarray: Rows with fields frame_number, pos_x, pos_y, pos_z, in tracker units
+    """
+    if is_recording(path):
+        _, rows = read_recording(path)
+    else:
+        rows = CsvTailReader(path).read(final=True)
+
+    data = np.zeros(len(rows), dtype=POSITION_DTYPE)
+    data['frame_number'] = rows['frame_number']
+    for col in ['pos_x', 'pos_y', 'pos_z']:
+        data[col] = rows[col] * POSITION_SCALE
+
+    return data
+
+
+def analyse_trial(
+    path: str,
+    sample_rate: float = 120,
+    min_markers: int = 1,
+    cutoff: float = 10,
+    order: int = 2,
+    onset_velocity: float = 50,
+) -> dict:
+    """
+    Compute summary kinematics of the hand centroid over one trial.
+
+    Marker rows are averaged into per-frame centroids (gaps carried forward),
+    smoothed with a dual-pass Butterworth filter, and differenced into speed.
+    Movement onset is the first frame at which speed exceeds onset_velocity;
+    the peak and path length are taken from onset onwards.
+
+    Args:
+        path (str): Path to the trial file
+        sample_rate (float, optional): Sampling rate in Hz. Defaults to 120.
+        min_markers (int, optional): Markers required for a frame to count as observed. Defaults to 1.
+        cutoff (float, optional): Filter cutoff frequency in Hz. Defaults to 10.
+        order (int, optional): Filter order. Defaults to 2.
+        onset_velocity (float, optional): Onset threshold in tracker units per second. Defaults to 50.
+
+    Returns:
+        dict: Values for MEASURE_FIELDS; onset and peak measures are None if the
+            hand never reached onset_velocity
+
+    Raises:
+        ValueError: If the file has too few observed frames to analyse
+    """
+    centroids = frame_centroids(load_trial(path), min_markers=min_markers)
+    xyz = np.column_stack(
+        [centroids['pos_x'], centroids['pos_y'], centroids['pos_z']]
+    )
+
+    if len(xyz) < 2 or np.isnan(xyz).any():
+        raise ValueError('Trial has too few observed frames to analyse.')
+
+    sos = butter_sos(order, cutoff, sample_rate)
+    try:
+        xyz = sosfiltfilt(sos=sos, x=xyz, axis=0)
+    except ValueError:
+        # shorter than the filter's padding; use the raw centroids
+        pass
+
+    # centroids span every frame number, so each step is one frame apart
+    steps = np.linalg.norm(np.diff(xyz, axis=0), axis=1)
+    speed = steps * sample_rate
+
+    result = dict.fromkeys(MEASURE_FIELDS)
+    result.update(
+        frames=len(centroids),
+        end_x=float(xyz[-1, 0]),
+        end_y=float(xyz[-1, 1]),
+        end_z=float(xyz[-1, 2]),
+    )
+
+    moving = np.flatnonzero(speed > onset_velocity)
+    if len(moving) == 0:
+        return result
+
+    onset = int(moving[0])
+    peak = onset + int(np.argmax(speed[onset:]))
+
+    result.update(
+        onset_frame=int(centroids['frame_number'][onset]),
+        onset_time=onset / sample_rate,
+        peak_velocity=float(speed[peak]),
+        time_to_peak=(peak - onset) / sample_rate,
+        path_length=float(steps[onset:].sum()),
+    )
+    return result
+
+
+def file_digest(path: str) -> str:
+    """Hash a file's contents, reading it in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _analyse(path: str, settings: dict) -> tuple[str, dict]:
+    # runs in a worker process; errors are recorded against the trial, not raised
+    digest = file_digest(path)
+    try:
+        return digest, analyse_trial(path, **settings)
+    except Exception as e:
+        result = dict.fromkeys(MEASURE_FIELDS)
+        result['error'] = f'{type(e).__name__}: {e}'
+        return digest, result
+
+
+def _load_cache(path: str, settings: dict) -> dict:
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if cache.get('settings') != settings:
+        return {}
+
+    return cache.get('files', {})
+
+
+def analyse_tree(
+    root: str,
+    out_path: str = '',
+    cache_path: str = '',
+    workers: int | None = None,
+    force: bool = False,
+    **settings,
+) -> tuple[str, int]:
+    """
+    Analyse every trial beneath a study's data directory and write a results table.
+
+    Args:
+        root (str): The study's data directory
+        out_path (str, optional): Results table path. Defaults to RESULTS_NAME within root.
+        cache_path (str, optional): Cache path. Defaults to CACHE_NAME within root.
+        workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        force (bool, optional): Re-analyse every trial, ignoring the cache. Defaults to False.
+        **settings: Overrides of DEFAULT_SETTINGS, passed to analyse_trial()
+
+    Returns:
+        tuple[str, int]: Path of the results table, and the number of trials (re-)analysed
+
+    Raises:
+        ValueError: If a setting is not recognized
+    """
+    unknown = set(settings) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f'Unrecognized analysis settings: {sorted(unknown)}')
+
+    settings = {**DEFAULT_SETTINGS, **settings}
+    out_path = out_path or os.path.join(root, RESULTS_NAME)
+    cache_path = cache_path or os.path.join(root, CACHE_NAME)
+
+    cached = {} if force else _load_cache(cache_path, settings)
+    trials = list(find_trials(root))
+    files = {}
+    stale = []
+
+    for trial in trials:
+        path = os.path.join(root, trial['path'])
+        stat = os.stat(path)
+        entry = cached.get(trial['path'])
+
+        if entry is not None and (entry['size'], entry['mtime_ns']) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            # touched or copied; only contents decide whether to re-analyse
+            if entry['size'] == stat.st_size and entry['digest'] == file_digest(path):
+                entry = {**entry, 'mtime_ns': stat.st_mtime_ns}
+            else:
+                entry = None
+
+        if entry is None or entry['result'].get('error'):
+            stale.append((trial['path'], stat))
+        else:
+            files[trial['path']] = entry
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_analyse, os.path.join(root, rel_path), settings)
+                for rel_path, _ in stale
+            ]
+            for (rel_path, stat), future in zip(stale, futures):
+                digest, result = future.result()
+                files[rel_path] = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'digest': digest,
+                    'result': result,
+                }
+
+    with open(out_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=TRIAL_FIELDS + MEASURE_FIELDS)
+        writer.writeheader()
+        for trial in trials:
+            writer.writerow({**trial, **files[trial['path']]['result']})
+
+    # written last and atomically, so an interrupted run leaves the old cache usable
+    with open(cache_path + '.tmp', 'w') as file:
+        json.dump({'settings': settings, 'files': files}, file)
+    os.replace(cache_path + '.tmp', cache_path)
+
+    return out_path, len(stale)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Compute per-trial reach kinematics for a study.'
+    )
+    parser.add_argument('root', help="the study's OptiData directory")
+    parser.add_argument('--out', default='', help=f'results table (default: <root>/{RESULTS_NAME})')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPUs)')
+    parser.add_argument('--force', action='store_true', help='ignore cached results')
+    parser.add_argument('--sample-rate', type=float, default=DEFAULT_SETTINGS['sample_rate'])
+    parser.add_argument('--min-markers', type=int, default=DEFAULT_SETTINGS['min_markers'])
+    parser.add_argument('--cutoff', type=float, default=DEFAULT_SETTINGS['cutoff'], help='filter cutoff (Hz)')
+    parser.add_argument(
+        '--onset-velocity',
+        type=float,
+        default=DEFAULT_SETTINGS['onset_velocity'],
+        help='movement onset threshold (tracker units/s)',
+    )
+    args = parser.parse_args(argv)
+
+    out_path, analysed = analyse_tree(
+        args.root,
+        out_path=args.out,
+        workers=args.workers,
+        force=args.force,
+        sample_rate=args.sample_rate,
+        min_markers=args.min_markers,
+        cutoff=args.cutoff,
+        onset_velocity=args.onset_velocity,
+    )
+    print(f'Analysed {analysed} trials; wrote {out_path}')
+
+
+if __name__ == '__main__':
+    main()
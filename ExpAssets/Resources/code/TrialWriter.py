@@ -0,0 +1,235 @@
+import csv
+import threading
+from typing import IO, Iterable, Sequence
+
+import numpy as np
+
+
+# bytes reserved for metadata comments ahead of the column header, when requested
+HEADER_SIZE = 1024
+# appended to a recording's path for metadata that does not fit its reserved header
+METADATA_EXT = '.meta'
+METADATA_RULE = '#----------------------------------------'
+
+
+def encode_comments(metadata: dict, header_size: int = 0) -> bytes:
+    """
+    Encode metadata as '#key: value' comment lines, closed by a rule.
+
+    Args:
+        metadata (dict): Metadata to encode; newlines in values are replaced by spaces
+        header_size (int, optional): Pad the rule with spaces to exactly this many bytes. Defaults to 0 (no padding).
+
+    Returns:
+        bytes: UTF-8 comment lines
+
+    Raises:
+        ValueError: If the comments do not fit in header_size bytes
+    """
+    lines = [
+        f'#{key}: ' + ' '.join(str(value).splitlines())
+        for key, value in metadata.items()
+    ]
+    comments = '\n'.join(lines + [METADATA_RULE]).encode('utf-8')
+
+    if not header_size:
+        return comments + b'\n'
+
+    if len(comments) + 1 > header_size:
+        raise ValueError(
+            f'Trial metadata needs {len(comments) + 1} bytes; only {header_size} are reserved.'
+        )
+
+    return comments.ljust(header_size - 1) + b'\n'
+
+
+class TrialWriter(object):
+    """
+    A trial-scoped CSV writer that keeps its file open and writes in batches.
+
+    Rows handed to write() are only appended to an in-memory list, so the
+    calling thread (typically the NatNet data thread) never blocks on the
+    filesystem. A background thread flushes buffered rows to disk every
+    flush_interval seconds, or sooner once batch_size rows are pending.
+
+    Metadata set during the trial is written on close as '#key: value' comment
+    lines. With header_size set, the file starts with that many bytes of blank
+    comment, which the metadata overwrites in place, so the recording is never
+    read back or rewritten. Metadata that does not fit, or that has no reserved
+    header to go to, is written to a sidecar file at path + METADATA_EXT.
+
+    Attributes:
+        path (str): Path of the file being written
+        rows_written (int): Number of rows flushed to disk so far
+        closed (bool): Whether the writer has been closed
+
+    Methods:
+        write(rows): Buffer rows for writing
+        write_frame(frame_number, positions, timestamp): Buffer one frame of marker positions
+        set_metadata(metadata): Update metadata written on close
+        flush(): Write all buffered rows to disk now
+        close(): Flush remaining rows and close the file
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fieldnames: Sequence[str],
+        batch_size: int = 1200,
+        flush_interval: float = 0.25,
+        header_size: int = 0,
+    ):
+        """
+        Open the file, write its header, and start the flush thread.
+
+        Args:
+            path (str): Path of the file to create (truncated if it exists)
+            fieldnames (Sequence[str]): Column names written as the header row
+            batch_size (int, optional): Pending rows that trigger an early flush. Defaults to 1200.
+            flush_interval (float, optional): Seconds between periodic flushes. Defaults to 0.25.
+            header_size (int, optional): Bytes reserved for metadata ahead of the header row. Defaults to 0.
+        """
+        if header_size and header_size < len(METADATA_RULE) + 1:
+            raise ValueError('Reserved header is too small to hold any metadata.')
+
+        self.__path = path
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__header_size = header_size
+        self.__metadata = {}
+
+        self.__file = self._open(path, fieldnames)
+
+        self.__pending = []
+        self.__rows_written = 0
+        self.__closed = False
+
+        # guards the pending list; held only long enough to append or swap it
+        self.__buffer_lock = threading.Lock()
+        # serializes access to the file between the flush thread and callers
+        self.__io_lock = threading.Lock()
+        self.__wake = threading.Event()
+
+        self.__thread = threading.Thread(target=self.__flush_loop, daemon=True)
+        self.__thread.start()
+
+    def __enter__(self) -> 'TrialWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def path(self) -> str:
+        """Get the path of the file being written."""
+        return self.__path
+
+    @property
+    def rows_written(self) -> int:
+        """Get the number of rows flushed to disk so far."""
+        return self.__rows_written
+
+    @property
+    def closed(self) -> bool:
+        """Get whether the writer has been closed."""
+        return self.__closed
+
+    def write(self, rows: Iterable[Sequence]) -> None:
+        """
+        Buffer rows for writing. Rows written after close() are discarded.
+
+        Args:
+            rows (Iterable[Sequence]): Rows ordered to match the header
+        """
+        with self.__buffer_lock:
+            if self.__closed:
+                return
+            self.__pending.extend(rows)
+            pending = len(self.__pending)
+
+        if pending >= self.__batch_size:
+            self.__wake.set()
+
+    def write_frame(
+        self, frame_number: int, positions: np.ndarray, timestamp: float | None = None
+    ) -> None:
+        """
+        Buffer one frame of marker positions as (pos_x, pos_y, pos_z, frame_number) rows.
+
+        Args:
+            frame_number (int): Frame number reported by the tracking system
+            positions (np.ndarray): Marker positions, shaped (N, 3)
+            timestamp (float, optional): Frame time in seconds; not stored in CSV files
+        """
+        self.write(
+            [*marker, frame_number]
+            for marker in np.asarray(positions).reshape(-1, 3).tolist()
+        )
+
+    def set_metadata(self, metadata: dict) -> None:
+        """Merge metadata into what will be written on close."""
+        self.__metadata.update(metadata)
+
+    def flush(self) -> None:
+        """Write all buffered rows to disk now."""
+        with self.__buffer_lock:
+            rows, self.__pending = self.__pending, []
+
+        with self.__io_lock:
+            if self.__file.closed:
+                return
+            if rows:
+                self.__rows_written += self._write_rows(rows)
+            self.__file.flush()
+
+    def close(self) -> None:
+        """Flush remaining rows, stop the flush thread and close the file."""
+        with self.__buffer_lock:
+            if self.__closed:
+                return
+            self.__closed = True
+
+        self.__wake.set()
+        self.__thread.join()
+
+        self.flush()
+        with self.__io_lock:
+            self.__file.close()
+
+        if self.__metadata:
+            self.__write_metadata()
+
+    def _open(self, path: str, fieldnames: Sequence[str]) -> IO:
+        """Create the file and write its header; subclasses override for other formats."""
+        file = open(path, 'w', newline='')
+        if self.__header_size:
+            file.write(encode_comments({}, self.__header_size).decode('utf-8'))
+        self.__writer = csv.writer(file)
+        self.__writer.writerow(fieldnames)
+        return file
+
+    def _write_rows(self, rows: list) -> int:
+        """Write a batch of buffered items to the open file; returns rows written."""
+        self.__writer.writerows(rows)
+        return len(rows)
+
+    def __write_metadata(self) -> None:
+        # fill the reserved header in place; only its bytes are touched
+        if self.__header_size:
+            try:
+                header = encode_comments(self.__metadata, self.__header_size)
+            except ValueError:
+                pass
+            else:
+                with open(self.__path, 'r+b') as file:
+                    file.write(header)
+                return
+
+        with open(self.__path + METADATA_EXT, 'wb') as file:
+            file.write(encode_comments(self.__metadata))
+
+    def __flush_loop(self) -> None:
+        while not self.__closed:
+            self.__wake.wait(self.__flush_interval)
+            self.__wake.clear()
+            self.flush()
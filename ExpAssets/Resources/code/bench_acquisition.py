@@ -0,0 +1,346 @@
+"""
+Benchmarks for the acquisition and query hot paths.
+
+Run under pytest to check each path against its regression threshold:
+
+    python -m pytest -q --import-mode=importlib bench_acquisition.py
+
+or as a script to print the measurements:
+
+    python bench_acquisition.py
+
+Rate floors sit roughly an order of magnitude below a development machine, so
+they only trip on real regressions. Query latency is checked as a ratio between
+a long and a short trial file, which does not depend on machine speed and
+catches queries that grow with file size.
+
+The marker listeners mirror those the experiment registers on the NatNet client
+(collect marker sets, queue the frame on its suffix), as experiment.py cannot
+be imported outside klibs.
+"""
+
+import os
+import tempfile
+from time import perf_counter
+from typing import Callable
+
+import numpy as np
+import pytest
+
+from FrameBuffer import FrameBuffer
+from FrameQueue import FrameQueue
+from FrameStore import FrameStore
+from MotiveStreamParser import MotiveStreamParser
+from natnetclient_rough import NatNetClient
+from NatNetReplayServer import encode_frame, synthetic_frames
+from OptiRecording import BinaryTrialWriter
+from OptiTracker import OptiTracker
+from TrialWriter import TrialWriter
+
+
+MARKER_COUNTS = (10, 50, 200)
+# frames in the short and long trial files used for query scaling
+SHORT_TRIAL = 1_000
+LONG_TRIAL = 10_000
+# trial recording formats queries are served from
+FORMATS = ('csv', 'binary', 'sqlite')
+EXTENSIONS = {'csv': 'txt', 'binary': 'bin', 'sqlite': 'db'}
+
+# minimum rates per second
+MIN_RATES = {
+    'decode_numpy': 5_000,  # marker sets of 10 markers
+    'decode_construct': 400,
+    'process_message': 2_000,  # single-set frames of 10 markers, numpy decoder
+    'listener_put': 1_000,  # two-set frames through the experiment's listeners
+    'queue_put': 20_000,
+    'buffer_write': 20_000,
+    'ingest': 1_000,
+    'store_write': 1_000,
+}
+# a query on the long trial file may take at most this multiple of the short one
+MAX_SCALING = 3.0
+
+
+def measure(fn: Callable[[], object], min_time: float = 0.02, rounds: int = 5) -> float:
+    """
+    Time a call, best of several rounds.
+
+    Args:
+        fn (Callable): Function to call with no arguments
+        min_time (float, optional): Minimum seconds per round. Defaults to 0.02.
+        rounds (int, optional): Rounds to take the best of. Defaults to 5.
+
+    Returns:
+        float: Seconds per call in the fastest round
+    """
+    calls = 1
+    while True:
+        start = perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    best = elapsed / calls
+    for _ in range(rounds - 1):
+        start = perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (perf_counter() - start) / calls)
+
+    return best
+
+
+def marker_set_payload(marker_count: int, label: str = 'Hand') -> bytes:
+    """Encode one marker set as it appears inside a frame packet."""
+    positions = np.random.default_rng(0).random((marker_count, 3), dtype=np.float32)
+    return (
+        label.encode('utf-8')
+        + b'\0'
+        + np.uint32(marker_count).tobytes()
+        + positions.astype('<f4').tobytes()
+    )
+
+
+def frame_packets(marker_count: int, frame_count: int = 256, sets: int = 1) -> list[bytes]:
+    """Encode a synthetic reach as NAT_FRAMEOFDATA packets, with sets marker sets per frame."""
+    return [
+        encode_frame(
+            frame_number,
+            [(f'Hand{i}', positions) for i in range(sets)],
+            timestamp=frame_number / 120,
+        )
+        for frame_number, positions in synthetic_frames(marker_count, frame_count, seed=0)
+    ]
+
+
+def write_trial_file(path: str, frame_count: int, marker_count: int = 10, fmt: str = 'csv') -> str:
+    """Write a synthetic trial with the writers the experiment records with."""
+    if fmt == 'sqlite':
+        with FrameStore(path) as store:
+            # an earlier trial in the session, which queries must skip over
+            for trial in ('T0', 'T1'):
+                store.begin_trial(trial)
+                for frame_number, positions in synthetic_frames(marker_count, frame_count, seed=0):
+                    store.write_frame(frame_number, positions, frame_number / 120)
+        return path
+
+    if fmt == 'binary':
+        writer = BinaryTrialWriter(path)
+    else:
+        writer = TrialWriter(path, ['pos_x', 'pos_y', 'pos_z', 'frame_number'])
+
+    with writer:
+        for frame_number, positions in synthetic_frames(marker_count, frame_count, seed=0):
+            writer.write_frame(frame_number, positions, frame_number / 120)
+
+    return path
+
+
+class HandListeners(object):
+    """The experiment's marker listeners: collect a frame's marker sets, queue it on its suffix."""
+
+    def __init__(self, queue: FrameQueue):
+        self.queue = queue
+        self.__markers = []
+
+    def marker_set(self, marker_set: dict) -> None:
+        if len(marker_set['markers']):
+            self.__markers.append(marker_set['markers'])
+
+    def frame_end(self, suffix: dict) -> None:
+        markers, self.__markers = self.__markers, []
+        if markers:
+            self.queue.put(
+                suffix['frame_number'],
+                markers[0] if len(markers) == 1 else np.concatenate(markers),
+                suffix['timestamp'],
+            )
+
+
+def client_for(decoder: str = 'numpy') -> NatNetClient:
+    """A client decoding NatNet 4.1 frames, without sockets."""
+    return NatNetClient({'decoder': decoder, 'nat_net_requested_version': [4, 1, 0, 0]})
+
+
+def cycle(fn: Callable, items: list) -> Callable[[], object]:
+    """Call fn on each item in turn, one item per call."""
+    state = {'i': 0}
+
+    def call():
+        i = state['i']
+        state['i'] = (i + 1) % len(items)
+        return fn(items[i])
+
+    return call
+
+
+# Benchmarks #
+# # # # # # #
+
+
+def bench_decode(decoder: str, marker_count: int) -> float:
+    """Marker sets decoded per second."""
+    payload = marker_set_payload(marker_count)
+
+    def decode():
+        parser = MotiveStreamParser(payload, decoder=decoder)
+        parser.parse('label')
+        parser.parse_array('unlabeled_marker', parser.parse('count'))
+
+    return 1 / measure(decode)
+
+
+def bench_process_message(marker_count: int, sets: int = 1, listeners: bool = False) -> float:
+    """Frame packets processed per second, optionally through the experiment's listeners."""
+    client = client_for()
+    if listeners:
+        hands = HandListeners(FrameQueue(marker_count * sets, capacity=64))
+        client.markers_listener = hands.marker_set
+        client.suffix_listener = hands.frame_end
+        # keep the queue from filling: this measures the producer side only
+        client.prefix_listener = lambda _: hands.queue.clear()
+    else:
+        client.markers_listener = lambda _: None
+
+    return 1 / measure(cycle(client.process_message, frame_packets(marker_count, sets=sets)))
+
+
+def bench_writes(marker_count: int) -> dict:
+    """Frames per second written to each frame store, and ingested by OptiTracker."""
+    frames = [
+        (frame_number, positions, frame_number / 120)
+        for frame_number, positions in synthetic_frames(marker_count, 256, seed=0)
+    ]
+
+    queue = FrameQueue(marker_count, capacity=len(frames))
+    buffer = FrameBuffer(marker_count, capacity=len(frames))
+    tracker = OptiTracker(marker_count=marker_count)
+
+    def put(frame):
+        if len(queue) == queue.capacity:
+            queue.clear()
+        queue.put(*frame)
+
+    # frame numbers must keep advancing for ingest to do its work
+    offset = {'frames': 0}
+
+    def ingest(frame):
+        if frame[0] == 1:
+            offset['frames'] += len(frames)
+        tracker.ingest(frame[0] + offset['frames'], frame[1])
+
+    with tempfile.TemporaryDirectory() as directory:
+        with FrameStore(os.path.join(directory, 'frames.db')) as store:
+            store.begin_trial('T1')
+            return {
+                'queue_put': 1 / measure(cycle(put, frames)),
+                'buffer_write': 1 / measure(cycle(lambda frame: buffer.write(frame[0], frame[1]), frames)),
+                'ingest': 1 / measure(cycle(ingest, frames)),
+                'store_write': 1 / measure(cycle(lambda frame: store.write_frame(*frame), frames)),
+            }
+
+
+def bench_queries(path: str) -> dict:
+    """Seconds per file- or database-backed position, velocity and distance query."""
+    if path.endswith('.db'):
+        tracker = OptiTracker(marker_count=10, db_name=path)
+    else:
+        tracker = OptiTracker(marker_count=10, data_dir=path)
+    return {
+        'position': measure(tracker.position, rounds=3),
+        'velocity': measure(tracker.velocity, rounds=3),
+        'distance': measure(tracker.distance, rounds=3),
+    }
+
+
+# Regression checks #
+# # # # # # # # # # #
+
+
+@pytest.fixture(scope='module')
+def trial_files():
+    with tempfile.TemporaryDirectory() as directory:
+        files = {}
+        for fmt in FORMATS:
+            for frame_count in (SHORT_TRIAL, LONG_TRIAL):
+                path = os.path.join(directory, f'{frame_count}.{EXTENSIONS[fmt]}')
+                files[fmt, frame_count] = write_trial_file(path, frame_count, fmt=fmt)
+        yield files
+
+
+@pytest.mark.parametrize('marker_count', MARKER_COUNTS)
+@pytest.mark.parametrize('decoder', MotiveStreamParser.DECODERS)
+def test_decode_throughput(decoder, marker_count):
+    rate = bench_decode(decoder, marker_count)
+    # marker arrays decode in one step with numpy, per marker with construct
+    scale = 1 if decoder == 'numpy' else 10 / marker_count
+    assert rate >= MIN_RATES[f'decode_{decoder}'] * scale
+
+
+def test_decode_is_flat_in_marker_count():
+    # a whole marker set is one np.frombuffer; 20x the markers must not cost 20x
+    assert bench_decode('numpy', 10) / bench_decode('numpy', 200) < MAX_SCALING
+
+
+def test_process_message_throughput():
+    assert bench_process_message(10) >= MIN_RATES['process_message']
+
+
+def test_listener_throughput():
+    assert bench_process_message(10, sets=2, listeners=True) >= MIN_RATES['listener_put']
+
+
+@pytest.mark.parametrize('key', ['queue_put', 'buffer_write', 'ingest', 'store_write'])
+def test_write_throughput(key):
+    assert bench_writes(10)[key] >= MIN_RATES[key]
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_query_latency_is_independent_of_file_length(trial_files, fmt):
+    short = bench_queries(trial_files[fmt, SHORT_TRIAL])
+    long = bench_queries(trial_files[fmt, LONG_TRIAL])
+
+    for query in short:
+        assert long[query] / short[query] < MAX_SCALING, query
+
+
+def main() -> None:
+    print('Marker sets decoded per second')
+    for decoder in MotiveStreamParser.DECODERS:
+        for marker_count in MARKER_COUNTS:
+            print(f'  {decoder:>9} {marker_count:>4} markers: {bench_decode(decoder, marker_count):>12,.0f}')
+
+    print('Frame packets processed per second')
+    for marker_count in MARKER_COUNTS:
+        print(f'  {marker_count:>4} markers: {bench_process_message(marker_count):>12,.0f}')
+        print(
+            f'  {marker_count:>4} markers, 2 sets, listeners: '
+            f'{bench_process_message(marker_count, sets=2, listeners=True):>12,.0f}'
+        )
+
+    print('Frames written per second')
+    for marker_count in MARKER_COUNTS:
+        for key, rate in bench_writes(marker_count).items():
+            print(f'  {key:>12} {marker_count:>4} markers: {rate:>12,.0f}')
+
+    print('Query latency (ms) by trial length')
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in FORMATS:
+            for frame_count in (SHORT_TRIAL, LONG_TRIAL):
+                path = write_trial_file(
+                    os.path.join(directory, f'{frame_count}.{EXTENSIONS[fmt]}'),
+                    frame_count,
+                    fmt=fmt,
+                )
+                latency = bench_queries(path)
+                print(
+                    f'  {fmt:>6} {frame_count:>6} frames: '
+                    + ', '.join(f'{query} {seconds * 1000:.3f}' for query, seconds in latency.items())
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,18 @@
 # type: ignore
-from construct import this, Float32l, Int16sl, Struct, Computed, Int32ul
+import numpy as np
+from construct import Float32l, Int16sl, Struct, Computed, Int32ul
 
 
-def decodeMarkerID(obj, _):
-    return obj.encoded_id & 0x0000FFFF
+def decodeMarkerID(ctx):
+    return ctx.id & 0x0000FFFF
 
 
-def decodeModelID(obj, _):
-    return obj.encoded_id >> 16
+def decodeModelID(ctx):
+    return ctx.id >> 16
 
 
-def trackingValid(obj, _):
-    return (obj.error & 0x01) != 0
+def trackingValid(ctx):
+    return (ctx.tracking & 0x01) != 0
 
 
 unlabeledMarkerStruct = Struct(
@@ -22,8 +23,8 @@ unlabeledMarkerStruct = Struct(
 
 labeledMarkerStruct = Struct(
     "id" / Int32ul,
-    "marker_id" / Computed(this.id * decodeMarkerID),
-    "model_id" / Computed(this.id * decodeModelID),
+    "marker_id" / Computed(decodeMarkerID),
+    "model_id" / Computed(decodeModelID),
     "pos_x" / Float32l,
     "pos_y" / Float32l,
     "pos_z" / Float32l,
@@ -44,5 +45,39 @@ rigidBodyStruct = Struct(
     "rot_z" / Float32l,
     "error" / Float32l,
     "tracking" / Int16sl,
-    "is_valid" / Computed(lambda ctx: (ctx.tracking & 0x01) != 0),
+    "is_valid" / Computed(trackingValid),
+)
+
+
+# Packed little-endian record layouts mirroring the Structs above, for decoding
+# whole asset arrays in one np.frombuffer call.
+unlabeledMarkerDtype = np.dtype(
+    [("pos_x", "<f4"), ("pos_y", "<f4"), ("pos_z", "<f4")]
+)
+
+labeledMarkerDtype = np.dtype(
+    [
+        ("id", "<u4"),
+        ("pos_x", "<f4"),
+        ("pos_y", "<f4"),
+        ("pos_z", "<f4"),
+        ("size", "<f4"),
+        ("param", "<i2"),
+        ("residual", "<f4"),
+    ]
+)
+
+rigidBodyDtype = np.dtype(
+    [
+        ("id", "<u4"),
+        ("pos_x", "<f4"),
+        ("pos_y", "<f4"),
+        ("pos_z", "<f4"),
+        ("rot_w", "<f4"),
+        ("rot_x", "<f4"),
+        ("rot_y", "<f4"),
+        ("rot_z", "<f4"),
+        ("error", "<f4"),
+        ("tracking", "<i2"),
+    ]
 )
@@ -3,6 +3,29 @@ from ctypes import c_int, byref
 import sdl2
 
 
+def get_scancode(name):
+    """Looks up the SDL scancode for a key name.
+
+    Resolving the scancode once and passing it to get_key_state avoids a name
+    lookup on every check, e.g., when a key is sampled in a loop.
+
+    Args:
+        name (str): The name of the key, e.g. 'space'.
+
+    Returns:
+        int: The SDL scancode of the key.
+
+    Raises:
+        ValueError: If the name does not correspond to an SDL scancode.
+
+    """
+    scancode = sdl2.SDL_GetScancodeFromName(name.encode('utf-8'))
+    if scancode == sdl2.SDL_SCANCODE_UNKNOWN:
+        e = "'{0}' is not a valid name for an SDL scancode."
+        raise ValueError(e.format(name))
+    return scancode
+
+
 def get_key_state(key):
     """Checks the current state (pressed or released) of a given keyboard key.
 
@@ -21,10 +44,7 @@ def get_key_state(key):
     """
     # If key given as string, get the corresponding scancode
     if isinstance(key, str):
-        scancode = sdl2.SDL_GetScancodeFromName(key.encode('utf-8'))
-        if scancode == sdl2.SDL_SCANCODE_UNKNOWN:
-            e = "'{0}' is not a valid name for an SDL scancode."
-            raise ValueError(e.format(key))
+        scancode = get_scancode(key)
     else:
         scancode = key
     # Check for and return the current key state
@@ -26,6 +26,7 @@ from typing import Any, Callable, List, Tuple, Union
 # quit()
 
 from MotiveStreamParser import MotiveStreamParser
+from StreamTelemetry import StreamTelemetry
 
 def trace(*args):
     # uncomment the one you want to use
@@ -47,6 +48,27 @@ def trace_mf(*args):
     # print(''.join(map(str, args)))
 
 
+# Fields of a decoded frame that come from the frame suffix
+FRAME_SUFFIX_KEYS = (
+    "frame_number",
+    "timecode",
+    "timecode_sub",
+    "timestamp",
+    "stamp_camera_mid_exposure",
+    "stamp_data_received",
+    "stamp_transmit",
+    "precision_timestamp",
+    "is_recording",
+    "tracked_models_changed",
+)
+
+# 64k receive buffer, allocated once per receive thread
+RECV_BUFFER_SIZE = 64 * 1024
+
+# seconds a NAT_REQUEST_MODELDEF may go unanswered before it is sent again
+MODEL_DEF_TIMEOUT = 1.0
+
+
 def get_message_id(bytestream: bytes) -> int:
     message_id = int.from_bytes(bytestream[0:2], byteorder="little")
     return message_id
@@ -82,6 +104,13 @@ class NatNetClient:
             "is_locked": False,
             # Server has the ability to change bitstream version
             "can_change_bitstream_version": False,
+            # Frame decoder passed to MotiveStreamParser: "construct" or "numpy".
+            # With "numpy", marker sets carry an (N, 3) float32 array of positions
+            # instead of a list of per-marker dicts.
+            "decoder": "construct",
+            # Labels of the marker sets to decode; others are skipped unread.
+            # None decodes every marker set.
+            "marker_set_labels": None,
         }
 
         self.settings.update(instance_settings)
@@ -98,9 +127,19 @@ class NatNetClient:
         self.force_plates_listener = None
         self.devices_listener = None
         self.suffix_listener = None
+        # receives each fully decoded frame as a dict; decodes every block when set
+        self.frame_listener = None
 
         self.description_listener = None
 
+        # label -> (index, marker count) for marker sets in the last NAT_MODELDEF
+        self.marker_set_index = {}
+        # per marker set, in frame order: (label, encoded label, subscribed).
+        # None until described, or once frames stop matching the description.
+        self.__marker_set_routes = None
+        # perf_counter() time of the unanswered NAT_REQUEST_MODELDEF, if any
+        self.__model_def_requested_at = None
+
         self.command_thread = None
         self.data_thread = None
         self.command_socket = None
@@ -108,6 +147,11 @@ class NatNetClient:
 
         self.stop_threads = False
 
+        # packets received per message id (ids above NAT_UNRECOGNIZED_REQUEST are not counted)
+        self.message_counts = [0] * (self.NAT_UNRECOGNIZED_REQUEST + 1)
+        # frame gaps, inter-arrival jitter and decode times
+        self.telemetry = StreamTelemetry()
+
     # Constants corresponding to Client/server message ids
     NAT_CONNECT = 0
     NAT_SERVERINFO = 1
@@ -123,59 +167,360 @@ class NatNetClient:
     NAT_UNRECOGNIZED_REQUEST = 100
     NAT_UNDEFINED = 999999.9999
 
-    def __unpack_data(self, stream: bytes, stream_version: List[int] = []) -> int:
-        parser = MotiveStreamParser(stream)
-        prefix = parser.parse("frame_number")
+    # Data description types found in NAT_MODELDEF payloads
+    NAT_DESCRIPTOR_MARKER_SET = 0
 
-        n_marker_sets = parser.parse("count")
-        _ = parser.parse("size")
+    # Functions for unpacking frame data, called by __unpack_data #
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-        # TODO: Pointer() might aide skipping
-        for _ in range(0, n_marker_sets):
-            set_label = parser.parse("label")
+    def __stream_version(self, stream_version: List[int]) -> Tuple[int, int]:
+        version = stream_version or self.settings["nat_net_requested_version"]
+        if list(version[:2]) == [0, 0]:
+            # not yet reported by the server; NAT_CONNECT asks for 4.1
+            return 4, 1
+        return int(version[0]), int(version[1])
 
-            marker_set = {"label": set_label, "markers": []}
+    def __unpack_block(
+        self,
+        parser: MotiveStreamParser,
+        has_size: bool,
+        wanted: bool,
+        unpack: Callable[[int], Any],
+        asset_type: str = "",
+    ) -> Any:
+        # Each asset block is a count, a byte size (NatNet 4.1+), then the assets.
+        # Unwanted blocks are skipped by size, or by count for fixed-width assets.
+        count = parser.parse("count")
+        size = parser.parse("size") if has_size else None
+
+        if not wanted:
+            if size is not None:
+                parser.seek(size)
+                return None
+            if asset_type:
+                parser.seek(parser.sizeof(asset_type, count))
+                return None
+
+        return unpack(count)
+
+    def __unpack_marker_sets(
+        self, parser: MotiveStreamParser, frame_number: int, count: int
+    ) -> List[dict]:
+        # With a cached model definition, sets are routed by position: each
+        # label is compared bytewise against the cached one instead of decoded.
+        # Any mismatch drops the cache until the next NAT_MODELDEF.
+        routes = self.__marker_set_routes
+        if routes is not None and len(routes) != count:
+            routes = self.__marker_set_routes = None
+
+        labels = self.settings["marker_set_labels"]
+
+        marker_sets = []
+        for index in range(count):
+            if routes is not None and parser.match(routes[index][1]):
+                set_label, _, wanted = routes[index]
+            else:
+                routes = self.__marker_set_routes = None
+                set_label = parser.parse("label")
+                wanted = labels is None or set_label in labels
 
             n_markers_in_set = parser.parse("count")
 
-            for _ in range(n_markers_in_set):
-                marker = parser.parse("unlabeled_marker")
-                marker["frame_number"] = prefix
-                marker_set["markers"].append(marker)
-
-            self.markers_listener(marker_set)
-
-        # n_legacy_markers = parser.parse("count")
-        # _ = parser.parse("size")
-        #
-        # legacy_markers = []
-        # for _ in range(n_legacy_markers):
-        #     legacy_marker = parser.parse("legacy_marker")
-        #     legacy_marker["frame"] = prefix["frame"]
-        #     legacy_markers.append(legacy_marker)
-        #
-        # self.legacy_markers_listener(legacy_markers)
-        #
-        # n_rigid_bodies = parser.parse("count")
-        # _ = parser.parse("size")
-        #
-        # rigid_bodies = []
-        # for _ in range(n_rigid_bodies):
-        #     rigid_body = parser.parse("rigid_body")
-        #     rigid_body["frame"] = prefix["frame"]
-        #     rigid_bodies.append(rigid_body)
-        #
-        # self.rigid_bodies_listener(rigid_bodies)
+            if not wanted:
+                parser.seek(parser.sizeof("unlabeled_marker", n_markers_in_set))
+                continue
+
+            marker_set = {
+                "label": set_label,
+                "index": index,
+                "frame_number": frame_number,
+                "markers": [],
+            }
+
+            if parser.decoder == "numpy":
+                marker_set["markers"] = parser.parse_array(
+                    "unlabeled_marker", n_markers_in_set
+                )
+            else:
+                for _ in range(n_markers_in_set):
+                    marker = parser.parse("unlabeled_marker")
+                    marker["frame_number"] = frame_number
+                    marker_set["markers"].append(marker)
+
+            marker_sets.append(marker_set)
+        return marker_sets
+
+    def __unpack_skeletons(self, parser: MotiveStreamParser, count: int) -> List[dict]:
+        skeletons = []
+        for _ in range(count):
+            skeleton_id = parser.parse("id")
+            n_bodies = parser.parse("count")
+            skeletons.append(
+                {"id": skeleton_id, "rigid_bodies": parser.parse_array("rigid_body", n_bodies)}
+            )
+        return skeletons
+
+    def __unpack_assets(self, parser: MotiveStreamParser, count: int) -> List[dict]:
+        # asset rigid bodies and markers share the layouts of their standalone counterparts
+        assets = []
+        for _ in range(count):
+            asset = {"id": parser.parse("id")}
+            asset["rigid_bodies"] = parser.parse_array("rigid_body", parser.parse("count"))
+            asset["markers"] = parser.parse_array("labeled_marker", parser.parse("count"))
+            assets.append(asset)
+        return assets
+
+    def __unpack_channels(self, parser: MotiveStreamParser, count: int) -> List[dict]:
+        # force plates and devices: per item, per channel, a run of float samples
+        items = []
+        for _ in range(count):
+            item_id = parser.parse("id")
+            n_channels = parser.parse("count")
+            channels = [
+                parser.parse_array("float", parser.parse("count"))
+                for _ in range(n_channels)
+            ]
+            items.append({"id": item_id, "channels": channels})
+        return items
+
+    def __unpack_suffix(
+        self, parser: MotiveStreamParser, major: int, minor: int
+    ) -> dict:
+        suffix = {
+            "timecode": parser.parse("uint32"),
+            "timecode_sub": parser.parse("uint32"),
+            "timestamp": parser.parse("double"),
+        }
+
+        if major >= 3:
+            suffix["stamp_camera_mid_exposure"] = parser.parse("uint64")
+            suffix["stamp_data_received"] = parser.parse("uint64")
+            suffix["stamp_transmit"] = parser.parse("uint64")
+
+        if major > 4 or (major == 4 and minor > 0):
+            seconds = parser.parse("uint32")
+            fraction = parser.parse("uint32")
+            suffix["precision_timestamp"] = seconds + fraction / 2**32
+
+        param = parser.parse("int16")
+        suffix["is_recording"] = (param & 0x01) != 0
+        suffix["tracked_models_changed"] = (param & 0x02) != 0
+
+        return suffix
+
+    def __unpack_data(self, stream: bytes, stream_version: List[int] = []) -> int:
+        """Decode a NAT_FRAMEOFDATA payload (NatNet 3.0+), then notify listeners.
+
+        Blocks nobody listens to are skipped rather than decoded. Listeners are
+        called once the whole frame, including its timestamp, has been read.
+        """
+        received = time.perf_counter()
+        major, minor = self.__stream_version(stream_version)
+        has_size = major > 4 or (major == 4 and minor > 0)
+
+        parser = MotiveStreamParser(stream, decoder=self.settings["decoder"])
+        frame_number = parser.parse("frame_number")
+        frame = {"frame_number": frame_number}
+
+        frame["marker_sets"] = self.__unpack_block(
+            parser,
+            has_size,
+            self.markers_listener is not None or self.frame_listener is not None,
+            lambda n: self.__unpack_marker_sets(parser, frame_number, n),
+        )
+
+        if major < 3:
+            # older layouts are not decoded beyond marker sets
+            self.telemetry.record_frame(
+                frame_number, received, time.perf_counter() - received
+            )
+            self.__dispatch_frame(frame)
+            return parser.tell()
+
+        # (frame key, listeners that need it, fixed-width asset type, decoder)
+        blocks = [
+            (
+                "legacy_markers",
+                [self.legacy_markers_listener],
+                "legacy_marker",
+                lambda n: parser.parse_array("legacy_marker", n),
+            ),
+            (
+                "rigid_bodies",
+                [self.rigid_bodies_listener],
+                "rigid_body",
+                lambda n: parser.parse_array("rigid_body", n),
+            ),
+            (
+                "skeletons",
+                [self.skeletons_listener],
+                "",
+                lambda n: self.__unpack_skeletons(parser, n),
+            ),
+        ]
+        if has_size:
+            blocks.append(
+                (
+                    "assets",
+                    [self.asset_rigid_bodies_listener, self.asset_markers_listener],
+                    "",
+                    lambda n: self.__unpack_assets(parser, n),
+                )
+            )
+        blocks += [
+            (
+                "labeled_markers",
+                [self.labeled_markers_listener],
+                "labeled_marker",
+                lambda n: parser.parse_array("labeled_marker", n),
+            ),
+            (
+                "force_plates",
+                [self.force_plates_listener],
+                "",
+                lambda n: self.__unpack_channels(parser, n),
+            ),
+            (
+                "devices",
+                [self.devices_listener],
+                "",
+                lambda n: self.__unpack_channels(parser, n),
+            ),
+        ]
+
+        for key, listeners, asset_type, unpack in blocks:
+            wanted = self.frame_listener is not None or any(
+                listener is not None for listener in listeners
+            )
+            frame[key] = self.__unpack_block(
+                parser, has_size, wanted, unpack, asset_type
+            )
+
+        frame.update(self.__unpack_suffix(parser, major, minor))
+        self.telemetry.record_frame(frame_number, received, time.perf_counter() - received)
 
+        if frame["tracked_models_changed"]:
+            # the scene changed in Motive; re-route by label until it is described again
+            self.__marker_set_routes = None
+            if self.__model_def_requested_at is None:
+                self.request_model_definitions()
+
+        self.__dispatch_frame(frame)
         return parser.tell()
 
+    def __dispatch_frame(self, frame: dict) -> None:
+        frame_number = frame["frame_number"]
+        timestamp = frame.get("timestamp")
+
+        if self.prefix_listener is not None:
+            self.prefix_listener(frame_number)
+
+        if self.markers_listener is not None:
+            for marker_set in frame.get("marker_sets") or []:
+                marker_set["timestamp"] = timestamp
+                self.markers_listener(marker_set)
+
+        # (frame key, payload field, listener)
+        blocks = [
+            ("legacy_markers", "markers", self.legacy_markers_listener),
+            ("rigid_bodies", "rigid_bodies", self.rigid_bodies_listener),
+            ("skeletons", "skeletons", self.skeletons_listener),
+            ("labeled_markers", "markers", self.labeled_markers_listener),
+            ("force_plates", "force_plates", self.force_plates_listener),
+            ("devices", "devices", self.devices_listener),
+        ]
+        for key, field, listener in blocks:
+            if listener is not None and frame.get(key) is not None:
+                listener(
+                    {
+                        "frame_number": frame_number,
+                        "timestamp": timestamp,
+                        field: frame[key],
+                    }
+                )
+
+        for asset in frame.get("assets") or []:
+            for field, listener in (
+                ("rigid_bodies", self.asset_rigid_bodies_listener),
+                ("markers", self.asset_markers_listener),
+            ):
+                if listener is not None:
+                    listener(
+                        {
+                            "frame_number": frame_number,
+                            "timestamp": timestamp,
+                            "asset_id": asset["id"],
+                            field: asset[field],
+                        }
+                    )
+
+        # called for every frame, as listeners use it to close the frame; older
+        # layouts carry no suffix, so their frames end with no timestamp
+        if self.suffix_listener is not None:
+            suffix = {key: value for key, value in frame.items() if key in FRAME_SUFFIX_KEYS}
+            suffix.setdefault("timestamp", None)
+            self.suffix_listener(suffix)
+
+        if self.frame_listener is not None:
+            self.frame_listener(frame)
+
     # Functions for unpacking descriptions, called by __unpack_descriptions #
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
     def __unpack_descriptions(
         self, bytestream: bytes, stream_version: List[int] = None
     ) -> int:
-        pass
+        """Decode a NAT_MODELDEF payload and cache the marker set layout.
+
+        Only marker set descriptions are decoded. On NatNet 4.1+ the others are
+        skipped by their size; older streams carry no sizes, so decoding stops at
+        the first description of another type (Motive sends marker sets first).
+        """
+        major, minor = self.__stream_version(stream_version)
+        has_size = major > 4 or (major == 4 and minor > 0)
+
+        parser = MotiveStreamParser(bytestream, decoder="numpy")
+
+        marker_sets = []
+        for _ in range(parser.parse("count")):
+            data_type = parser.parse("uint32")
+            size = parser.parse("size") if has_size else None
+            start = parser.tell()
+
+            if data_type == self.NAT_DESCRIPTOR_MARKER_SET:
+                label = parser.parse("label")
+                markers = [parser.parse("label") for _ in range(parser.parse("count"))]
+                marker_sets.append({"label": label, "markers": markers})
+            elif size is None:
+                trace_dd(f"Stopping at undecoded description type {data_type}")
+                break
+
+            if size is not None:
+                parser.seek(start + size - parser.tell())
+
+        self.__set_marker_set_layout(marker_sets)
+
+        if self.description_listener is not None:
+            self.description_listener({"marker_sets": marker_sets})
+
+        return parser.tell()
+
+    def __set_marker_set_layout(self, marker_sets: List[dict]) -> None:
+        labels = self.settings["marker_set_labels"]
+
+        self.marker_set_index = {
+            marker_set["label"]: (index, len(marker_set["markers"]))
+            for index, marker_set in enumerate(marker_sets)
+        }
+        self.__marker_set_routes = [
+            (
+                marker_set["label"],
+                marker_set["label"].encode("utf-8") + b"\0",
+                labels is None or marker_set["label"] in labels,
+            )
+            for marker_set in marker_sets
+        ]
+        self.__model_def_requested_at = None
 
     # Private Utility functions #
     # # # # # # # # # # # # # # #
@@ -196,9 +541,7 @@ class NatNetClient:
             else:
                 message, _, _ = bytes(bytestream[offset:]).partition(b"\0")
                 if message.decode("utf-8").startswith("Bitstream"):
-                    nn_version = self.__unpack_bitstream_info(
-                        bytestream[offset:], packet_size
-                    )
+                    nn_version = self.__unpack_bitstream_info(message)
                     # Update the server version
                     self.settings["nat_net_stream_version_server"] = [
                         int(v) for v in nn_version
@@ -341,48 +684,35 @@ class NatNetClient:
         return nn_version
 
     def __command_thread_function(
-        self, in_socket: socket.socket, stop: Callable, gprint_level: int
+        self, in_socket: socket.socket, stop: Callable, gprint_level: Callable
     ) -> int:
-        message_id_dict = {}
         if not self.settings["use_multicast"]:
             in_socket.settimeout(2.0)
 
-        # 64k buffer size
-        recv_buffer_size = 64 * 1024
+        # reused for every packet; see __data_thread_function
+        buffer = bytearray(RECV_BUFFER_SIZE)
+        view = memoryview(buffer)
+
         while not stop():
             # Block for input
             try:
-                bytestream, _ = in_socket.recvfrom(recv_buffer_size)
-            except (
-                socket.error,
-                socket.herror,
-                socket.gaierror,
-                socket.timeout,
-            ) as e:
-                if (
-                    stop()
-                    or isinstance(e, socket.timeout)
-                    and self.settings["use_multicast"]
-                ):
+                nbytes, _ = in_socket.recvfrom_into(buffer)
+            except socket.timeout:
+                # a quiet spell (e.g., Motive paused between blocks) must not end
+                # the session: send the keep-alive below and wait again
+                nbytes = 0
+            except (socket.error, socket.herror, socket.gaierror) as e:
+                if not stop():
                     print(f"ERROR: command socket access error occurred:\n{e}")
-                if isinstance(e, socket.error):
                     print("shutting down")
                 return 1
 
-            if bytestream:
-                # peek ahead at message_id
-                message_id = get_message_id(bytestream)
-                tmp_str = f"mi_{message_id:.1f}"
-                message_id_dict[tmp_str] = message_id_dict.get(tmp_str, 0) + 1
-
-                print_level = gprint_level()
-                if message_id == self.NAT_FRAMEOFDATA and print_level > 0:
-                    print_level = (
-                        1 if message_id_dict[tmp_str] % print_level == 0 else 0
-                    )
+            if nbytes:
+                self.__count_message(view[:nbytes])
+                self.__process_message(view[:nbytes])
 
-                message_id = self.__process_message(bytestream)
-                bytestream = bytearray()
+            if not stop():
+                self.retry_model_definitions()
 
             if not self.settings["use_multicast"] and not stop():
                 self.send_keep_alive(
@@ -396,14 +726,19 @@ class NatNetClient:
     def __data_thread_function(
         self, in_socket: socket.socket, stop: Callable, gprint_level: Callable
     ) -> int:
-        message_id_dict = {}
-        # 64k buffer size
-        recv_buffer_size = 64 * 1024
+        # Packets are received into one preallocated buffer and handed down as
+        # memoryview slices, so nothing is copied until the parser decodes it.
+        # Listeners must therefore not hold on to views of the packet.
+        buffer = bytearray(RECV_BUFFER_SIZE)
+        view = memoryview(buffer)
+
+        # tracing bookkeeping is only wired in when requested at thread start
+        tracing = gprint_level() > 0
 
         while not stop():
             # Block for input
             try:
-                bytestream, _ = in_socket.recvfrom(recv_buffer_size)
+                nbytes, _ = in_socket.recvfrom_into(buffer)
             except (
                 socket.error,
                 socket.herror,
@@ -414,23 +749,25 @@ class NatNetClient:
                     print(f"ERROR: data socket access error occurred:\n{e}")
                 return 1
 
-            if bytestream:
-                # peek ahead at message_id
-                message_id = get_message_id(bytestream)
-                tmp_str = f"mi_{message_id:.1f}"
-                message_id_dict[tmp_str] = message_id_dict.get(tmp_str, 0) + 1
+            if nbytes:
+                packet = view[:nbytes]
+                message_id = self.__count_message(packet)
 
-                print_level = gprint_level()
-                if message_id == self.NAT_FRAMEOFDATA and print_level > 0:
-                    print_level = (
-                        1 if message_id_dict[tmp_str] % print_level == 0 else 0
-                    )
+                if tracing and message_id == self.NAT_FRAMEOFDATA:
+                    print_level = gprint_level()
+                    if self.message_counts[message_id] % max(print_level, 1) == 0:
+                        trace(f"Frame packets received: {self.message_counts[message_id]}")
 
-                message_id = self.__process_message(bytestream)
-                bytestream = bytearray()
+                self.__process_message(packet)
 
         return 0
 
+    def __count_message(self, bytestream: memoryview) -> int:
+        message_id = get_message_id(bytestream)
+        if message_id < len(self.message_counts):
+            self.message_counts[message_id] += 1
+        return message_id
+
     def __process_message(self, bytestream: bytes) -> int:
         message_id = get_message_id(bytestream)
         packet_size = int.from_bytes(bytestream[2:4], byteorder="little")
@@ -617,7 +954,7 @@ class NatNetClient:
         return_code = self.send_command(sz_command)
         time.sleep(0.5)
 
-    def startup(self) -> bool:
+    def create_sockets(self) -> bool:
         # Create the data socket
         self.data_socket = self.__create_data_socket(self.settings["data_port"])
         if self.data_socket is None:
@@ -630,6 +967,58 @@ class NatNetClient:
             print("Could not open command channel")
             return False
         self.settings["is_locked"] = True
+        return True
+
+    def send_connect(self) -> None:
+        # Required for setup
+        # Get NatNet and server versions
+        self.send_request(
+            self.command_socket,
+            self.NAT_CONNECT,
+            "",
+            (self.settings["server_ip"], self.settings["command_port"]),
+        )
+
+        ##Example Commands
+        ## Get NatNet and server versions
+        self.send_request(
+            self.command_socket,
+            self.NAT_REQUEST_FRAMEOFDATA,
+            "",
+            (self.settings["server_ip"], self.settings["command_port"]),
+        )
+        ## Request the model definitions
+        self.request_model_definitions()
+
+    def request_model_definitions(self) -> None:
+        """Ask the server for NAT_MODELDEF; the marker set layout is rebuilt on reply."""
+        if self.command_socket is None:
+            return
+
+        self.__model_def_requested_at = time.perf_counter()
+        self.send_request(
+            self.command_socket,
+            self.NAT_REQUEST_MODELDEF,
+            "",
+            (self.settings["server_ip"], self.settings["command_port"]),
+        )
+
+    def retry_model_definitions(self) -> None:
+        """Ask for NAT_MODELDEF again if the last request has gone unanswered for MODEL_DEF_TIMEOUT."""
+        requested_at = self.__model_def_requested_at
+        if requested_at is not None and time.perf_counter() - requested_at > MODEL_DEF_TIMEOUT:
+            # the request or its reply was lost; until one arrives, frames are
+            # routed by label, so keep asking
+            self.request_model_definitions()
+
+    def process_message(self, bytestream: bytes) -> int:
+        """Count and dispatch one received packet; returns its message id."""
+        self.__count_message(bytestream)
+        return self.__process_message(bytestream)
+
+    def startup(self) -> bool:
+        if not self.create_sockets():
+            return False
 
         self.stop_threads = False
         # Create a separate thread for receiving data packets
@@ -654,32 +1043,21 @@ class NatNetClient:
         )
         self.command_thread.start()
 
-        # Required for setup
-        # Get NatNet and server versions
-        self.send_request(
-            self.command_socket,
-            self.NAT_CONNECT,
-            "",
-            (self.settings["server_ip"], self.settings["command_port"]),
-        )
-
-        ##Example Commands
-        ## Get NatNet and server versions
-        self.send_request(
-            self.command_socket,
-            self.NAT_REQUEST_FRAMEOFDATA,
-            "",
-            (self.settings["server_ip"], self.settings["command_port"]),
-        )
-        ## Request the model definitions
-        # self.send_request(self.command_socket, self.NAT_REQUEST_MODELDEF, "",  (self.settings['server_ip'], self.settings['command_port']) )
+        self.send_connect()
         return True
 
     def shutdown(self) -> None:
         print("shutdown called")
         self.stop_threads = True
         # closing sockets causes blocking recvfrom to throw
-        # an exception and break the loop
+        # an exception and break the loop. On Linux close() alone does not wake
+        # a blocked recvfrom (e.g. the unicast data socket, which never receives),
+        # but shutdown() does, even though it reports the socket as unconnected.
+        for sock in (self.command_socket, self.data_socket):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
         self.command_socket.close()
         self.data_socket.close()
         # attempt to join the threads back.
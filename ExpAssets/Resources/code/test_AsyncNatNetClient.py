@@ -0,0 +1,103 @@
+import asyncio
+
+import numpy as np
+from AsyncNatNetClient import AsyncNatNetClient
+from NatNetReplayServer import NatNetReplayServer, synthetic_frames
+
+
+def client_for(server, **kwargs):
+    return AsyncNatNetClient(
+        {
+            "use_multicast": False,
+            "command_port": server.command_port,
+            "decoder": "numpy",
+        },
+        **kwargs,
+    )
+
+
+def test_delivers_whole_frames():
+    frames = list(synthetic_frames(marker_count=4, frame_count=60, seed=1))
+
+    async def receive(server):
+        received = []
+        async with client_for(server) as client:
+            async for frame in client.frames():
+                received.append(frame)
+                if frame["frame_number"] == 60:
+                    break
+        return client, received
+
+    with NatNetReplayServer(frames, rate=500, command_port=0) as server:
+        client, received = asyncio.run(asyncio.wait_for(receive(server), timeout=5))
+
+    assert client.connected()
+    assert [frame["frame_number"] for frame in received] == list(range(1, 61))
+    assert received[0]["timestamp"] == 0.0
+    assert all(len(frame["marker_sets"]) == 1 for frame in received)
+    np.testing.assert_allclose(received[-1]["marker_sets"][0]["markers"], frames[-1][1])
+
+
+def test_overflow_drops_oldest_whole_frames():
+    frames = synthetic_frames(marker_count=4, frame_count=40, seed=1)
+
+    async def receive(server):
+        async with client_for(server, max_queued_frames=5) as client:
+            # fall behind until the server has sent everything
+            while not server.done.is_set():
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+
+            received = []
+            async for frame in client.frames():
+                received.append(frame)
+                if frame["frame_number"] == 40:
+                    break
+        return client, received
+
+    with NatNetReplayServer(frames, rate=500, command_port=0) as server:
+        client, received = asyncio.run(asyncio.wait_for(receive(server), timeout=5))
+
+    assert [frame["frame_number"] for frame in received] == list(range(36, 41))
+    assert client.dropped_frames == 35
+    assert all(len(frame["marker_sets"][0]["markers"]) == 4 for frame in received)
+
+
+def test_close_ends_iteration():
+    frames = synthetic_frames(marker_count=4, frame_count=10_000, seed=1)
+
+    async def consume(server):
+        client = client_for(server)
+        assert await client.start()
+
+        async def count():
+            return sum([1 async for _ in client.frames()])
+
+        task = asyncio.create_task(count())
+        await asyncio.sleep(0.1)
+        client.close()
+        return await asyncio.wait_for(task, timeout=1)
+
+    with NatNetReplayServer(frames, rate=500, command_port=0) as server:
+        received = asyncio.run(consume(server))
+
+    assert 0 < received < 10_000
+
+
+def test_unanswered_model_def_request_is_sent_again():
+    frames = synthetic_frames(marker_count=4, frame_count=480, seed=1)
+
+    async def receive(server):
+        async with client_for(server, keep_alive_interval=0.25) as client:
+            async for frame in client.frames():
+                if frame["frame_number"] == 480:
+                    break
+            await asyncio.sleep(0.1)
+        return client
+
+    kwargs = {"rate": 240, "command_port": 0, "unanswered_model_defs": 1}
+    with NatNetReplayServer(frames, **kwargs) as server:
+        client = asyncio.run(asyncio.wait_for(receive(server), timeout=5))
+
+    assert server.model_def_requests == 2
+    assert client.marker_set_index == {"Hand": (0, 4)}
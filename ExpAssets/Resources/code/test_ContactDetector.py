@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from ContactDetector import ContactDetector
+
+
+@pytest.fixture
+def detector():
+    detector = ContactDetector()
+    # tracker units: streamed metres * 1000, regions on the x/z plane
+    detector.set_regions({'Target': ((100, 0), 40), 'Distractor': ((-100, 0), 40)})
+    return detector
+
+
+def frame(frame_number, x, z=0.0, markers=3):
+    positions = np.zeros((markers, 3))
+    positions[:, 0] = x / 1000
+    positions[:, 2] = z / 1000
+    # spread markers around the centroid
+    positions[:, 1] = np.arange(markers)
+    return frame_number, frame_number / 120, positions
+
+
+def test_reports_first_contact_in_batch(detector):
+    contact = detector.update([frame(1, 0), frame(2, 50), frame(3, 70), frame(4, 100)])
+
+    assert contact == {'label': 'Target', 'frame_number': 3, 'timestamp': 3 / 120}
+    # later frames do not move the contact
+    assert detector.update([frame(5, -100)]) is contact
+
+
+def test_no_contact_outside_regions(detector):
+    assert detector.update([frame(1, 0), frame(2, 0, z=100)]) is None
+    assert detector.update([]) is None
+    assert detector.contact is None
+
+
+def test_hidden_markers_are_ignored(detector):
+    hidden = frame(2, -100)
+    hidden[2][1:] = np.nan
+    hidden[2][0, 0] = 0
+
+    assert detector.update([frame(1, 0), hidden]) is None
+
+    detector.set_regions({'Target': ((0, 0), 10)})
+    assert detector.update([hidden])['frame_number'] == 2
+
+
+def test_min_markers():
+    detector = ContactDetector(min_markers=2)
+    detector.set_regions({'Target': ((0, 0), 10)})
+
+    assert detector.update([frame(1, 0, markers=1)]) is None
+    assert detector.update([frame(2, 0, markers=2)])['frame_number'] == 2
+
+
+def test_set_regions_resets_contact(detector):
+    detector.update([frame(1, 100)])
+    detector.set_regions({'Target': ((0, 0), 10)})
+
+    assert detector.contact is None
+    assert detector.labels == ['Target']
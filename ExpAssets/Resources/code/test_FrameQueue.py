@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+import pytest
+from FrameQueue import FrameQueue
+
+
+def test_drain_in_order():
+    queue = FrameQueue(marker_count=2, capacity=4)
+    queue.put(1, [[1, 2, 3]], 0.5)
+    queue.put(2, [[4, 5, 6], [7, 8, 9], [0, 0, 0]])
+
+    frames = queue.drain()
+
+    assert [(frame_number, timestamp) for frame_number, timestamp, _ in frames] == [(1, 0.5), (2, None)]
+    np.testing.assert_array_equal(frames[0][2], [[1, 2, 3]])
+    # markers beyond marker_count are dropped
+    assert frames[1][2].shape == (2, 3)
+    assert queue.drain() == []
+
+
+def test_drop_oldest_overflow():
+    queue = FrameQueue(marker_count=1, capacity=3)
+    for frame_number in range(5):
+        queue.put(frame_number, [[frame_number, 0, 0]])
+
+    assert [frame[0] for frame in queue.drain()] == [2, 3, 4]
+    assert queue.dropped == 2
+    assert queue.high_water == 3
+
+
+def test_block_refuses_when_full():
+    queue = FrameQueue(marker_count=1, capacity=2, policy='block', block_timeout=0)
+    assert queue.put(1, [[0, 0, 0]])
+    assert queue.put(2, [[0, 0, 0]])
+    assert not queue.put(3, [[0, 0, 0]])
+
+    assert [frame[0] for frame in queue.drain()] == [1, 2]
+    assert queue.dropped == 1
+    assert queue.put(4, [[0, 0, 0]])
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        FrameQueue(marker_count=1, policy='drop_newest')
+
+
+@pytest.mark.parametrize('policy', ['drop_oldest', 'block'])
+def test_concurrent_frames_are_intact(policy):
+    queue = FrameQueue(marker_count=2, capacity=8, policy=policy)
+    total = 2000
+
+    def produce():
+        for frame_number in range(total):
+            queue.put(frame_number, np.full((2, 3), frame_number), frame_number / 120)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+
+    frames = []
+    while producer.is_alive() or len(queue):
+        frames += queue.drain()
+    producer.join()
+
+    frame_numbers = [frame[0] for frame in frames]
+    assert frame_numbers == sorted(set(frame_numbers))
+    assert all((positions == frame_number).all() for frame_number, _, positions in frames)
+    assert len(frames) + queue.dropped == total
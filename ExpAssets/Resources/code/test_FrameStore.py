@@ -0,0 +1,82 @@
+import sqlite3
+
+import numpy as np
+import pytest
+from FrameStore import FrameStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FrameStore(str(tmp_path / "frames.db"), commit_frames=2)
+    yield store
+    store.close()
+
+
+def test_marker_sets_share_a_frame(store):
+    store.begin_trial("T1")
+    for frame_number in range(1, 6):
+        store.write_frame(frame_number, [[frame_number, 0.0, 0.0]], timestamp=frame_number / 120)
+        store.write_frame(frame_number, [[frame_number, 1.0, np.nan]])
+
+    rows = store.frames(num_frames=3)
+    assert rows["frame_number"].tolist() == [3, 3, 4, 4, 5, 5]
+    assert rows["pos_y"].tolist() == [0.0, 1.0] * 3
+    # hidden markers round-trip as NaN
+    assert np.isnan(rows["pos_z"][1::2]).all()
+    assert store.last_frame == 5
+
+
+def test_trials_are_kept_apart(store):
+    for trial, offset in [("T1", 0), ("T2", 100)]:
+        store.begin_trial(trial)
+        for frame_number in range(1, 4):
+            store.write_frame(frame_number, [[offset + frame_number, 0.0, 0.0]])
+
+    # the last trial written is queried once it ends
+    store.end_trial()
+    assert store.trial is None
+    assert store.frames(num_frames=1)["pos_x"].tolist() == [103]
+    assert store.frames(num_frames=1, trial="T1")["pos_x"].tolist() == [3]
+
+    # writes between trials are ignored
+    store.write_frame(4, [[0.0, 0.0, 0.0]])
+    assert store.last_frame == 3
+
+
+def test_metadata_and_discard(store):
+    store.begin_trial("T1")
+    store.write_frame(1, np.zeros((2, 3)))
+    store.set_metadata({"Block": 1})
+    store.end_trial()
+
+    store.begin_trial("T2")
+    store.write_frame(1, np.zeros((2, 3)))
+    store.end_trial(discard=True)
+
+    assert store.trials() == {"T1": {"Block": 1}}
+    assert store.frames(num_frames=5, trial="T2").size == 0
+
+    # starting a trial again replaces its frames
+    store.begin_trial("T1")
+    assert store.frames(num_frames=5).size == 0
+    assert store.trials() == {"T1": None}
+
+
+def test_readers_see_committed_frames(store):
+    reader = sqlite3.connect(store.path)
+    assert reader.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+    store.begin_trial("T1")
+    store.write_frame(1, np.zeros((3, 3)))
+    count = "SELECT COUNT(*) FROM frames"
+    assert reader.execute(count).fetchone() == (0,)
+
+    # committed every commit_frames frames
+    store.write_frame(2, np.zeros((3, 3)))
+    assert reader.execute(count).fetchone() == (6,)
+
+    plan = reader.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM frames WHERE trial = 'T1' AND frame_number > 1"
+    ).fetchall()
+    assert "frames_trial_frame" in str(plan)
+    reader.close()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from MocapProcess import SharedFrameRing
+from OptiTracker import OptiTracker
+
+
+@pytest.fixture
+def ring():
+    writer = SharedFrameRing(marker_count=3, capacity=4)
+    reader = SharedFrameRing.attach(writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+    writer.unlink()
+
+
+def test_reader_sees_published_frames(ring):
+    writer, reader = ring
+    for frame_number in range(1, 4):
+        writer.write(frame_number, np.full((2, 3), frame_number), frame_number / 120)
+
+    assert reader.read_only
+    assert reader.last_frame == 3
+    assert reader.frames(2)['frame_number'].tolist() == [2, 2, 3, 3]
+    assert [(frame_number, timestamp) for frame_number, timestamp, _ in reader.drain()] == [
+        (1, 1 / 120),
+        (2, 2 / 120),
+        (3, 3 / 120),
+    ]
+    assert reader.drain() == []
+
+
+def test_reader_counts_overwritten_frames(ring):
+    writer, reader = ring
+    for frame_number in range(10):
+        writer.write(frame_number, [[frame_number, 0, 0]])
+
+    assert [frame[0] for frame in reader.drain()] == [6, 7, 8, 9]
+    assert reader.dropped == 6
+
+
+def test_clear_is_local_to_the_reader(ring):
+    writer, reader = ring
+    writer.write(1, [[1, 2, 3]])
+    reader.clear()
+
+    assert len(reader) == 0
+    assert reader.last_frame == -1
+    assert len(writer) == 1
+
+
+def test_reader_is_read_only(ring):
+    _, reader = ring
+    with pytest.raises(PermissionError):
+        reader.write(1, [[0, 0, 0]])
+
+
+def test_tracker_reads_attached_ring(ring):
+    writer, reader = ring
+    tracker = OptiTracker(marker_count=3, frame_buffer=reader)
+
+    for frame_number in range(1, 5):
+        writer.write(frame_number, [[frame_number / 1000, 0, 0]])
+        # ingesting must leave the ring to its writer
+        tracker.ingest(frame_number, [[frame_number / 1000, 0, 0]])
+
+    assert reader.frames(4)['frame_number'].tolist() == [1, 2, 3, 4]
+    assert tracker.position()['pos_x'][0] == pytest.approx(4)
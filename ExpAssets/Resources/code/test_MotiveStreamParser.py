@@ -0,0 +1,55 @@
+import struct
+
+import numpy as np
+import pytest
+from MotiveStreamParser import MotiveStreamParser
+
+
+@pytest.fixture
+def marker_set_payload():
+    positions = np.arange(12, dtype="<f4").reshape(4, 3) / 10
+    return (
+        struct.pack("<I", 42)
+        + b"Right\0"
+        + struct.pack("<I", len(positions))
+        + positions.tobytes()
+    ), positions
+
+
+@pytest.mark.parametrize("decoder", MotiveStreamParser.DECODERS)
+def test_marker_set(decoder, marker_set_payload):
+    payload, positions = marker_set_payload
+    parser = MotiveStreamParser(payload, decoder=decoder)
+
+    assert parser.parse("frame_number") == 42
+    assert parser.parse("label") == "Right"
+    count = parser.parse("count")
+    markers = parser.parse_array("unlabeled_marker", count)
+
+    assert markers.shape == (4, 3)
+    assert markers.dtype == np.float32
+    np.testing.assert_array_equal(markers, positions)
+    assert parser.tell() == len(payload)
+
+
+def test_rigid_body_decoders_agree():
+    payload = struct.pack("<I8fh", 7, 1, 2, 3, 1, 0, 0, 0, 0.5, 1) * 2
+    fast = MotiveStreamParser(payload, decoder="numpy").parse_array("rigid_body", 2)
+    slow = MotiveStreamParser(payload).parse_array("rigid_body", 2)
+
+    assert fast.tolist() == slow.tolist()
+    assert fast["id"].tolist() == [7, 7]
+
+
+def test_unknown_decoder():
+    with pytest.raises(ValueError):
+        MotiveStreamParser(b"", decoder="ctypes")
+
+
+def test_match_advances_only_on_match():
+    parser = MotiveStreamParser(b"Right\0" + struct.pack("<I", 3))
+
+    assert not parser.match(b"Left\0")
+    assert parser.tell() == 0
+    assert parser.match(b"Right\0")
+    assert parser.parse("count") == 3
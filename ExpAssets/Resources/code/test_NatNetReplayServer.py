@@ -0,0 +1,113 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from natnetclient_rough import NatNetClient
+from NatNetReplayServer import (
+    NatNetReplayServer,
+    encode_frame,
+    load_trial_frames,
+    synthetic_frames,
+)
+
+
+def replay(frames, **kwargs):
+    """Stream frames to a connected unicast client; returns the received marker sets."""
+    received = []
+    server = NatNetReplayServer(frames, command_port=0, **kwargs)
+    server.start()
+
+    client = NatNetClient(
+        {
+            'use_multicast': False,
+            'command_port': server.command_port,
+            'decoder': 'numpy',
+        }
+    )
+    client.markers_listener = received.append
+    try:
+        assert client.startup()
+        assert server.wait(timeout=5)
+        # let the last packets land
+        threading.Event().wait(0.1)
+    finally:
+        client.shutdown()
+        server.stop()
+
+    return server, client, received
+
+
+def late_frames(delay, **kwargs):
+    """Synthetic frames from a source slow to produce the first (e.g., a large trial file)."""
+    time.sleep(delay)
+    yield from synthetic_frames(**kwargs)
+
+
+def test_encode_frame_roundtrip():
+    client = NatNetClient({'decoder': 'numpy', 'nat_net_requested_version': [4, 1, 0, 0]})
+    received = []
+    client.markers_listener = received.append
+
+    positions = np.arange(6, dtype=np.float32).reshape(2, 3)
+    client.process_message(encode_frame(7, [('Hand', positions)], timestamp=0.5))
+
+    assert received[0]['label'] == 'Hand'
+    assert received[0]['frame_number'] == 7
+    assert received[0]['timestamp'] == pytest.approx(0.5)
+    np.testing.assert_array_equal(received[0]['markers'], positions)
+
+
+def test_load_trial_frames(tmp_path):
+    path = tmp_path / 'trial.txt'
+    path.write_text('pos_x,pos_y,pos_z,frame_number\n1,2,3,1\n4,5,6,1\n7,8,9,2\n')
+
+    frames = load_trial_frames(str(path))
+
+    assert [frame_number for frame_number, _ in frames] == [1, 2]
+    np.testing.assert_array_equal(frames[0][1], [[1, 2, 3], [4, 5, 6]])
+
+
+def test_unicast_replay():
+    frames = list(synthetic_frames(marker_count=4, frame_count=60, seed=1))
+    server, client, received = replay(frames, rate=500)
+
+    assert server.sent == 60
+    assert [marker_set['frame_number'] for marker_set in received] == list(range(1, 61))
+    np.testing.assert_allclose(received[-1]['markers'], frames[-1][1])
+    assert client.marker_set_index == {'Hand': (0, 4)}
+
+
+def test_injected_loss_shows_as_missing_frames():
+    frames = synthetic_frames(marker_count=2, frame_count=200, seed=1)
+    server, client, received = replay(frames, rate=1000, loss=0.1, seed=3)
+
+    assert server.dropped > 0
+    assert len(received) == server.sent
+    stats = client.telemetry.frame_stats()
+    # only losses before the last received frame are visible to the client
+    last = received[-1]['frame_number']
+    assert stats['missing_frames'] == last - len(received)
+
+
+def test_model_def_requested_on_connect_describes_the_markers():
+    server = NatNetReplayServer(
+        late_frames(0.2, marker_count=4, frame_count=10, seed=1), command_port=0
+    )
+    server.start()
+
+    client = NatNetClient(
+        {
+            'use_multicast': False,
+            'command_port': server.command_port,
+            'decoder': 'numpy',
+        }
+    )
+    try:
+        # startup() asks for the model definition straight after connecting
+        assert client.startup()
+        threading.Event().wait(0.1)
+        assert client.marker_set_index == {'Hand': (0, 4)}
+    finally:
+        client.shutdown()
+        server.stop()
@@ -1,6 +1,11 @@
 import pytest
 import numpy as np
-from OptiTracker import OptiTracker
+from OptiTracker import CsvTailReader, OptiTracker, StreamingFilter, butter_sos, frame_centroids
+from scipy.signal import sosfilt, sosfilt_zi
+from FrameBuffer import FrameBuffer
+from Kinematics import Kinematics
+from OptiRecording import BinaryTrialWriter
+from TrialWriter import METADATA_EXT, TrialWriter
 from textwrap import dedent
 
 
@@ -54,6 +59,19 @@ def tracker(sample_data_file):
     return tracker
 
 
+@pytest.fixture
+def buffered_tracker(sample_data_file):
+    rows = np.genfromtxt(sample_data_file, delimiter=",", names=True)
+    buffer = FrameBuffer(marker_count=3, capacity=8)
+    for frame_number in np.unique(rows["frame_number"]):
+        frame = rows[rows["frame_number"] == frame_number]
+        buffer.write(
+            int(frame_number),
+            np.column_stack([frame["pos_x"], frame["pos_y"], frame["pos_z"]]),
+        )
+    return OptiTracker(marker_count=3, sample_rate=120, window_size=5, frame_buffer=buffer)
+
+
 def test_init():
     tracker = OptiTracker(marker_count=3)
     assert tracker.sample_rate == 120
@@ -140,3 +158,262 @@ def test_invalid_data_format(tmp_path):
         match="Data file must contain columns named frame, pos_x, pos_y, pos_z.",
     ):
         tracker.position()
+
+
+def test_frame_buffer_matches_file(tracker, buffered_tracker):
+    assert buffered_tracker.position() == tracker.position()
+    assert buffered_tracker.distance() == tracker.distance()
+    assert buffered_tracker.distance(num_frames=2) == tracker.distance(num_frames=2)
+    assert buffered_tracker.velocity() == tracker.velocity()
+
+
+def test_frame_buffer_wraps():
+    buffer = FrameBuffer(marker_count=2, capacity=3)
+    for frame_number in range(1, 6):
+        buffer.write(frame_number, [[frame_number, 0.0, 0.0]])
+        buffer.write(frame_number, [[frame_number, 1.0, 1.0]])
+
+    assert len(buffer) == 3
+    assert buffer.last_frame == 5
+
+    rows = buffer.frames(num_frames=10)
+    assert rows["frame_number"].tolist() == [3, 3, 4, 4, 5, 5]
+    assert rows["pos_y"].tolist() == [0.0, 1.0] * 3
+
+
+def test_empty_frame_buffer():
+    tracker = OptiTracker(marker_count=1, frame_buffer=FrameBuffer(marker_count=1))
+    with pytest.raises(ValueError, match="No frames have been buffered yet."):
+        tracker.position()
+
+
+def _rows(*rows):
+    return np.array(
+        list(rows),
+        dtype=[("frame_number", "i8"), ("pos_x", "f8"), ("pos_y", "f8"), ("pos_z", "f8")],
+    )
+
+
+def test_frame_centroids_fills_gaps():
+    frames = _rows(
+        (4, 2.0, 2.0, 2.0),
+        (1, 0.0, 0.0, 0.0),
+        (1, 2.0, 2.0, 2.0),
+        (4, 4.0, 4.0, 4.0),
+        (3, 9.0, np.nan, 9.0),
+    )
+
+    filled = frame_centroids(frames, fill="ffill")
+    assert filled["frame_number"].tolist() == [1, 2, 3, 4]
+    assert filled["pos_x"].tolist() == [1.0, 1.0, 1.0, 3.0]
+
+    gaps = frame_centroids(frames, fill="nan")
+    assert np.isnan(gaps["pos_x"][1:3]).all()
+    assert gaps["pos_z"][[0, 3]].tolist() == [1.0, 3.0]
+
+
+def test_frame_centroids_min_markers():
+    frames = _rows((1, 1.0, 1.0, 1.0), (2, 2.0, 2.0, 2.0), (2, 4.0, 4.0, 4.0))
+
+    centroids = frame_centroids(frames, min_markers=2, fill="ffill")
+    assert centroids["pos_y"].tolist() == [3.0, 3.0]
+
+    with pytest.raises(ValueError):
+        frame_centroids(frames, fill="bfill")
+
+
+def test_butter_sos_is_cached():
+    assert butter_sos(2, 10, 120, "low") is butter_sos(2, 10, 120, "low")
+    assert butter_sos(2, 10, 120, "low") is not butter_sos(2, 10, 240, "low")
+
+
+def test_streaming_filter_matches_batch():
+    samples = np.random.default_rng(0).normal(size=(50, 3))
+    sos = butter_sos(2, 10, 120, "low")
+    expected, _ = sosfilt(sos, samples, axis=0, zi=sosfilt_zi(sos)[:, :, None] * samples[0])
+
+    stream = StreamingFilter(order=2, cutoff=10, sample_rate=120)
+    streamed = np.array([stream.update(sample) for sample in samples])
+
+    np.testing.assert_allclose(streamed, expected)
+
+
+def test_ingest_streams_smoothed_kinematics():
+    tracker = OptiTracker(marker_count=2, sample_rate=100)
+    with pytest.raises(ValueError, match="No frames have been ingested yet."):
+        tracker.smoothed_position()
+
+    for frame_number in range(1, 200):
+        tracker.ingest(frame_number, [[0.001, 0.0, 0.0], [0.003, 0.0, 0.0]])
+
+    np.testing.assert_allclose(tracker.smoothed_position(), [2.0, 0.0, 0.0])
+    assert tracker.smoothed_velocity() == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize("method", ["central", "savgol"])
+def test_kinematics_uses_frame_timebase(method):
+    kinematics = Kinematics(sample_rate=100, method=method)
+    for frame_number in [1, 2, 3, 5, 6, 9, 10]:
+        kinematics.update(frame_number, [frame_number * 2.0, 0.0, 0.0])
+
+    assert kinematics.dropped_frames == 3
+    np.testing.assert_allclose(kinematics.velocity(), [200.0, 0.0, 0.0])
+    np.testing.assert_allclose(kinematics.acceleration(), [0.0, 0.0, 0.0], atol=1e-6)
+    assert kinematics.displacement(num_frames=5) == pytest.approx(8.0)
+    assert kinematics.average_speed(num_frames=5) == pytest.approx(200.0)
+
+
+def test_velocity_spans_queried_frames():
+    buffer = FrameBuffer(marker_count=1)
+    for frame_number in [1, 2, 3, 5]:
+        buffer.write(frame_number, [[frame_number / 1000, 0.0, 0.0]])
+
+    tracker = OptiTracker(marker_count=1, sample_rate=120, window_size=5, frame_buffer=buffer)
+    assert tracker.velocity() == pytest.approx(4 / (4 / 120))
+
+
+def test_binary_recording_matches_file(tmp_path, tracker, sample_data_file):
+    rows = np.genfromtxt(sample_data_file, delimiter=",", names=True)
+    path = str(tmp_path / "test_data.bin")
+
+    with BinaryTrialWriter(path, metadata={"Participant ID": 1}) as writer:
+        for frame_number in np.unique(rows["frame_number"]):
+            frame = rows[rows["frame_number"] == frame_number]
+            writer.write_frame(
+                int(frame_number),
+                np.column_stack([frame["pos_x"], frame["pos_y"], frame["pos_z"]]),
+            )
+
+    binary = OptiTracker(marker_count=3, sample_rate=120, window_size=5, data_dir=path)
+    assert binary.position() == tracker.position()
+    assert binary.distance() == tracker.distance()
+
+
+def test_frame_store_matches_file(tmp_path, tracker, sample_data_file):
+    rows = np.genfromtxt(sample_data_file, delimiter=",", names=True)
+    stored = OptiTracker(
+        marker_count=3, sample_rate=120, window_size=5, db_name=str(tmp_path / "frames.db")
+    )
+
+    with pytest.raises(ValueError, match="No frames have been stored"):
+        stored.position()
+
+    stored.frame_store.begin_trial("P1_B01_T001")
+    for frame_number in np.unique(rows["frame_number"]):
+        frame = rows[rows["frame_number"] == frame_number]
+        stored.ingest(
+            int(frame_number),
+            np.column_stack([frame["pos_x"], frame["pos_y"], frame["pos_z"]]),
+        )
+    # answer from stored frames rather than the streaming kinematics
+    stored.reset_stream()
+
+    assert stored.position() == tracker.position()
+    assert stored.distance() == tracker.distance()
+    assert stored.distance(num_frames=2) == tracker.distance(num_frames=2)
+    stored.frame_store.close()
+
+def write_csv(path, rows, **kwargs):
+    writer = TrialWriter(path, ["pos_x", "pos_y", "pos_z", "frame_number"], **kwargs)
+    for frame_number in np.unique(rows["frame_number"]):
+        frame = rows[rows["frame_number"] == frame_number]
+        writer.write_frame(
+            int(frame_number),
+            np.column_stack([frame["pos_x"], frame["pos_y"], frame["pos_z"]]),
+        )
+    return writer
+
+
+def test_reserved_header_is_filled_in_place(tmp_path, tracker, sample_data_file):
+    rows = np.genfromtxt(sample_data_file, delimiter=",", names=True)
+    path = str(tmp_path / "test_data.txt")
+
+    writer = write_csv(path, rows, header_size=256)
+    writer.flush()
+    size = (tmp_path / "test_data.txt").stat().st_size
+
+    writer.set_metadata({"Participant ID": 1, "Target Loc": "Left"})
+    writer.close()
+
+    text = (tmp_path / "test_data.txt").read_text()
+    assert text.startswith("#Participant ID: 1\n#Target Loc: Left\n#---")
+    assert (tmp_path / "test_data.txt").stat().st_size == size
+    assert not (tmp_path / ("test_data.txt" + METADATA_EXT)).exists()
+
+    csv = OptiTracker(marker_count=3, sample_rate=120, window_size=5, data_dir=path)
+    assert csv.position() == tracker.position()
+
+
+def test_metadata_overflow_goes_to_sidecar(tmp_path, sample_data_file):
+    rows = np.genfromtxt(sample_data_file, delimiter=",", names=True)
+    path = str(tmp_path / "test_data.txt")
+
+    writer = write_csv(path, rows, header_size=64)
+    writer.set_metadata({"Notes": "x" * 100})
+    writer.close()
+
+    assert (tmp_path / "test_data.txt").read_text().startswith("#---")
+    assert (tmp_path / ("test_data.txt" + METADATA_EXT)).read_text().startswith("#Notes: x")
+
+
+def test_tail_reader_parses_only_complete_lines(tmp_path):
+    path = tmp_path / "live.txt"
+    path.write_text("#metadata\npos_x,pos_y,pos_z,frame_number\n1,2,3,1\n4,5")
+    reader = CsvTailReader(str(path))
+
+    assert reader.read()["frame_number"].tolist() == [1]
+
+    # the writer finishes the partial line and appends another
+    with open(path, "a") as file:
+        file.write(",6,2\n7,8,9,3\n")
+
+    rows = reader.read()
+    assert rows["frame_number"].tolist() == [1, 2, 3]
+    assert rows["pos_y"].tolist() == [2.0, 5.0, 8.0]
+
+
+def test_tail_reader_final_read_includes_unterminated_line(tmp_path):
+    path = tmp_path / "finished.txt"
+    path.write_text("pos_x,pos_y,pos_z,frame_number\n1,2,3,1\n4,5,6,2")
+    reader = CsvTailReader(str(path))
+
+    assert reader.read()["frame_number"].tolist() == [1]
+    assert reader.read(final=True)["frame_number"].tolist() == [1, 2]
+    # too short to be a row yet
+    with open(path, "a") as file:
+        file.write("0\n7,8")
+    assert reader.read(final=True)["frame_number"].tolist() == [1, 20]
+
+    # the unterminated line is only provisional: completing it replaces it
+    with open(path, "a") as file:
+        file.write(",9,3\n10,11,12,4")
+    rows = reader.read(final=True)
+    assert rows["frame_number"].tolist() == [1, 20, 3, 4]
+    assert rows["pos_x"].tolist() == [1.0, 4.0, 7.0, 10.0]
+    assert reader.read()["frame_number"].tolist() == [1, 20, 3]
+
+
+def test_live_file_ignores_row_being_written(tmp_path, sample_data_file):
+    path = tmp_path / "live.txt"
+    path.write_text(open(sample_data_file).read() + "\n")
+    tracker = OptiTracker(marker_count=3, sample_rate=120, window_size=5, data_dir=str(path))
+    tracker.data_live = True
+
+    position, velocity = tracker.position(), tracker.velocity()
+
+    # the writer is mid-way through flushing the next row
+    with open(path, "a") as file:
+        file.write("0.013,0.1,0.2,")
+
+    np.testing.assert_array_equal(tracker.position(), position)
+    assert tracker.velocity() == velocity
+
+
+def test_tail_reader_rereads_replaced_file(tmp_path):
+    path = tmp_path / "live.txt"
+    path.write_text("pos_x,pos_y,pos_z,frame_number\n1,2,3,1\n4,5,6,2\n")
+    reader = CsvTailReader(str(path))
+    assert len(reader.read()) == 2
+
+    path.write_text("pos_x,pos_y,pos_z,frame_number\n0,0,0,7\n")
+    assert reader.read()["frame_number"].tolist() == [7]
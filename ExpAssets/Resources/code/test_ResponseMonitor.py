@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+from ResponseMonitor import FRAMES, PRESS, RELEASE, ResponseMonitor
+
+
+class Key(object):
+    def __init__(self, down=1):
+        self.down = down
+        self.samples = 0
+
+    def __call__(self):
+        self.samples += 1
+        return self.down
+
+
+def test_wakes_on_notify():
+    monitor = ResponseMonitor(Key(), poll_interval=1.0)
+    # one notify before waiting, so frames are expected rather than polled
+    monitor.notify()
+    events = monitor.events(until=time.perf_counter() + 5)
+    assert next(events)[0] == FRAMES
+
+    def produce():
+        time.sleep(0.02)
+        monitor.notify(timestamp=10.0)
+
+    start = time.perf_counter()
+    threading.Thread(target=produce).start()
+    event, arrival = next(events)
+
+    assert event == FRAMES
+    # woken by the producer, well before the 1 s poll interval
+    assert time.perf_counter() - start < 0.5
+    assert arrival >= start
+    assert monitor.to_local(10.5) == pytest.approx(arrival + 0.5)
+
+
+def test_key_changes_are_sampled_at_poll_interval():
+    key = Key(down=1)
+    monitor = ResponseMonitor(key, poll_interval=0.005)
+    monitor.notify()
+
+    def release():
+        time.sleep(0.02)
+        key.down = 0
+
+    threading.Thread(target=release).start()
+    events = [event for event, _ in monitor.events(until=time.perf_counter() + 0.1)]
+
+    assert events == [FRAMES, RELEASE]
+    # sampled on a timer, not spun on
+    assert key.samples < 100
+
+
+def test_reset_sets_assumed_key_state():
+    monitor = ResponseMonitor(Key(down=1), poll_interval=0.001)
+    monitor.notify()
+    monitor.reset(key_down=False)
+
+    events = monitor.events(until=time.perf_counter() + 0.01)
+    assert next(events)[0] == PRESS
+    assert monitor.key_down
+
+
+def test_polls_for_frames_without_a_producer():
+    monitor = ResponseMonitor(Key(), poll_interval=0.002)
+    events = [event for event, _ in monitor.events(until=time.perf_counter() + 0.02)]
+
+    assert events.count(FRAMES) > 1
+    assert monitor.to_local(1.0) is None
+
+
+def test_smallest_offset_is_kept():
+    clock = iter([5.0, 6.5, 7.0])
+    monitor = ResponseMonitor(Key(), clock=lambda: next(clock))
+    for timestamp in (1.0, 2.0, 3.0):
+        monitor.notify(timestamp)
+
+    # offsets of 4.0, 4.5 and 4.0
+    assert monitor.to_local(10.0) == 14.0
+    monitor.reset()
+    assert monitor.to_local(10.0) is None
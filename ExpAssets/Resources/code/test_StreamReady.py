@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+import pytest
+from StreamReady import StreamReady
+
+
+def test_ready_after_complete_frames():
+    ready = StreamReady(marker_count=2, frames_required=2)
+    partial = np.array([[0, 0, 0], [np.nan, np.nan, np.nan]])
+
+    assert not ready.observe(1, np.zeros((2, 3)))
+    assert not ready.observe(2, partial)
+    assert not ready.ready
+    assert ready.observe(3, np.zeros((2, 3)))
+    assert ready.wait(timeout=0)
+
+
+def test_wait_across_threads():
+    ready = StreamReady(marker_count=1, frames_required=3)
+
+    def produce():
+        for frame_number in range(3):
+            ready.observe(frame_number, [[0, 0, 0]])
+
+    threading.Thread(target=produce).start()
+    assert ready.wait(timeout=5)
+
+
+def test_diagnostic_and_reset():
+    ready = StreamReady(marker_count=3, frames_required=2)
+    assert 'No frames' in ready.diagnostic()
+
+    ready.observe(7, np.zeros((1, 3)))
+    assert not ready.wait(timeout=0.01)
+    assert ready.diagnostic() == (
+        '0 of 2 complete frames received (1 frames in all); '
+        'the last, frame 7, had 1 of 3 markers visible.'
+    )
+
+    ready.reset()
+    assert 'No frames' in ready.diagnostic()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        StreamReady(marker_count=0)
+    with pytest.raises(ValueError):
+        StreamReady(marker_count=1, frames_required=0)
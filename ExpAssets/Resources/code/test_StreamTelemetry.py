@@ -0,0 +1,77 @@
+import math
+
+import pytest
+from StreamTelemetry import StreamTelemetry
+
+
+def test_gaps_and_out_of_order_frames():
+    telemetry = StreamTelemetry()
+    for frame_number in (1, 2, 5, 4, 6):
+        telemetry.record_frame(frame_number, frame_number / 120, 0.0001)
+
+    stats = telemetry.frame_stats()
+    assert stats['frames'] == 5
+    assert stats['gaps'] == 1
+    assert stats['missing_frames'] == 2
+    assert stats['out_of_order'] == 1
+    assert stats['decode_mean_us'] == pytest.approx(100)
+
+
+def test_restarted_frame_counter_resyncs():
+    telemetry = StreamTelemetry()
+    telemetry.record_frame(1000, 0.0, 0.0)
+    # Motive restarted: numbering starts again from 1
+    for frame_number in range(1, 201):
+        telemetry.record_frame(frame_number, 1 + frame_number / 100, 0.0)
+
+    stats = telemetry.frame_stats()
+    assert stats['resyncs'] == 1
+    assert stats['out_of_order'] == 0
+    assert stats['gaps'] == 0
+    assert stats['interval_mean_ms'] == pytest.approx(10)
+    assert stats['interval_max_ms'] == pytest.approx(10)
+
+
+def test_interval_histogram_and_jitter():
+    telemetry = StreamTelemetry(bin_ms=1.0, bins=10)
+    arrivals = [0.0, 0.008, 0.0165, 0.025, 0.100]
+    for frame_number, arrival in enumerate(arrivals):
+        telemetry.record_frame(frame_number, arrival, 0.0)
+
+    stats = telemetry.frame_stats()
+    # 8, 8.5 and 8.5 ms land in bin 8; the 75 ms stall lands in the last bin
+    assert stats['interval_histogram'] == [0] * 8 + [3, 1]
+    assert stats['interval_max_ms'] == pytest.approx(75)
+    assert stats['jitter_ms'] > 0
+
+
+def test_reset_keeps_frame_continuity():
+    telemetry = StreamTelemetry()
+    telemetry.record_frame(1, 0.0, 0.0)
+    telemetry.reset()
+    telemetry.record_frame(3, 1 / 60, 0.0)
+
+    stats = telemetry.frame_stats()
+    assert stats['frames'] == 1
+    assert stats['missing_frames'] == 1
+
+
+def test_queue_drops_are_counted_per_period():
+    telemetry = StreamTelemetry()
+    telemetry.record_drain(4, dropped=2)
+    telemetry.reset()
+    telemetry.record_drain(6, dropped=5)
+    telemetry.record_drain(2, dropped=5)
+
+    stats = telemetry.queue_stats()
+    assert stats['drains'] == 2
+    assert stats['queue_depth_mean'] == 4
+    assert stats['queue_depth_max'] == 6
+    assert stats['queue_dropped'] == 3
+
+
+def test_empty_snapshot():
+    snapshot = StreamTelemetry().snapshot()
+    assert snapshot['frames'] == 0
+    assert math.isnan(snapshot['interval_mean_ms'])
+    assert math.isnan(snapshot['queue_depth_mean'])
@@ -0,0 +1,122 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+from NatNetReplayServer import synthetic_frames
+from OptiRecording import BinaryTrialWriter
+from TrialAnalysis import analyse_trial, analyse_tree, find_trials, load_trial
+from TrialWriter import TrialWriter
+
+
+def write_trial(path, binary=False, frame_count=240, **kwargs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if binary:
+        writer = BinaryTrialWriter(path)
+    else:
+        writer = TrialWriter(path, ["pos_x", "pos_y", "pos_z", "frame_number"])
+    for frame_number, positions in synthetic_frames(
+        marker_count=4, frame_count=frame_count, noise=0, seed=1, **kwargs
+    ):
+        writer.write_frame(frame_number, positions)
+    writer.close()
+
+
+@pytest.fixture
+def study(tmp_path):
+    block = tmp_path / "1" / "testing" / "Right" / "Front"
+    write_trial(str(block / "P1_B01_T001_OptiData.txt"))
+    write_trial(str(block / "P1_B01_T002_OptiData.bin"), binary=True)
+    # still hand: never reaches onset
+    write_trial(str(block / "P1_B01_T003_OptiData.txt"), reach=(0, 0, 0))
+    (block / "notes.txt").write_text("not a trial")
+    return tmp_path
+
+
+def read_table(path):
+    with open(path, newline="") as file:
+        return list(csv.DictReader(file))
+
+
+def test_find_trials(study):
+    trials = list(find_trials(str(study)))
+
+    assert [t["trial"] for t in trials] == [1, 2, 3]
+    assert trials[0] == {
+        "participant": "1",
+        "phase": "testing",
+        "hand": "Right",
+        "side": "Front",
+        "block": 1,
+        "trial": 1,
+        "path": os.path.join("1", "testing", "Right", "Front", "P1_B01_T001_OptiData.txt"),
+    }
+
+
+def test_analyse_trial(study):
+    path = next(study.rglob("*_T001_OptiData.txt"))
+    result = analyse_trial(str(path))
+
+    # a 400 mm reach, mostly along z, over 2 s
+    assert result["frames"] == 240
+    assert result["path_length"] == pytest.approx(np.hypot(50, 400), rel=0.05)
+    # minimum-jerk peak speed is 1.875 * distance / duration, at mid-movement
+    assert result["peak_velocity"] == pytest.approx(1.875 * np.hypot(50, 400) / 2, rel=0.05)
+    assert 0 < result["onset_time"] < result["onset_time"] + result["time_to_peak"] < 2
+
+    still = analyse_trial(str(next(study.rglob("*_T003_OptiData.txt"))))
+    assert still["onset_frame"] is None
+    assert still["frames"] == 240
+
+
+def test_unterminated_last_line_is_analysed(study):
+    path = next(study.rglob("*_T001_OptiData.txt"))
+    path.write_bytes(path.read_bytes().rstrip(b"\n"))
+
+    # 240 frames of 4 markers
+    assert len(load_trial(str(path))) == 960
+
+
+def test_csv_and_binary_agree(study):
+    csv_result = analyse_trial(str(next(study.rglob("*_T001_OptiData.txt"))))
+    bin_result = analyse_trial(str(next(study.rglob("*_T002_OptiData.bin"))))
+
+    for field in ["onset_frame", "peak_velocity", "path_length", "end_z"]:
+        assert bin_result[field] == pytest.approx(csv_result[field], rel=1e-4)
+
+
+def test_reruns_skip_unchanged_files(study):
+    out_path, analysed = analyse_tree(str(study), workers=2)
+    rows = read_table(out_path)
+
+    assert analysed == 3
+    assert [row["trial"] for row in rows] == ["1", "2", "3"]
+    assert rows[0]["error"] == ""
+    assert rows[2]["onset_frame"] == ""
+
+    assert analyse_tree(str(study), workers=2)[1] == 0
+    assert read_table(out_path) == rows
+
+    # touched but unchanged: hashed, not re-analysed
+    path = next(study.rglob("*_T001_OptiData.txt"))
+    os.utime(path, ns=(0, 0))
+    assert analyse_tree(str(study), workers=2)[1] == 0
+
+    # changed contents, or changed settings, are
+    write_trial(str(path), frame_count=120)
+    assert analyse_tree(str(study), workers=2)[1] == 1
+    assert read_table(out_path)[0]["frames"] == "120"
+    assert analyse_tree(str(study), workers=2, onset_velocity=100)[1] == 3
+
+
+def test_unreadable_trials_are_reported(study):
+    bad = next(study.rglob("*_T001_OptiData.txt")).with_name("P1_B01_T004_OptiData.txt")
+    bad.write_text("frame_number,pos_x,pos_y,pos_z\n")
+
+    out_path, _ = analyse_tree(str(study), workers=1)
+    assert "ValueError" in read_table(out_path)[3]["error"]
+    # failures are retried on the next run
+    assert analyse_tree(str(study), workers=1)[1] == 1
+
+    with pytest.raises(ValueError):
+        analyse_tree(str(study), cutof=5)
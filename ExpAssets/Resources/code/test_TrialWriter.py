@@ -0,0 +1,80 @@
+import csv
+import time
+
+from TrialWriter import TrialWriter
+
+
+FIELDS = ['pos_x', 'pos_y', 'pos_z', 'frame_number']
+
+
+def rows(count, start=1):
+    return [[0.1, 0.2, 0.3, frame_number] for frame_number in range(start, start + count)]
+
+
+def read_rows(path):
+    with open(path, newline='') as file:
+        return list(csv.reader(file))
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_full_batch_is_flushed_early(tmp_path):
+    path = str(tmp_path / 'trial.txt')
+    # the timer alone would not flush within the test
+    with TrialWriter(path, FIELDS, batch_size=3, flush_interval=60) as writer:
+        writer.write(rows(2))
+        time.sleep(0.1)
+        assert writer.rows_written == 0
+
+        writer.write(rows(1, start=3))
+        assert wait_for(lambda: writer.rows_written == 3)
+        assert [row[3] for row in read_rows(path)] == ['frame_number', '1', '2', '3']
+
+
+def test_pending_rows_are_flushed_on_a_timer(tmp_path):
+    path = str(tmp_path / 'trial.txt')
+    with TrialWriter(path, FIELDS, batch_size=1000, flush_interval=0.25) as writer:
+        writer.write_frame(1, [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+        assert writer.rows_written == 0
+
+        start = time.perf_counter()
+        assert wait_for(lambda: writer.rows_written == 2)
+        assert time.perf_counter() - start < 0.5
+        assert read_rows(path)[1:] == [['0.1', '0.2', '0.3', '1'], ['0.4', '0.5', '0.6', '1']]
+
+
+def test_close_flushes_buffered_rows(tmp_path):
+    path = str(tmp_path / 'trial.txt')
+    writer = TrialWriter(path, FIELDS, batch_size=1000, flush_interval=60)
+    writer.write(rows(5))
+
+    start = time.perf_counter()
+    writer.close()
+
+    # the flush thread is woken rather than waited out
+    assert time.perf_counter() - start < 1
+    assert writer.closed
+    assert writer.rows_written == 5
+    assert len(read_rows(path)) == 6
+
+
+def test_writes_after_close_are_discarded(tmp_path):
+    path = str(tmp_path / 'trial.txt')
+    writer = TrialWriter(path, FIELDS)
+    writer.write(rows(2))
+    writer.close()
+
+    writer.write(rows(3, start=3))
+    writer.write_frame(6, [[0.0, 0.0, 0.0]])
+    writer.flush()
+    writer.close()
+
+    assert writer.rows_written == 2
+    assert len(read_rows(path)) == 3
@@ -0,0 +1,275 @@
+import time
+
+import numpy as np
+import pytest
+from dataStructures import labeledMarkerDtype, rigidBodyDtype
+from natnetclient_rough import NatNetClient
+from NatNetReplayServer import NatNetReplayServer, encode_frame, synthetic_frames
+
+
+# (major, minor): 3.x has no block sizes or assets, 4.0 adds nothing to the
+# frame layout, 4.1 adds block sizes, assets and the precision timestamp
+VERSIONS = [(3, 0), (3, 1), (4, 0), (4, 1)]
+
+
+def rigid_bodies(*ids):
+    bodies = np.zeros(len(ids), dtype=rigidBodyDtype)
+    bodies["id"] = ids
+    bodies["pos_x"] = np.arange(len(ids)) + 0.5
+    bodies["rot_w"] = 1
+    bodies["error"] = 0.25
+    bodies["tracking"] = 1
+    return bodies
+
+
+def labeled_markers(count, model_id=1):
+    markers = np.zeros(count, dtype=labeledMarkerDtype)
+    markers["id"] = (model_id << 16) | np.arange(1, count + 1)
+    markers["pos_y"] = np.arange(count) - 1.5
+    markers["size"] = 0.01
+    markers["param"] = 2
+    markers["residual"] = 0.001
+    return markers
+
+
+def full_frame(version, **kwargs):
+    """Every asset block populated, with distinctive suffix values."""
+    return encode_frame(
+        42,
+        [
+            ("Hand", np.arange(12, dtype=np.float32).reshape(4, 3)),
+            ("Prop", np.ones((2, 3), dtype=np.float32)),
+        ],
+        timestamp=12.5,
+        version=version,
+        legacy_markers=np.full((3, 3), 7, dtype=np.float32),
+        rigid_bodies=rigid_bodies(1, 2),
+        skeletons=[(7, rigid_bodies(3, 4, 5))],
+        assets=[(9, rigid_bodies(6), labeled_markers(2, model_id=9))] if version >= (4, 1) else [],
+        labeled_markers=labeled_markers(3),
+        force_plates=[(11, [np.array([1, 2, 3], dtype=np.float32), np.array([4], dtype=np.float32)])],
+        devices=[(12, [np.array([5, 6], dtype=np.float32)])],
+        timecode=(0x01020304, 5),
+        is_recording=True,
+        **kwargs,
+    )
+
+
+def decoding_client(version, decoder="numpy", **settings):
+    return NatNetClient(
+        {"decoder": decoder, "nat_net_requested_version": [*version, 0, 0], **settings}
+    )
+
+
+def paused_frames(pause, before=10, after=10, marker_count=4, on_resume=None):
+    """A synthetic reach whose stream goes quiet for pause seconds part-way through."""
+    for index, frame in enumerate(synthetic_frames(marker_count, before + after, seed=1)):
+        if index == before:
+            time.sleep(pause)
+            if on_resume is not None:
+                on_resume()
+        yield frame
+
+
+def unicast_client(server):
+    return NatNetClient(
+        {
+            "use_multicast": False,
+            "command_port": server.command_port,
+            "decoder": "numpy",
+        }
+    )
+
+
+def test_unicast_session_survives_a_quiet_stream():
+    received = []
+    # longer than the command socket's 2 s timeout
+    with NatNetReplayServer(paused_frames(2.5), rate=200, command_port=0) as server:
+        client = unicast_client(server)
+        client.markers_listener = received.append
+        assert client.startup()
+        try:
+            assert server.wait(timeout=10)
+            time.sleep(0.1)
+            assert client.command_thread.is_alive()
+        finally:
+            client.shutdown()
+
+    assert [marker_set["frame_number"] for marker_set in received] == list(range(1, 21))
+
+
+def test_scene_change_after_a_quiet_spell_is_described():
+    received = []
+    servers = []
+    # edited in Motive during a pause, well after the connection's first 2 s
+    frames = paused_frames(2.5, on_resume=lambda: servers[0].change_scene("Hand2"))
+    with NatNetReplayServer(frames, rate=200, command_port=0) as server:
+        servers.append(server)
+        client = unicast_client(server)
+        client.markers_listener = received.append
+        assert client.startup()
+        try:
+            assert server.wait(timeout=10)
+            time.sleep(0.2)
+            assert client.marker_set_index == {"Hand2": (0, 4)}
+        finally:
+            client.shutdown()
+
+    assert server.model_def_requests == 2
+    assert [marker_set["label"] for marker_set in received] == ["Hand"] * 10 + ["Hand2"] * 10
+
+
+def test_unanswered_model_def_request_is_sent_again():
+    frames = synthetic_frames(4, 480, seed=1)
+    with NatNetReplayServer(frames, rate=240, command_port=0, unanswered_model_defs=1) as server:
+        client = unicast_client(server)
+        assert client.startup()
+        try:
+            assert server.wait(timeout=10)
+            time.sleep(0.1)
+            assert client.marker_set_index == {"Hand": (0, 4)}
+        finally:
+            client.shutdown()
+
+    assert server.model_def_requests == 2
+
+
+@pytest.mark.parametrize("decoder", ["numpy", "construct"])
+@pytest.mark.parametrize("version", VERSIONS, ids=lambda v: f"{v[0]}.{v[1]}")
+def test_decodes_every_block(version, decoder):
+    client = decoding_client(version, decoder)
+    frames = []
+    client.frame_listener = frames.append
+
+    client.process_message(full_frame(version))
+    (frame,) = frames
+
+    assert frame["frame_number"] == 42
+    assert [marker_set["label"] for marker_set in frame["marker_sets"]] == ["Hand", "Prop"]
+    if decoder == "numpy":
+        np.testing.assert_array_equal(
+            frame["marker_sets"][0]["markers"], np.arange(12).reshape(4, 3)
+        )
+    np.testing.assert_array_equal(frame["legacy_markers"], np.full((3, 3), 7))
+    np.testing.assert_array_equal(frame["rigid_bodies"], rigid_bodies(1, 2))
+    assert frame["skeletons"][0]["id"] == 7
+    np.testing.assert_array_equal(frame["skeletons"][0]["rigid_bodies"], rigid_bodies(3, 4, 5))
+    np.testing.assert_array_equal(frame["labeled_markers"], labeled_markers(3))
+    assert frame["force_plates"][0]["id"] == 11
+    assert [channel.tolist() for channel in frame["force_plates"][0]["channels"]] == [[1, 2, 3], [4]]
+    assert frame["devices"][0]["id"] == 12
+    assert [channel.tolist() for channel in frame["devices"][0]["channels"]] == [[5, 6]]
+
+    if version >= (4, 1):
+        (asset,) = frame["assets"]
+        assert asset["id"] == 9
+        np.testing.assert_array_equal(asset["rigid_bodies"], rigid_bodies(6))
+        np.testing.assert_array_equal(asset["markers"], labeled_markers(2, model_id=9))
+    else:
+        assert "assets" not in frame
+
+    # landing on the suffix: every field comes out as encoded
+    assert frame["timecode"] == 0x01020304
+    assert frame["timecode_sub"] == 5
+    assert frame["timestamp"] == 12.5
+    assert frame["stamp_camera_mid_exposure"] == 125_000_000
+    assert frame["stamp_data_received"] == 125_000_000
+    assert frame["stamp_transmit"] == 125_000_000
+    if version >= (4, 1):
+        assert frame["precision_timestamp"] == 12.5
+    else:
+        assert "precision_timestamp" not in frame
+    assert frame["is_recording"]
+    assert not frame["tracked_models_changed"]
+
+
+@pytest.mark.parametrize("version", VERSIONS, ids=lambda v: f"{v[0]}.{v[1]}")
+def test_suffix_flags_and_timestamps(version):
+    client = decoding_client(version)
+    suffixes = []
+    client.suffix_listener = suffixes.append
+
+    client.process_message(encode_frame(1, [], timestamp=0.75, version=version))
+    client.process_message(
+        encode_frame(2, [], timestamp=1.0, version=version, tracked_models_changed=True)
+    )
+
+    assert [suffix["frame_number"] for suffix in suffixes] == [1, 2]
+    assert [suffix["timestamp"] for suffix in suffixes] == [0.75, 1.0]
+    assert [suffix["tracked_models_changed"] for suffix in suffixes] == [False, True]
+    assert not any(suffix["is_recording"] for suffix in suffixes)
+    if version >= (4, 1):
+        assert suffixes[0]["precision_timestamp"] == 0.75
+
+
+def test_frames_without_a_suffix_still_end():
+    # pre-3.0 frames are decoded no further than their marker sets
+    client = decoding_client((2, 10))
+    received = []
+    client.markers_listener = received.append
+    client.suffix_listener = received.append
+
+    for frame_number in [1, 2]:
+        positions = np.ones((2, 3), dtype=np.float32)
+        client.process_message(
+            encode_frame(frame_number, [("Hand", positions)], timestamp=1.0, version=(2, 10))
+        )
+
+    assert [("label" in item, item["frame_number"]) for item in received] == [
+        (True, 1),
+        (False, 1),
+        (True, 2),
+        (False, 2),
+    ]
+    assert received[1] == {"frame_number": 1, "timestamp": None}
+
+
+def test_assets_require_4_1():
+    with pytest.raises(ValueError):
+        encode_frame(1, [], version=(4, 0), assets=[(1, rigid_bodies(1), labeled_markers(1))])
+
+
+LISTENERS = [
+    "markers_listener",
+    "legacy_markers_listener",
+    "rigid_bodies_listener",
+    "skeletons_listener",
+    "asset_rigid_bodies_listener",
+    "asset_markers_listener",
+    "labeled_markers_listener",
+    "force_plates_listener",
+    "devices_listener",
+]
+
+
+@pytest.mark.parametrize("decoder", ["numpy", "construct"])
+@pytest.mark.parametrize("version", [(3, 1), (4, 1)], ids=["3.1", "4.1"])
+def test_skipped_blocks_leave_the_suffix_intact(version, decoder):
+    # unwanted blocks are skipped by byte size on 4.1+, by element count before
+    def decode(listeners, **settings):
+        client = decoding_client(version, decoder, **settings)
+        received = {}
+        for name in listeners:
+            setattr(client, name, lambda payload, name=name: received.setdefault(name, payload))
+        suffixes = []
+        client.suffix_listener = suffixes.append
+        client.process_message(full_frame(version))
+        return suffixes[0], received
+
+    only_markers, received = decode(["markers_listener"])
+    assert received["markers_listener"]["label"] == "Hand"
+
+    everything, _ = decode(LISTENERS)
+    nothing, _ = decode([])
+    other_set, received = decode(["markers_listener"], marker_set_labels=["Prop"])
+    assert received["markers_listener"]["label"] == "Prop"
+
+    assert only_markers == everything == nothing == other_set
+    assert everything["timestamp"] == 12.5
+    assert everything["is_recording"]
+
+    # blocks after skipped ones still decode in place
+    _, received = decode(["labeled_markers_listener"])
+    np.testing.assert_array_equal(received["labeled_markers_listener"]["markers"], labeled_markers(3))
+    _, received = decode(["devices_listener"])
+    assert received["devices_listener"]["devices"][0]["id"] == 12
@@ -13,18 +13,28 @@ from klibs.KLCommunication import message
 from klibs.KLAudio import Tone
 from klibs.KLExceptions import TrialException
 
-from klibs.KLBoundary import BoundarySet, CircleBoundary
-
 from natnetclient_rough import NatNetClient  # type: ignore[import]
 from OptiTracker import OptiTracker  # type: ignore[import]
+from ContactDetector import ContactDetector  # type: ignore[import]
+from ResponseMonitor import ResponseMonitor, FRAMES, RELEASE  # type: ignore[import]
+from StreamReady import StreamReady  # type: ignore[import]
+from FrameBuffer import FrameBuffer  # type: ignore[import]
+from FrameQueue import FrameQueue  # type: ignore[import]
+from MocapProcess import MocapProcess  # type: ignore[import]
+from StreamTelemetry import StreamTelemetry  # type: ignore[import]
+from TrialWriter import TrialWriter, HEADER_SIZE  # type: ignore[import]
+from OptiRecording import BinaryTrialWriter, RECORDING_EXT  # type: ignore[import]
 from pyfirmata import serial  # type: ignore[import]
 
-from get_key_state import get_key_state  # type: ignore[import]
+from get_key_state import get_key_state, get_scancode  # type: ignore[import]
 
-from csv import DictWriter
 from random import shuffle, choice
 from datetime import datetime
+from functools import partial
 import os
+import time
+
+import numpy as np
 
 # import datatable as dt
 
@@ -34,12 +44,16 @@ CENTRE = 'Centre'
 TOP = 'Top'
 FRONT = 'Front'
 BACK = 'Back'
+BINARY = 'binary'
+SQLITE = 'sqlite'
+PROCESS = 'process'
 TARGET = 'Target'
 DISTRACTOR = 'Distractor'
 READY = 'Ready'
 POS_X = 'pos_x'
 POS_Y = 'pos_y'
 POS_Z = 'pos_z'
+FRAME_NUMBER = 'frame_number'
 SPACE = 'space'
 PREMATURE_REACH = 'Premature reach'
 REACH_TIMEOUT = 'Reach timeout'
@@ -60,14 +74,111 @@ class BackHandFrontHand(klibs.Experiment):
         brim_px = self.px_cm * P.placeholder_brim_cm   # type: ignore
         diam_px = holder_px + brim_px
 
-        # for working with streamed motion capture data
-        self.ot = OptiTracker(marker_count=10, sample_rate=120, window_size=5)
+        # only the hand marker sets are decoded, straight into (N, 3) arrays,
+        # so extra props in the Motive scene cost nothing per frame
+        client_settings = {
+            'decoder': 'numpy',
+            'marker_set_labels': P.hand_markerset_labels,  # type: ignore[known-attribute]
+        }
+
+        # wakes the trial loop on new frames and samples the response key between
+        # them; created before streaming starts, as the NatNet thread notifies it
+        self.responses = ResponseMonitor(
+            key_state=partial(get_key_state, get_scancode(SPACE)),
+            poll_interval=P.response_poll_ms / 1000,  # type: ignore[known-attribute]
+        )
+
+        self.nnc = None
+        self.mocap = None
+        self.body_queue = None
+        # trial-scoped CSV writer; only open while a trial is recording in-process
+        self.trial_writer = None
+        self._mocap_recording = False
+
+        # a session database is written by the tracker as it ingests marker frames
+        recording_to_db = P.opti_save_csv and P.opti_recording_format == SQLITE  # type: ignore[known-attribute]
+        if recording_to_db and (
+            P.opti_acquisition == PROCESS or P.hand_rigid_body_id is not None  # type: ignore[known-attribute]
+        ):
+            raise ValueError(
+                "opti_recording_format = 'sqlite' requires opti_acquisition = 'thread' and marker tracking."
+            )
+
+        if P.opti_acquisition == PROCESS:  # type: ignore[known-attribute]
+            if P.hand_rigid_body_id is not None:  # type: ignore[known-attribute]
+                raise ValueError("Rigid body tracking requires opti_acquisition = 'thread'.")
+
+            # decoding and trial recording run in a separate process, publishing
+            # frames into a shared-memory ring that is read here, read-only
+            self.mocap = MocapProcess(
+                client_settings,
+                marker_count=10,
+                capacity=P.opti_buffer_frames,  # type: ignore[known-attribute]
+            )
+            if not self.mocap.start():
+                raise RuntimeError('Could not connect to the NatNet server.')
+
+            frame_buffer = self.mocap.ring
+            # the trial loop drains new frames from the ring as it would the queue
+            self.frame_queue = self.mocap.ring
+
+        else:
+            frame_buffer = FrameBuffer(marker_count=10, capacity=P.opti_buffer_frames)  # type: ignore[known-attribute]
+
+            # manages stream
+            self.nnc = NatNetClient(client_settings)
+
+            # frames handed from the NatNet data thread to the trial loop; the
+            # listeners below only enqueue, the trial loop drains
+            self.frame_queue = FrameQueue(
+                marker_count=10,
+                capacity=P.opti_queue_frames,  # type: ignore[known-attribute]
+                policy=P.opti_queue_policy,  # type: ignore[known-attribute]
+            )
+            self._frame_markers = []
+
+            # what to do with incoming data
+            self.nnc.markers_listener = self._marker_set_listener
+            self.nnc.suffix_listener = self._frame_end_listener
+
+            # optionally track a single hand rigid body rather than the marker centroid
+            if P.hand_rigid_body_id is not None:  # type: ignore[known-attribute]
+                self.body_queue = FrameQueue(
+                    marker_count=1,
+                    capacity=P.opti_queue_frames,  # type: ignore[known-attribute]
+                    policy=P.opti_queue_policy,  # type: ignore[known-attribute]
+                )
+                self.nnc.rigid_bodies_listener = self._rigid_body_listener
+
+            # stream for the whole session; trials only switch recording segments
+            if not self.nnc.startup():
+                raise RuntimeError('Could not connect to the NatNet server.')
+
+        # gaps, jitter and decode times are gathered by whichever client decodes
+        # the stream; queue depth is recorded here, as frames are drained
+        self.telemetry = self.nnc.telemetry if self.nnc is not None else StreamTelemetry()
+
+        # for working with streamed motion capture data; queries are served
+        # from an in-memory ring buffer rather than the trial file. When
+        # recording to a database, it sits alongside the klibs database
+        self.ot = OptiTracker(
+            marker_count=10,
+            sample_rate=120,
+            window_size=5,
+            frame_buffer=frame_buffer,
+            db_name=(
+                os.path.splitext(P.database_path)[0] + '_frames.db' if recording_to_db else ''
+            ),
+        )
 
-        # manages stream
-        self.nnc = NatNetClient()
+        # tests drained frames against the target/distractor regions
+        self.contacts = ContactDetector(min_markers=self.ot.min_markers)
 
-        # what to do with incoming data
-        self.nnc.markers_listener = self._marker_set_listener
+        # fires once enough frames with every hand marker visible have been drained
+        self.stream_ready = StreamReady(
+            marker_count=self.ot.marker_count,
+            frames_required=P.opti_ready_frames,  # type: ignore[known-attribute]
+        )
 
         # plato goggles controller
         self.goggles = PlatoGoggles(comport=P.arduino_comport, baudrate=P.baudrate)  # type: ignore
@@ -155,19 +266,19 @@ class BackHandFrontHand(klibs.Experiment):
         self.target_loc = self.trial_deets.get('target_loc')
         self.distractor_loc = self.trial_deets.get('distractor_loc')
 
-        self.bounds = BoundarySet(
-            boundaries=[
-                CircleBoundary(
-                    TARGET,
-                    self.trial_deets.get('target_loc'),
-                    P.boundary_radius_cm * self.px_cm,  # type: ignore[attr]
+        # regions are mapped into tracker coordinates once, so frames are
+        # tested as they arrive without converting each one to pixels
+        self.contacts.set_regions(
+            {
+                TARGET: (
+                    self._screen_to_tracker(self.locs[self.target_loc]),
+                    P.boundary_radius_cm,  # type: ignore[attr]
                 ),
-                CircleBoundary(
-                    DISTRACTOR,
-                    self.trial_deets.get('distractor_loc'),
-                    P.boundary_radius_cm * self.px_cm,  # type: ignore[attr]
+                DISTRACTOR: (
+                    self._screen_to_tracker(self.locs[self.distractor_loc]),
+                    P.boundary_radius_cm,  # type: ignore[attr]
                 ),
-            ]
+            }
         )
 
         self.evm.add_event(
@@ -193,12 +304,10 @@ class BackHandFrontHand(klibs.Experiment):
             P.trial_number,
         )
 
-        self.nnc.startup()  # start marker tracking
-
-        # ensure some data exists before beginning trial
-        smart_sleep(P.opti_trial_lead_time)  # type: ignore[known-attribute]
+        self._begin_recording(self.ot.data_dir)
 
-        self._validate_trial_data_file(self.ot.data_dir)
+        # start as soon as complete frames are flowing into the recording
+        self._wait_for_stream()
 
         self.draw()
 
@@ -208,29 +317,45 @@ class BackHandFrontHand(klibs.Experiment):
         hide_mouse_cursor()
 
         rt = None
-        obj_tipped = None
+        contact = None
+        contact_time = NA
 
-        while self.evm.before('go_signal'):
+        # the space bar is held from trial_prep; any release before the go signal aborts
+        self.responses.reset(key_down=True)
+        go_deadline = time.perf_counter() + (
+            self.trial_deets.get('go_signal_onset') - self.evm.trial_time_ms()
+        ) / 1000
 
-            if get_key_state('space') == 0:
-                if get_key_state('space') == 0:
-                    self._abort_trial(PREMATURE_REACH)
+        for event, _ in self.responses.events(until=go_deadline):
+            if event == RELEASE:
+                self._abort_trial(PREMATURE_REACH)
+            elif event == FRAMES:
+                self._drain_frames()
 
         go_signal_onset = self.evm.trial_time_ms()
+        go_time = time.perf_counter()
         self.go_signal.play()
 
-        while self.evm.before('response_timeout') and obj_tipped is None:
-            if get_key_state('space') == 0:
-                rt = self.evm.trial_time_ms() - go_signal_onset
+        response_deadline = go_time + P.response_timeout / 1000  # type: ignore[known-attribute]
 
-            hand_pos = self._get_hand_pos()
+        # release and contact are timed where they happened, not when the loop got to them
+        for event, event_time in self.responses.events(until=response_deadline):
+            if event == RELEASE and rt is None:
+                rt = (event_time - go_time) * 1000
+            elif event == FRAMES:
+                contact = self.contacts.update(self._drain_frames())
+                if contact is not None:
+                    break
 
-            obj_tipped = self.bounds.which_boundary(hand_pos)
-
-        if obj_tipped is None:
+        if contact is None:
             self._abort_trial(REACH_TIMEOUT)
 
-        self.nnc.shutdown()
+        contact_at = self.responses.to_local(contact['timestamp'])
+        if contact_at is not None:
+            contact_time = (contact_at - go_time) * 1000
+
+        self._end_recording(metadata=self._get_trial_metadata(self.trial_deets))
+        self._log_telemetry()
 
         return {
             'block_num': P.block_number,
@@ -241,13 +366,26 @@ class BackHandFrontHand(klibs.Experiment):
             'target_loc': self.task_deets.get('target_loc'),
             'distractor_loc': self.task_deets.get('distractor_loc'),
             'response_time': rt,
-            'object_tipped': obj_tipped,
+            'object_tipped': contact['label'],
+            # tracker frame and timestamp (s) of first contact, not the loop iteration
+            'contact_frame': contact['frame_number'],
+            'contact_timestamp': NA if contact['timestamp'] is None else contact['timestamp'],
+            # ms from the go signal to the contact frame's arrival, if frames were timestamped
+            'contact_time': contact_time,
         }
 
     def trial_clean_up(self):
         clear()
 
     def clean_up(self):
+        self._end_recording()
+        if self.ot.frame_store is not None:
+            self.ot.frame_store.close()
+        if self.mocap is not None:
+            self.mocap.stop()
+        else:
+            self.nnc.shutdown()
+
         clear()
 
         fill()
@@ -281,17 +419,9 @@ class BackHandFrontHand(klibs.Experiment):
 
         flip()
 
-    def _get_hand_pos(self):
-        hand_marker = self.ot.position()
-
-        hand_pos = {
-            axis: markers[axis][0].item() * self.px_cm
-            for axis in (POS_X, POS_Y, POS_Z)
-        }
-        return self._translate_pos(hand_pos)
-
-    def _translate_pos(self, pos):
-        return (P.screen_x - pos[POS_X], P.screen_y - pos[POS_Z])
+    def _screen_to_tracker(self, loc):
+        """Map a screen location (px) onto the tracker's x/z plane, whose axes run from the screen's far corner."""
+        return ((P.screen_x - loc[0]) / self.px_cm, (P.screen_y - loc[1]) / self.px_cm)
 
     def _abort_trial(self, err=''):
         msgs = {
@@ -301,9 +431,8 @@ class BackHandFrontHand(klibs.Experiment):
 
         self.goggles.open()
 
-        self.nnc.shutdown()
-
-        os.remove(self.ot.data_dir)
+        self._end_recording(discard=True)
+        self._log_telemetry(aborted=err)
 
         fill()
         message(
@@ -316,30 +445,193 @@ class BackHandFrontHand(klibs.Experiment):
         raise TrialException(err)
 
     def _marker_set_listener(self, marker_set: dict) -> None:
-        """Write marker set data to CSV file.
+        """Collect a hand marker set; the frame is queued once all its sets have arrived.
+
+        Called on the NatNet data thread.
 
         Args:
             marker_set (dict): Dictionary containing marker data to be written.
-                Expected format: {'markers': [{'key1': val1, ...}, ...]}
+                Expected format: {'label': str, 'index': int, 'frame_number': int, 'timestamp': float, 'markers': np.ndarray (N, 3)}
+        """
+        # the client only delivers the subscribed hand marker sets, routed by
+        # their index in the model definition, so no label check is needed here
+        if len(marker_set['markers']):
+            self._frame_markers.append(marker_set['markers'])
+
+    def _frame_end_listener(self, suffix: dict) -> None:
+        """Queue the hand markers collected for a frame and wake the trial loop. Called on the NatNet data thread.
+
+        Args:
+            suffix (dict): Frame suffix, including 'frame_number' and 'timestamp'
+        """
+        markers, self._frame_markers = self._frame_markers, []
+        if markers:
+            self.frame_queue.put(
+                suffix[FRAME_NUMBER],
+                markers[0] if len(markers) == 1 else np.concatenate(markers),
+                suffix['timestamp'],
+            )
+
+        # wake the trial loop; rigid bodies were queued before the suffix arrived
+        self.responses.notify(suffix['timestamp'])
+
+    def _rigid_body_listener(self, rigid_bodies: dict) -> None:
+        """Queue the hand rigid body's position. Called on the NatNet data thread.
+
+        Args:
+            rigid_bodies (dict): {'frame_number': int, 'timestamp': float, 'rigid_bodies': np.ndarray}
         """
+        bodies = rigid_bodies['rigid_bodies']
+        hand = bodies[
+            (bodies['id'] == P.hand_rigid_body_id) & (bodies['tracking'] & 0x01 != 0)  # type: ignore[known-attribute]
+        ]
+        if not len(hand):
+            return
+
+        position = np.column_stack([hand['pos_x'], hand['pos_y'], hand['pos_z']])
+        self.body_queue.put(rigid_bodies[FRAME_NUMBER], position, rigid_bodies['timestamp'])
+
+    def _drain_frames(self) -> list:
+        """Move queued frames into the tracker and the trial file, on the trial loop's thread.
+
+        Returns:
+            list: The drained (frame_number, timestamp, positions) frames that drive
+                the hand position: marker frames, or rigid body frames if tracked
+        """
+        writer = self.trial_writer
+
+        frames = self.frame_queue.drain()
+        self.telemetry.record_drain(len(frames), self.frame_queue.dropped)
+
+        for frame_number, timestamp, markers in frames:
+            self.stream_ready.observe(frame_number, markers)
+
+            if self.body_queue is None:
+                self.ot.ingest(frame_number, markers, timestamp)
+
+            # hand rows off to the trial writer; it does the disk I/O on its own thread
+            if writer is not None:
+                writer.write_frame(frame_number, markers, timestamp)
+
+        if self.body_queue is not None:
+            frames = self.body_queue.drain()
+            for frame_number, timestamp, position in frames:
+                self.ot.ingest(frame_number, position, timestamp)
+
+        return frames
+
+    def _begin_recording(self, fname):
+        """Start a recording segment: reset the frame buffer and open the trial file."""
+        self._end_recording()
+
+        # frames from before this segment belong to no trial
+        self.frame_queue.clear()
+        if self.body_queue is not None:
+            self.body_queue.clear()
+
+        self.ot.frame_buffer.clear()
+        self.ot.reset_stream()
+        self._reset_telemetry()
+
+        if not P.opti_save_csv:  # type: ignore[known-attribute]
+            return
+
+        if self.mocap is not None:
+            # the acquisition process writes the file
+            self.mocap.begin_recording(fname, P.opti_recording_format)  # type: ignore[known-attribute]
+            self._mocap_recording = True
+            self.ot.data_live = True
+            return
 
-        if marker_set.get('label') in P.hand_markerset_labels:  # type: ignore[known-attribute]
-            # Append data to trial-specific CSV file
-            fname = self.ot.data_dir
-            header = list(marker_set['markers'][0].keys())
+        if self.ot.frame_store is not None:
+            # frames are keyed by the trial file's path, as no file is written
+            self.ot.frame_store.begin_trial(
+                os.path.relpath(os.path.splitext(fname)[0], P.opti_data_dir)  # type: ignore[known-attribute]
+            )
+            return
+
+        if P.opti_recording_format == BINARY:  # type: ignore[known-attribute]
+            self.trial_writer = BinaryTrialWriter(fname)
+        else:
+            # trial details are filled into the reserved header when the trial ends
+            self.trial_writer = TrialWriter(
+                fname, [POS_X, POS_Y, POS_Z, FRAME_NUMBER], header_size=HEADER_SIZE
+            )
+
+        # while written, the file's last line may be mid-way through a flush
+        self.ot.data_live = True
 
-            # if file doesn't exist, create it and write header
-            if not os.path.exists(fname):
-                with open(fname, 'w', newline='') as file:
-                    writer = DictWriter(file, fieldnames=header)
-                    writer.writeheader()
+    def _end_recording(self, discard=False, metadata=None):
+        """End the current recording segment, deleting its file (or stored frames) if discarded.
 
-            # append marker data to file
-            with open(fname, 'a', newline='') as file:
-                writer = DictWriter(file, fieldnames=header)
-                for marker in marker_set.get('markers', None):  # type: ignore[iterable]
-                    if marker is not None:
-                        writer.writerow(marker)
+        Metadata is filled into the recording's reserved header, in place, or
+        stored with the trial's frames when recording to a database.
+        """
+        if self._mocap_recording:
+            self._mocap_recording = False
+            self.mocap.end_recording(metadata, discard)
+            self.ot.data_live = False
+            return
+
+        store = self.ot.frame_store
+        if store is not None and store.trial is not None:
+            # catch the database up with frames still waiting in the queue
+            self._drain_frames()
+            if metadata:
+                store.set_metadata(metadata)
+            store.end_trial(discard)
+            return
+
+        if self.trial_writer is None:
+            return
+
+        # catch the file up with frames still waiting in the queue
+        self._drain_frames()
+
+        writer, self.trial_writer = self.trial_writer, None
+
+        if metadata:
+            writer.set_metadata(metadata)
+
+        writer.close()
+        self.ot.data_live = False
+
+        if discard and os.path.exists(writer.path):
+            os.remove(writer.path)
+
+    def _reset_telemetry(self):
+        """Start a new telemetry period, here and in the acquisition process."""
+        self.telemetry.reset()
+        if self.mocap is not None:
+            self.mocap.telemetry(reset=True)
+
+    def _get_stream_telemetry(self):
+        """Get stream and queue telemetry gathered since the last reset."""
+        snapshot = self.telemetry.snapshot()
+        if self.mocap is not None:
+            snapshot.update(self.mocap.telemetry())
+        return snapshot
+
+    def _log_telemetry(self, aborted=''):
+        """Write the trial's stream telemetry to the stream_telemetry table, if enabled."""
+        if not P.opti_log_telemetry:  # type: ignore[known-attribute]
+            return
+
+        snapshot = self._get_stream_telemetry()
+        snapshot['interval_histogram'] = ','.join(
+            str(count) for count in snapshot['interval_histogram']
+        )
+
+        self.db.insert(
+            {
+                'participant_id': P.participant_id,
+                'block_num': P.block_number,
+                'trial_num': P.trial_number,
+                'aborted': aborted,
+                **snapshot,
+            },
+            table='stream_telemetry',
+        )
 
     def _ensure_dir_exists(self, path):
         """Create directory if it doesn't exist. Raises exception on failure."""
@@ -375,8 +667,9 @@ class BackHandFrontHand(klibs.Experiment):
         trial_num,
     ):
         """Construct trial data filename."""
+        ext = RECORDING_EXT if P.opti_recording_format == BINARY else '.txt'  # type: ignore[known-attribute]
         filename = (
-            f'P{participant_id}_B{block_num:02d}_T{trial_num:03d}_OptiData.txt'
+            f'P{participant_id}_B{block_num:02d}_T{trial_num:03d}_OptiData{ext}'
         )
         return os.path.join(block_dir, filename)
 
@@ -399,45 +692,29 @@ class BackHandFrontHand(klibs.Experiment):
             'distractor_loc': distractor_loc,
         }
 
-    def _add_trial_header_info(self, filepath, trial_info):
-        """Markup file with trial details"""
-
-        header_lines = []
-        header_lines.append(f'#Participant ID: {P.p_id}')
+    def _get_trial_metadata(self, trial_info):
+        """Collate trial details recorded alongside the trial's motion data."""
+        metadata = {'Participant ID': P.p_id}
         for key, value in trial_info.items():
-            header_lines.append(f'#{key.replace("_", " ").title()}: {value}')
-        header_lines.append(
-            f"#Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            metadata[key.replace('_', ' ').title()] = value
+        metadata['Date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return metadata
+
+    def _wait_for_stream(self):
+        """Drain frames until the stream is ready. Raises RuntimeError on timeout, with what did arrive."""
+        self.stream_ready.reset()
+        deadline = time.perf_counter() + P.opti_ready_timeout / 1000  # type: ignore[known-attribute]
+
+        for event, _ in self.responses.events(until=deadline):
+            if event == FRAMES:
+                self._drain_frames()
+                if self.stream_ready.ready:
+                    return
+
+        raise RuntimeError(
+            f'Motion capture stream not ready after {P.opti_ready_timeout} ms. '  # type: ignore[known-attribute]
+            + self.stream_ready.diagnostic()
         )
-        header_lines.append('#----------------------------------------')
-
-        try:
-            with open(filepath, 'r+') as f:
-                content = f.read()
-                f.seek(0, 0)
-                f.writelines('\n'.join(header_lines) + '\n' + content)
-        except IOError as e:
-            raise IOError(
-                f'Cannot write header to trial data file: {filepath} - {e}'
-            )
-
-    def _validate_trial_data_file(self, filepath):
-        """Validate that trial data file exists and contains data. Raises exception if not."""
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(
-                f'Trial data file does not exist: {filepath}'
-            )
-
-        try:
-            with open(filepath, 'r') as f:
-                lines = f.readlines()
-                # Should have at least header + some data lines
-                if len(lines) < 6:
-                    raise ValueError(
-                        f'OptiData file at \n\t{filepath}\nis sparser than expected, with only {len(lines)} lines.'
-                    )
-        except IOError as e:
-            raise IOError(f'Cannot read trial data file: {filepath} - {e}')
 
 
 class PlatoGoggles: